@@ -1,6 +1,9 @@
+import asyncio
+import importlib.util
 import logging
 import re
 import uuid
+import weakref
 import httpx
 import openai
 from openai import OpenAI, AsyncOpenAI
@@ -10,13 +13,19 @@ import requests
 import base64
 from pathlib import Path
 import io
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from ...config import config
+from . import response_cache
+from .router import AIRouter, provider_health
 
 
 logger = logging.getLogger(__name__)
 
 
+# 安装了 h2 时启用 HTTP/2（同一连接多路复用并发请求）
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
 def _make_async_openai_client(api_key: str, base_url: str, timeout: Optional[float] = 100):
     """
     创建 OpenAI 异步客户端。
@@ -24,28 +33,200 @@ def _make_async_openai_client(api_key: str, base_url: str, timeout: Optional[flo
     若需代理，仅在 config.GPT_PROXY 显式配置时启用。
     """
     proxy = (config.GPT_PROXY or '').strip()
+    pool_kwargs = dict(
+        timeout=timeout,
+        http2=config.AI_HTTP2_ENABLED and _HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=config.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.AI_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=config.AI_HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
     if proxy:
-        http_client = httpx.AsyncClient(proxy=proxy, timeout=timeout)
+        http_client = httpx.AsyncClient(proxy=proxy, **pool_kwargs)
         logger.info('AI HTTP 使用配置代理: %s', proxy)
     else:
-        http_client = httpx.AsyncClient(trust_env=False, timeout=timeout)
+        http_client = httpx.AsyncClient(trust_env=False, **pool_kwargs)
     return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
 
+def _usage_dict(usage) -> Optional[dict]:
+    """
+    统一各家返回的 token 用量。
+
+    命中提示词缓存的 token 数：OpenAI / 豆包 / 通义在 prompt_tokens_details.cached_tokens，
+    DeepSeek 在 prompt_cache_hit_tokens。
+    """
+    if not usage:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) if details else None
+    if cached is None:
+        cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'total_tokens': getattr(usage, 'total_tokens', None),
+        'cached_tokens': cached,
+    }
+
+
+def _log_usage(provider: Optional[str], model_name: str, usage: Optional[dict]) -> None:
+    """记录单次调用的提示词缓存命中情况（同时计入供应商统计）"""
+    if not usage or not provider:
+        return
+    prompt_tokens = usage.get('prompt_tokens') or 0
+    cached_tokens = usage.get('cached_tokens') or 0
+    provider_health(provider).record_usage(prompt_tokens, cached_tokens)
+    logger.info(
+        f'🧮 {provider} 提示词缓存: model={model_name}, prompt={prompt_tokens}, cached={cached_tokens}, '
+        f'completion={usage.get("completion_tokens")}'
+    )
+
+
 class BaseAI:
+    """
+    模型客户端基类。
+
+    httpx 连接池绑定创建它的事件循环，因此 client 按事件循环各建一个并缓存：
+    API 进程里是 uvicorn 的主循环，Huey 进程里是 runtime.run_ai 的常驻循环，
+    同一循环内的所有调用共享 keep-alive 连接。
+
+    provider 是供应商标识（与 model_type 一致），用于路由统计与熔断。
+    """
+
+    provider = None
+
     def __init__(self, api_key, base_url, timeout: Optional[float] = 100):
         self.model_name = None
-        self.client = _make_async_openai_client(api_key, base_url, timeout=timeout)
+        self._client_args = (api_key, base_url, timeout)
+        self._clients = weakref.WeakKeyDictionary()
+        self._default_client = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环内（如只读取 base_url），返回一个未绑定的客户端
+            if self._default_client is None:
+                self._default_client = self._build_client()
+            return self._default_client
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._build_client()
+            self._clients[loop] = client
+        return client
+
+    @property
+    def configured(self) -> bool:
+        """是否配置了 API Key（未配置的供应商不作为熔断备选）"""
+        return bool(self._client_args[0])
+
+    def _build_client(self) -> AsyncOpenAI:
+        api_key, base_url, timeout = self._client_args
+        return _make_async_openai_client(api_key, base_url, timeout=timeout)
+
+    def _record_usage(self, response) -> Optional[dict]:
+        """非流式调用：记录本次 token 用量与提示词缓存命中数"""
+        usage = _usage_dict(getattr(response, 'usage', None))
+        _log_usage(self.provider, self.model_name, usage)
+        return usage
+
+
+class ChatStream:
+    """
+    单次流式回复的句柄（每次调用 reply_stream_text 新建一个）。
+
+    模型实例是进程内单例，只持有共享的 HTTP 客户端；正文、思考内容、token 用量和
+    耗时都记在句柄上，同一 worker 内并发的多个流互不干扰。
+
+    用法：
+        stream = ai_model.reply_stream_text(messages, user_mobile=...)
+        async for chunk in stream:
+            ...
+        stream.text / stream.usage / stream.metadata()
+    """
+
+    def __init__(self, ai, producer, *args, **kwargs):
+        self.model_name = ai.model_name
+        self.provider = ai.provider
+        self.usage = None
+        self.finish_reason = None
+        self.started_at = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+        self._text_parts = []
+        self._reasoning_parts = []
+        self._chunks = producer(self, *args, **kwargs)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        ok = False
+        try:
+            async for chunk in self._chunks:
+                yield chunk
+            ok = bool(self._text_parts)
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开或调用方提前结束：已有输出算成功，否则不计成败
+            ok = True if self._text_parts else None
+            raise
+        finally:
+            self.finished_at = time.time()
+            await self._chunks.aclose()
+            if self.provider and ok is not None:
+                # 只计成败供熔断判断；流式耗时取决于输出长度，不计入对冲用的 p95
+                provider_health(self.provider).record(None, ok)
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._text_parts)
+
+    @property
+    def reasoning(self) -> str:
+        return ''.join(self._reasoning_parts)
+
+    def add_text(self, content: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        self._text_parts.append(content)
+
+    def add_reasoning(self, content: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        self._reasoning_parts.append(content)
+
+    def record_usage(self, usage):
+        usage = _usage_dict(usage)
+        if not usage:
+            return
+        self.usage = usage
+        _log_usage(self.provider, self.model_name, usage)
+
+    def metadata(self) -> dict:
+        """供写入 Message.api_metadata"""
+        end = self.finished_at or time.time()
+        first = self.first_token_at
+        return {
+            'model': self.model_name,
+            'usage': self.usage,
+            'finish_reason': self.finish_reason,
+            'first_token_ms': int((first - self.started_at) * 1000) if first else None,
+            'duration_ms': int((end - self.started_at) * 1000),
+        }
 
 
 class AliChatAI(BaseAI):
+    provider = 'ali_chat'
+
     def __init__(self):
         super().__init__(
             api_key=config.ALY_MODEL_API_KEY,
             base_url=config.ALY_API_URL
         )
         self.model_name = config.ALY_MODEL_NAME
-        self.reply = ""
 
     async def reply_text(self, messages, user=None, response_format='text', max_tokens=None):
         resp_format = {"type": 'text'} if response_format == 'text' else {"type": 'json_object'}
@@ -75,6 +256,7 @@ class AliChatAI(BaseAI):
                     timeout=100,
                     user=user.mobile if user else None,
                 )
+                self._record_usage(response)
                 choice = response.choices[0]
                 finish_reason = choice.finish_reason
                 logger.warning(f'finish_reason: {finish_reason}')
@@ -87,14 +269,15 @@ class AliChatAI(BaseAI):
             logger.warning(e)
             return None
 
-    async def reply_stream_text(self, query, user):
+    def reply_stream_text(self, query, user) -> ChatStream:
+        return ChatStream(self, self._stream_chunks, query, user)
+
+    async def _stream_chunks(self, stream: ChatStream, query, user):
         try:
             logger.warning(
                 "AliChat 流式调用 model=%s（创作对话应走 DeepSeek，请检查调用栈）",
                 self.model_name,
             )
-            # 重置回复内容
-            self.reply = ""
             
             yield 'data:{}\n\n'.format(
                 json.dumps(dict(type='start'))
@@ -116,27 +299,31 @@ class AliChatAI(BaseAI):
                 frequency_penalty=0.0,
                 presence_penalty=0.0,
                 stream=True,
+                stream_options={'include_usage': True},
                 timeout=30,
                 user=user.mobile if user else None
             )
             async for reply in response:
+                # 结束后继续读到末尾，取最后一个分片里的 usage
+                stream.record_usage(getattr(reply, 'usage', None))
+                if not reply.choices or stream.finish_reason:
+                    continue
                 finish_reason = reply.choices[0].finish_reason
                 content = reply.choices[0].delta.content or ""
                 if finish_reason == 'content_filter':
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='stop', content='内容不合法')))
-                    break
-                if finish_reason == 'length':
-                    yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
-                if finish_reason == 'stop':
+                    continue
+                if finish_reason in ('length', 'stop'):
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
+                    continue
                 if content is None:
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='begin')))
                     continue
-                self.reply = self.reply + content
+                stream.add_text(content)
                 yield 'data:{}\n\n'.format(
                     json.dumps(dict(type='input', content=content))
                 )
@@ -164,6 +351,8 @@ class AliChatAI(BaseAI):
 class DouBaoVisionAI(BaseAI):
     """豆包视觉理解AI - 支持图片识别和分析"""
     
+    provider = 'doubao_vision'
+
     def __init__(self):
         super().__init__(
             api_key=config.DOUBAO_API_KEY,
@@ -274,6 +463,7 @@ class DouBaoVisionAI(BaseAI):
                 timeout=120,
                 user=user.mobile if user else None,
             )
+            self._record_usage(response)
             
             if response.choices and response.choices[0].message:
                 content = response.choices[0].message.content
@@ -426,13 +616,14 @@ def _resolve_api_user(user=None, user_mobile=None):
 class DeepSeekAI(BaseAI):
     """DeepSeek AI模型 - 使用OpenAI SDK"""
     
+    provider = 'deepseek'
+
     def __init__(self):
         super().__init__(
             api_key=config.DEEPSEEK_API_KEY,
             base_url="https://api.deepseek.com/v1"
         )
         self.model_name = config.DEEPSEEK_MODEL_NAME
-        self.reply = None
     
     async def reply_text(self, messages, user=None, user_mobile=None, response_format='text', max_tokens=None):
         """
@@ -464,6 +655,7 @@ class DeepSeekAI(BaseAI):
                 timeout=100,
                 user=_resolve_api_user(user, user_mobile),
             )
+            self._record_usage(response)
             
             if response.choices and response.choices[0].message:
                 text = _extract_assistant_text(response.choices[0].message)
@@ -475,7 +667,7 @@ class DeepSeekAI(BaseAI):
             logger.error(f"DeepSeek AI调用失败: {str(e)}")
             return None
     
-    async def reply_stream_text(self, messages, user=None, user_mobile=None):
+    def reply_stream_text(self, messages, user=None, user_mobile=None) -> ChatStream:
         """
         使用DeepSeek模型流式回复文本问题
         
@@ -483,9 +675,12 @@ class DeepSeekAI(BaseAI):
             messages (list): OpenAI格式的消息列表
             user: 用户对象
             
-        Yields:
-            str: SSE格式的流式数据
+        Returns:
+            ChatStream: 迭代得到 SSE 格式的流式数据，结束后 .text 为完整正文
         """
+        return ChatStream(self, self._stream_chunks, messages, user, user_mobile)
+
+    async def _stream_chunks(self, stream: ChatStream, messages, user=None, user_mobile=None):
         try:
             logger.info(
                 "DeepSeek 流式调用 model=%s base_url=%s",
@@ -505,26 +700,27 @@ class DeepSeekAI(BaseAI):
                 frequency_penalty=0.0,
                 presence_penalty=0.0,
                 stream=True,
+                stream_options={'include_usage': True},
                 timeout=100,
                 user=_resolve_api_user(user, user_mobile),
             )
             
-            self.reply = ""
-            
             async for reply in response:
-                if not reply.choices:
+                # 结束后继续读到末尾，取最后一个分片里的 usage
+                stream.record_usage(getattr(reply, 'usage', None))
+                if not reply.choices or stream.finish_reason:
                     continue
                 choice = reply.choices[0]
                 finish_reason = choice.finish_reason
                 delta = choice.delta
                 if delta is None:
                     if finish_reason in ('stop', 'length', 'content_filter'):
+                        stream.finish_reason = finish_reason
                         if finish_reason == 'content_filter':
                             yield 'data:{}\n\n'.format(
                                 json.dumps(dict(type='stop', content='内容不合法')))
                         else:
                             yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                        break
                     continue
                 # deepseek-v4-pro：先 reasoning_content（思考），再 content（正文）
                 # 思考不落库、不拼进 message.content，与豆包1.6 一致走 type=thinking
@@ -532,22 +728,22 @@ class DeepSeekAI(BaseAI):
                 content = delta.content if delta.content is not None else ''
                 
                 if finish_reason == 'content_filter':
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='stop', content='内容不合法')))
-                    break
-                if finish_reason == 'length':
-                    yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
-                if finish_reason == 'stop':
+                    continue
+                if finish_reason in ('length', 'stop'):
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
+                    continue
 
                 if reasoning:
+                    stream.add_reasoning(reasoning)
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='thinking', content=reasoning))
                     )
                 if content:
-                    self.reply = self.reply + content
+                    stream.add_text(content)
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='input', content=content))
                     )
@@ -575,13 +771,14 @@ class DeepSeekAI(BaseAI):
 class OpenAIGptAI(BaseAI):
     """OpenAI 兼容创作对话（laozhang.ai 等），流式仅 content，无 reasoning_content。"""
 
+    provider = 'openai_gpt'
+
     def __init__(self):
         super().__init__(
             api_key=config.OPENAI_GPT_API_KEY,
             base_url=config.OPENAI_GPT_API_BASE,
         )
         self.model_name = config.OPENAI_GPT_MODEL_NAME
-        self.reply = ""
 
     def _output_tokens(self, max_tokens=None) -> int:
         tokens = max_tokens if max_tokens is not None else config.GPT_MAX_OUTPUT_TOKENS
@@ -619,6 +816,7 @@ class OpenAIGptAI(BaseAI):
                 user=_resolve_api_user(user, user_mobile),
                 **self._completion_limit_kwargs(tokens),
             )
+            self._record_usage(response)
             if response.choices and response.choices[0].message:
                 text = _extract_assistant_text(response.choices[0].message)
                 return text or None
@@ -627,7 +825,10 @@ class OpenAIGptAI(BaseAI):
             logger.error(f"OpenAI GPT 调用失败: {str(e)}")
             return None
 
-    async def reply_stream_text(self, messages, user=None, user_mobile=None):
+    def reply_stream_text(self, messages, user=None, user_mobile=None) -> ChatStream:
+        return ChatStream(self, self._stream_chunks, messages, user, user_mobile)
+
+    async def _stream_chunks(self, stream: ChatStream, messages, user=None, user_mobile=None):
         try:
             tokens = self._output_tokens(None)
             limit_param = 'max_completion_tokens' if self._uses_max_completion_tokens() else 'max_tokens'
@@ -648,15 +849,16 @@ class OpenAIGptAI(BaseAI):
                 frequency_penalty=0.0,
                 presence_penalty=0.0,
                 stream=True,
+                stream_options={'include_usage': True},
                 timeout=100,
                 user=_resolve_api_user(user, user_mobile),
                 **self._completion_limit_kwargs(tokens),
             )
 
-            self.reply = ""
-
             async for reply in response:
-                if not reply.choices:
+                # 结束后继续读到末尾，取最后一个分片里的 usage
+                stream.record_usage(getattr(reply, 'usage', None))
+                if not reply.choices or stream.finish_reason:
                     continue
                 choice = reply.choices[0]
                 finish_reason = choice.finish_reason
@@ -666,20 +868,19 @@ class OpenAIGptAI(BaseAI):
                     content = delta.content if delta.content is not None else ''
 
                 if finish_reason == 'content_filter':
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='stop', content='内容不合法')))
-                    break
-                if finish_reason == 'length':
-                    yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
-                if finish_reason == 'stop':
+                    continue
+                if finish_reason in ('length', 'stop'):
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
+                    continue
                 if not content:
                     yield 'data:{}\n\n'.format(json.dumps(dict(type='begin')))
                     continue
 
-                self.reply = self.reply + content
+                stream.add_text(content)
                 yield 'data:{}\n\n'.format(
                     json.dumps(dict(type='input', content=content))
                 )
@@ -701,19 +902,19 @@ class OpenAIGptAI(BaseAI):
             )
 
 
-class DouBao16AI:
+class DouBao16AI(BaseAI):
     """豆包1.6深度思考模型 - 支持深度思考能力，使用OpenAI SDK"""
     
+    provider = 'doubao_16'
+
     def __init__(self):
-        self.client = _make_async_openai_client(
-            config.DOUBAO_16_API_KEY,
-            config.DOUBAO_API_URL,
+        super().__init__(
+            api_key=config.DOUBAO_16_API_KEY,
+            base_url=config.DOUBAO_API_URL,
             timeout=config.DOUBAO_16_TIMEOUT,
         )
         self.model_name = config.DOUBAO_16_MODEL
         self.thinking_mode = config.DOUBAO_16_THINKING_MODE
-        self.reply = ""  # 初始化回复内容
-        self.reasoning = ""  # 初始化思考内容
     
     async def reply_text(self, messages, user=None, thinking_mode=None):
         """
@@ -756,6 +957,7 @@ class DouBao16AI:
             
             # 调用豆包1.6模型
             response = await self.client.chat.completions.create(**params)
+            self._record_usage(response)
             
             if response.choices and response.choices[0].message:
                 content = response.choices[0].message.content
@@ -767,7 +969,7 @@ class DouBao16AI:
             logger.error(f"豆包1.6深度思考AI调用失败: {str(e)}")
             return None
     
-    async def reply_stream_text(self, messages, user=None, thinking_mode=None, max_tokens=None):
+    def reply_stream_text(self, messages, user=None, thinking_mode=None, max_tokens=None) -> ChatStream:
         """
         使用豆包1.6模型流式回复文本问题
         
@@ -777,9 +979,12 @@ class DouBao16AI:
             thinking_mode (str): 思考模式 - 'disabled'(不使用), 'enabled'(使用), 'auto'(自动判断)
             max_tokens (int): 最大输出token数，如果不传则使用配置的默认值
             
-        Yields:
-            str: SSE格式的流式数据
+        Returns:
+            ChatStream: 迭代得到 SSE 格式的流式数据，结束后 .text / .reasoning 为完整内容
         """
+        return ChatStream(self, self._stream_chunks, messages, user, thinking_mode, max_tokens)
+
+    async def _stream_chunks(self, stream: ChatStream, messages, user=None, thinking_mode=None, max_tokens=None):
         try:
             yield 'data:{}\n\n'.format(
                 json.dumps(dict(type='start'))
@@ -803,6 +1008,7 @@ class DouBao16AI:
                 "frequency_penalty": 0.0,
                 "presence_penalty": 0.0,
                 "stream": True,
+                "stream_options": {"include_usage": True},
                 "timeout": 120,
                 "user": user.mobile or user.nickname if user else None
             }
@@ -826,29 +1032,27 @@ class DouBao16AI:
             # 调用豆包1.6模型（流式）
             response = await self.client.with_options(max_retries=3).chat.completions.create(**params)
             
-            # 累积完整响应
-            self.reply = ""
-            self.reasoning = ""  # 累积思考内容
-            
             async for reply in response:
-                if not reply.choices:
+                # 结束后继续读到末尾，取最后一个分片里的 usage
+                stream.record_usage(getattr(reply, 'usage', None))
+                if not reply.choices or stream.finish_reason:
                     continue
                 finish_reason = reply.choices[0].finish_reason
                 delta = reply.choices[0].delta
                 if delta is None:
                     if finish_reason in ('stop', 'length', 'content_filter'):
+                        stream.finish_reason = finish_reason
                         if finish_reason == 'content_filter':
                             yield 'data:{}\n\n'.format(
                                 json.dumps(dict(type='stop', content='内容不合法')))
                         else:
                             yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                        break
                     continue
                 
                 # 检查是否有思考内容（豆包1.6深度思考特性）
                 if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
                     reasoning_content = delta.reasoning_content
-                    self.reasoning += reasoning_content
+                    stream.add_reasoning(reasoning_content)
                     # 发送思考过程给前端
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='thinking', content=reasoning_content))
@@ -858,21 +1062,20 @@ class DouBao16AI:
                 content = delta.content or ""
                 
                 if finish_reason == 'content_filter':
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='stop', content='内容不合法')))
-                    break
-                if finish_reason == 'length':
-                    yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
-                if finish_reason == 'stop':
+                    continue
+                if finish_reason in ('length', 'stop'):
+                    stream.finish_reason = finish_reason
                     yield 'data:{}\n\n'.format(json.dumps(dict(type='stop')))
-                    break
+                    continue
                 if content is None or content == "":
                     yield 'data:{}\n\n'.format(
                         json.dumps(dict(type='begin')))
                     continue
                 
-                self.reply = self.reply + content
+                stream.add_text(content)
                 yield 'data:{}\n\n'.format(
                     json.dumps(dict(type='input', content=content))
                 )
@@ -956,6 +1159,12 @@ doubao_16_ai = DouBao16AI()
 deepseek_ai = DeepSeekAI()
 openai_gpt_ai = OpenAIGptAI()
 
+# 非流式默认路由：DeepSeek 优先，慢于 p95 时对冲通义千问，失败/熔断时降级
+default_text_router = AIRouter([deepseek_ai, ali_chat_ai])
+
+# 对话模型熔断时的备选顺序
+_CHAT_FALLBACK_MODEL_TYPES = ('deepseek', 'openai_gpt')
+
 
 def normalize_model_type(model_type: Optional[str] = None) -> str:
     """统一 model_type，默认 deepseek。"""
@@ -979,9 +1188,7 @@ def resolve_script_media_plan_model_type() -> str:
     return normalize_model_type(config.CHAT_SCRIPT_MEDIA_PLAN_MODEL_TYPE)
 
 
-def get_chat_ai_model(model_type: Optional[str] = None):
-    """按 model_type 选择对话模型，默认 DeepSeek。"""
-    model_type = normalize_model_type(model_type)
+def _chat_ai_for(model_type: str):
     if model_type == 'ali_chat':
         return ali_chat_ai
     if model_type == 'doubao_vision':
@@ -993,31 +1200,57 @@ def get_chat_ai_model(model_type: Optional[str] = None):
     return deepseek_ai
 
 
-async def reply_stream_text_default(messages, user=None):
+def get_chat_ai_model(model_type: Optional[str] = None):
+    """
+    按 model_type 选择对话模型，默认 DeepSeek；所选供应商熔断中时换用备选中第一个
+    已配置 API Key 且未熔断的。
+    """
+    model_type = normalize_model_type(model_type)
+    if provider_health(model_type).is_open():
+        fallback = next(
+            (
+                t for t in _CHAT_FALLBACK_MODEL_TYPES
+                if t != model_type and _chat_ai_for(t).configured and not provider_health(t).is_open()
+            ),
+            None,
+        )
+        if fallback:
+            logger.warning(f'⚠️ 对话模型 {model_type} 熔断中，改用 {fallback}')
+            model_type = fallback
+    return _chat_ai_for(model_type)
+
+
+def reply_stream_text_default(messages, user=None) -> ChatStream:
     """流式对话默认 DeepSeek，不自动降级千问（避免误用通义）。"""
-    async for chunk in deepseek_ai.reply_stream_text(messages, user):
-        yield chunk
+    return deepseek_ai.reply_stream_text(messages, user)
 
 
-async def reply_text_default(messages, user=None, response_format='text', max_tokens=None):
-    """默认 DeepSeek 非流式回复，失败或空结果时降级通义千问。"""
-    try:
-        result = await deepseek_ai.reply_text(
-            messages=messages,
-            user=user,
-            response_format=response_format,
-            max_tokens=max_tokens,
-        )
-        if result:
-            return result
-    except Exception as e:
-        logger.warning(f"DeepSeek 调用失败，降级通义千问: {e}")
-    return await ali_chat_ai.reply_text(
-        messages=messages,
+async def reply_text_default(messages, user=None, response_format='text', max_tokens=None,
+                             cache=False, refresh=False):
+    """
+    默认非流式回复，经 default_text_router 路由：DeepSeek 优先，超过其 p95 耗时未返回时
+    对冲请求通义千问，失败、空结果或熔断时降级。
+
+    cache=True 时按 路由模型组合 + messages + response_format + max_tokens 读写 Redis 回复缓存
+    （仅用于输入确定的提示词）；refresh=True 跳过缓存读取并用新结果覆盖。
+    """
+    key = None
+    if cache and config.LLM_CACHE_ENABLED:
+        key = response_cache.cache_key(default_text_router.model_name, messages, response_format, max_tokens)
+        if not refresh:
+            cached = response_cache.get(key)
+            if cached:
+                return cached
+
+    result = await default_text_router.reply_text(
+        messages,
         user=user,
         response_format=response_format,
         max_tokens=max_tokens,
     )
+    if key and result:
+        response_cache.put(key, result)
+    return result
 
 
 # GPTImage2 Enterprise / Sora2Official 官方兼容线路允许的 size
@@ -1129,19 +1362,35 @@ class GPTImage2AI:
         quality: Optional[str] = None,
         timeout: Optional[int] = None,
     ) -> Optional[Dict[str, Any]]:
-        """生成图片，返回包含 url / b64_json 的 dict，失败返回 None。"""
+        """生成图片，返回包含 url / b64_json 的 dict，失败返回 None（原因见 last_error）。"""
+        result, error = self.try_generate_image(prompt, size=size, quality=quality, timeout=timeout)
+        self.last_error = error
+        if result:
+            self.last_request_payload = dict(result["payload"])
+        return result
+
+    def try_generate_image(
+        self,
+        prompt: str,
+        *,
+        size: Optional[str] = None,
+        quality: Optional[str] = None,
+        timeout: Optional[int] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        生成图片，返回 (结果, 错误信息)。
+
+        不读写 last_error 等实例状态，可在多个线程中并发调用同一个客户端。
+        """
         p = (prompt or "").strip()
         if not p:
-            return None
+            return None, "empty prompt"
         if not self.api_key:
-            self.last_error = "GPT_IMAGE_2_API_KEY is empty"
-            logger.warning(self.last_error)
-            return None
+            logger.warning("GPT_IMAGE_2_API_KEY is empty")
+            return None, "GPT_IMAGE_2_API_KEY is empty"
 
         payload = self._build_payload(p, size=size, quality=quality)
-        self.last_request_payload = dict(payload)
         try:
-            self.last_error = None
             tout = gpt_image_2_http_timeout(timeout)
             resp = requests.post(
                 f"{self.base_url}/images/generations",
@@ -1153,18 +1402,17 @@ class GPTImage2AI:
                 timeout=tout,
             )
             if resp.status_code >= 400:
-                self.last_error = resp.text
                 logger.warning("[gpt-image-2] failed status=%s body=%s", resp.status_code, resp.text)
-                return None
+                return None, resp.text
             data = resp.json()
             rows = data.get("data") or []
             first = rows[0] if rows else {}
             url = (first.get("url") or "").strip()
-            b64_json = self._normalize_b64_json(first.get("b64_json") or "")
+            # 从 raw 中取走 b64_json，避免结果里同时持有两份 4K 图的 base64 文本
+            b64_json = self._normalize_b64_json(first.pop("b64_json", None) or "")
             if not url and not b64_json:
-                self.last_error = "empty image payload"
                 logger.warning("[gpt-image-2] empty payload: %s", data)
-                return None
+                return None, "empty image payload"
             return dict(
                 url=url or None,
                 b64_json=b64_json,
@@ -1172,11 +1420,10 @@ class GPTImage2AI:
                 route=self.route,
                 payload=payload,
                 raw=data,
-            )
+            ), None
         except Exception as e:
-            self.last_error = str(e)
             logger.warning("[gpt-image-2] exception: %s", e)
-            return None
+            return None, str(e)
 
     def generate_image_url(
         self,
@@ -0,0 +1,89 @@
+"""
+大模型非流式回复缓存（Redis）
+
+只用于输入确定、结果可复用的提示词（标题生成、脚本提取、研究分析、用户画像等），由调用方
+显式传 cache=True 开启：
+- key = sha256(模型名 + 规整后的 messages + response_format + max_tokens)
+- 值为 zlib 压缩后的回复文本，按 LLM_CACHE_TTL_SEC 过期，超过 LLM_CACHE_MAX_ENTRY_BYTES 的不缓存
+- refresh=True 时跳过读取、直接重新生成并覆盖
+- 命中/未命中计数记在 llm_cache:stats:hit / llm_cache:stats:miss
+"""
+
+import hashlib
+import json
+import logging
+import zlib
+from typing import Optional
+
+from ...app_factory import get_redis_client
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'llm_cache:'
+_HIT_KEY = KEY_PREFIX + 'stats:hit'
+_MISS_KEY = KEY_PREFIX + 'stats:miss'
+
+
+def _normalize_messages(messages) -> list:
+    normalized = []
+    for msg in messages or []:
+        content = msg.get('content')
+        if isinstance(content, str):
+            content = content.strip()
+        normalized.append({'role': msg.get('role'), 'content': content})
+    return normalized
+
+
+def cache_key(model_name: str, messages, response_format: str = 'text', max_tokens: Optional[int] = None) -> str:
+    raw = json.dumps(
+        {
+            'model': model_name,
+            'messages': _normalize_messages(messages),
+            'response_format': response_format,
+            'max_tokens': max_tokens,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return KEY_PREFIX + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    try:
+        client = get_redis_client()
+        data = client.get(key)
+        client.incr(_HIT_KEY if data is not None else _MISS_KEY)
+    except Exception as exc:
+        logger.warning(f'LLM 缓存读取失败，忽略: {exc}')
+        return None
+    if data is None:
+        return None
+    try:
+        text = zlib.decompress(data).decode('utf-8')
+    except (zlib.error, UnicodeDecodeError):
+        return None
+    logger.info(f'🎯 LLM 缓存命中: key={key[len(KEY_PREFIX):len(KEY_PREFIX) + 12]}')
+    return text
+
+
+def put(key: str, text: str) -> None:
+    if not text:
+        return
+    data = zlib.compress(text.encode('utf-8'))
+    if len(data) > config.LLM_CACHE_MAX_ENTRY_BYTES:
+        return
+    try:
+        get_redis_client().set(key, data, ex=config.LLM_CACHE_TTL_SEC)
+    except Exception as exc:
+        logger.warning(f'LLM 缓存写入失败: {exc}')
+
+
+def stats() -> dict:
+    try:
+        hit, miss = get_redis_client().mget([_HIT_KEY, _MISS_KEY])
+    except Exception:
+        return {'hit': None, 'miss': None, 'hit_rate': None}
+    hit, miss = int(hit or 0), int(miss or 0)
+    total = hit + miss
+    return {'hit': hit, 'miss': miss, 'hit_rate': round(hit / total, 4) if total else None}
@@ -0,0 +1,225 @@
+"""
+大模型供应商路由
+
+- ProviderHealth：每个供应商最近 N 次调用的耗时与成败（进程内滚动窗口），附带熔断器
+  （连续失败或窗口错误率过高时熔断 AI_ROUTER_BREAKER_COOLDOWN_SEC 秒，到期后放行一次试探）
+- AIRouter：按顺序在可用供应商之间路由非流式调用；首选供应商超过其 p95 耗时仍未返回时，
+  对冲请求下一个供应商，取先返回的有效结果，另一个取消
+
+流式对话（ChatStream）结束时只把成败记入同一熔断器（不计入耗时统计），供 get_chat_ai_model 避开熔断中的供应商。
+每次调用返回的提示词 token 与缓存命中 token 也累计在这里（snapshot 中的 prompt_cache_hit_rate）。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class ProviderHealth:
+    """单个供应商的滚动统计与熔断状态"""
+
+    def __init__(self, name: str):
+        self.name = name
+        # (耗时秒 / None=流式调用, 是否成功 / None=被对冲取消)
+        self._samples = deque(maxlen=config.AI_ROUTER_STATS_WINDOW)
+        self._consecutive_failures = 0
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probe_started_at = None
+        # 累计提示词 token 与其中命中服务端提示词缓存的 token
+        self._prompt_tokens = 0
+        self._cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: Optional[float], ok: Optional[bool]) -> None:
+        with self._lock:
+            self._samples.append((latency, ok))
+            if ok is None:
+                return
+            if ok:
+                self._consecutive_failures = 0
+                if self._state != BreakerState.CLOSED:
+                    logger.info(f'✅ AI 供应商恢复: {self.name}')
+                self._state = BreakerState.CLOSED
+                self._probe_started_at = None
+                return
+            self._consecutive_failures += 1
+            if self._state == BreakerState.HALF_OPEN or self._should_open():
+                if self._state != BreakerState.OPEN:
+                    logger.warning(
+                        f'⚠️ AI 供应商熔断: {self.name}, 连续失败={self._consecutive_failures}, '
+                        f'错误率={self._error_rate():.0%}'
+                    )
+                self._state = BreakerState.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            self._prompt_tokens += prompt_tokens or 0
+            self._cached_tokens += cached_tokens or 0
+
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= config.AI_ROUTER_BREAKER_FAILURES:
+            return True
+        decided = [ok for _, ok in self._samples if ok is not None]
+        return (
+            len(decided) >= config.AI_ROUTER_BREAKER_FAILURES * 2
+            and self._error_rate() >= config.AI_ROUTER_BREAKER_ERROR_RATE
+        )
+
+    def _error_rate(self) -> float:
+        decided = [ok for _, ok in self._samples if ok is not None]
+        if not decided:
+            return 0.0
+        return decided.count(False) / len(decided)
+
+    def is_available(self) -> bool:
+        """熔断中返回 False；冷却期满后放行一个试探请求（半开，试探无结果时每个冷却期再放行一次）"""
+        cooldown = config.AI_ROUTER_BREAKER_COOLDOWN_SEC
+        with self._lock:
+            if self._state == BreakerState.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == BreakerState.OPEN:
+                if now - self._opened_at < cooldown:
+                    return False
+                self._state = BreakerState.HALF_OPEN
+            if self._probe_started_at is not None and now - self._probe_started_at < cooldown:
+                return False
+            self._probe_started_at = now
+            return True
+
+    def is_open(self) -> bool:
+        """只读判断（不占用半开试探名额）"""
+        with self._lock:
+            return (
+                self._state == BreakerState.OPEN
+                and time.monotonic() - self._opened_at < config.AI_ROUTER_BREAKER_COOLDOWN_SEC
+            )
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(latency for latency, _ in self._samples if latency is not None)
+        if len(latencies) < 10:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        with self._lock:
+            return {
+                'state': self._state,
+                'samples': len(self._samples),
+                'error_rate': round(self._error_rate(), 4),
+                'consecutive_failures': self._consecutive_failures,
+                'p95_ms': int(p95 * 1000) if p95 is not None else None,
+                'prompt_tokens': self._prompt_tokens,
+                'cached_tokens': self._cached_tokens,
+                'prompt_cache_hit_rate': (
+                    round(self._cached_tokens / self._prompt_tokens, 4) if self._prompt_tokens else None
+                ),
+            }
+
+
+_health: Dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+
+
+def provider_health(name: str) -> ProviderHealth:
+    health = _health.get(name)
+    if health is None:
+        with _health_lock:
+            health = _health.setdefault(name, ProviderHealth(name))
+    return health
+
+
+def health_snapshot() -> dict:
+    return {name: health.snapshot() for name, health in list(_health.items())}
+
+
+def hedge_delay(name: str) -> float:
+    """对冲等待时间：首选供应商的 p95 耗时（样本不足时用默认值），限制在上下界之间"""
+    p95 = provider_health(name).p95()
+    delay = p95 if p95 is not None else config.AI_ROUTER_HEDGE_DEFAULT_DELAY_SEC
+    return min(max(delay, config.AI_ROUTER_HEDGE_MIN_DELAY_SEC), config.AI_ROUTER_HEDGE_MAX_DELAY_SEC)
+
+
+class AIRouter:
+    """在多个 BaseAI 供应商之间路由 reply_text（按列表顺序优先）"""
+
+    def __init__(self, providers: List):
+        self.providers = providers
+
+    @property
+    def model_name(self) -> str:
+        """路由内全部供应商的模型名，任一供应商都可能作答，回复缓存按它区分"""
+        return '|'.join(f'{ai.provider}:{ai.model_name}' for ai in self.providers)
+
+    def _candidates(self) -> List:
+        available = [ai for ai in self.providers if provider_health(ai.provider).is_available()]
+        # 全部熔断时仍按顺序尝试，避免彻底不可用
+        return available or list(self.providers)
+
+    async def _call(self, ai, messages, **kwargs) -> Optional[str]:
+        health = provider_health(ai.provider)
+        started = time.monotonic()
+        try:
+            result = await ai.reply_text(list(messages), **kwargs)
+        except asyncio.CancelledError:
+            # 被对冲取消：只记录下限耗时，不计成败
+            health.record(time.monotonic() - started, None)
+            raise
+        except Exception as e:
+            logger.warning(f'AI 供应商调用异常: {ai.provider}, error={e}')
+            result = None
+        health.record(time.monotonic() - started, bool(result))
+        return result
+
+    async def reply_text(self, messages, **kwargs) -> Optional[str]:
+        candidates = self._candidates()
+        primary, backups = candidates[0], candidates[1:]
+        if not backups:
+            return await self._call(primary, messages, **kwargs)
+
+        backup = backups[0]
+        primary_task = asyncio.ensure_future(self._call(primary, messages, **kwargs))
+        pending = {primary_task}
+        try:
+            if config.AI_ROUTER_HEDGE_ENABLED:
+                delay = hedge_delay(primary.provider)
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    logger.info(f'⏱️ {primary.provider} 超过 {delay:.1f}s 未返回，对冲请求 {backup.provider}')
+                    pending.add(asyncio.ensure_future(self._call(backup, messages, **kwargs)))
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            result = task.result()
+                            if result:
+                                return result
+                    return None
+
+            result = await primary_task
+            if result:
+                return result
+            logger.warning(f'AI 供应商 {primary.provider} 调用失败，降级 {backup.provider}')
+            return await self._call(backup, messages, **kwargs)
+        finally:
+            # 已取到结果或调用方被取消时，停止仍在进行的请求
+            for task in pending:
+                if not task.done():
+                    task.cancel()
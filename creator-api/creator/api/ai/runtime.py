@@ -0,0 +1,78 @@
+"""
+同步代码（Huey 任务、后台线程）调用异步 AI 接口的运行时
+
+每个进程只起一个常驻事件循环线程，run_ai 把协程投递过去并阻塞等待结果：
+- 模型客户端按事件循环缓存（见 BaseAI.client），同一进程内的任务复用同一个连接池，
+  keep-alive / HTTP/2 连接与 TLS 会话不会随 asyncio.run 的临时循环一起被丢弃
+- 多个 Huey 线程可以同时调用，协程在同一个循环里并发执行
+- fork 出的子进程（Huey process worker）按 pid 重新创建自己的循环
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_owner_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """返回当前进程的 AI 事件循环（首次调用时启动）"""
+    global _loop, _thread, _owner_pid
+    pid = os.getpid()
+    if _loop is not None and _owner_pid == pid and _thread.is_alive():
+        return _loop
+    with _lock:
+        if _loop is None or _owner_pid != pid or not _thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_run_loop, args=(_loop,), name='ai-runtime', daemon=True
+            )
+            _thread.start()
+            _owner_pid = pid
+            logger.info(f'🚀 AI 运行时事件循环已启动: pid={pid}')
+        return _loop
+
+
+def run_ai(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    在 AI 运行时循环中执行协程并同步返回结果（替代 asyncio.run）。
+
+    不能在运行时循环线程内部调用（会死锁）。
+    """
+    loop = get_loop()
+    if threading.current_thread() is _thread:
+        raise RuntimeError('run_ai 不能在 AI 运行时线程内调用，请直接 await')
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def shutdown(timeout: float = 5.0) -> None:
+    """停止运行时循环（进程退出前调用，可选）"""
+    global _loop, _thread, _owner_pid
+    with _lock:
+        loop, thread = _loop, _thread
+        if loop is None or _owner_pid != os.getpid():
+            return
+        _loop, _thread, _owner_pid = None, None, None
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not thread.is_alive():
+        loop.close()
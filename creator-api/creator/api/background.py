@@ -0,0 +1,199 @@
+"""
+API 进程内的后台执行器（不经 Huey 的后台工作）
+
+断线兜底回复、进程内语音转写、转写重试等都投递到这里，不再每次新起一个线程：
+- 固定 BACKGROUND_MAX_WORKERS 个工作线程 + 有界队列（BACKGROUND_QUEUE_SIZE）
+- 队列已满时不排队也不加线程：提供了 overflow（同参数的 Huey 任务）则转投 Huey，否则拒绝并告警
+- 延迟执行由一个计时线程按到期时间维护最小堆，到期后投递到工作队列（不为每次延迟起 sleep 线程）
+- 进程退出时 shutdown：停止接收新任务，未到期的延迟任务转投 Huey，等待队列内已有任务执行完
+- fork 出的子进程按 pid 重建自己的执行器
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+_POLL_SEC = 0.5
+
+
+class SubmitResult:
+    THREAD = 'thread'
+    HUEY = 'huey'
+    REJECTED = 'rejected'
+
+
+class BackgroundExecutor:
+    """有界线程池 + 延迟调度"""
+
+    def __init__(self, name: str, max_workers: int, queue_size: int):
+        self.name = name
+        self._max_workers = max(1, max_workers)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._workers = []
+        self._timers = []  # (到期 monotonic 时间, 序号, fn, args, kwargs, overflow)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._timer_thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _start(self) -> None:
+        if self._workers:
+            return
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self._max_workers):
+                t = threading.Thread(target=self._worker_loop, name=f'{self.name}-{i}', daemon=True)
+                t.start()
+                self._workers.append(t)
+            logger.info(f'🚀 后台执行器已启动: {self.name}, workers={self._max_workers}')
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                fn, args, kwargs = self._queue.get(timeout=_POLL_SEC)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f'后台任务异常: {getattr(fn, "__name__", fn)}')
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn: Callable, *args, overflow: Optional[Callable] = None, **kwargs) -> str:
+        """
+        投递任务，返回 SubmitResult。
+
+        overflow 为同参数的 Huey 任务：队列已满或执行器已关闭时转投 Huey。
+        """
+        if not self._closed:
+            self._start()
+            try:
+                self._queue.put_nowait((fn, args, kwargs))
+                return SubmitResult.THREAD
+            except queue.Full:
+                pass
+        if overflow is not None:
+            overflow(*args, **kwargs)
+            logger.warning(f'⚠️ 后台执行器队列已满，转投 Huey: {getattr(fn, "__name__", fn)}')
+            return SubmitResult.HUEY
+        logger.error(f'❌ 后台执行器队列已满，任务被拒绝: {getattr(fn, "__name__", fn)}')
+        return SubmitResult.REJECTED
+
+    def schedule(self, delay_sec: float, fn: Callable, *args, overflow: Optional[Callable] = None, **kwargs) -> None:
+        """delay_sec 秒后投递任务（到期时同 submit 的满队列处理）"""
+        with self._cond:
+            if self._closed:
+                self._schedule_overflow(delay_sec, fn, args, kwargs, overflow)
+                return
+            heapq.heappush(
+                self._timers,
+                (time.monotonic() + delay_sec, next(self._seq), fn, args, kwargs, overflow),
+            )
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(
+                    target=self._timer_loop, name=f'{self.name}-timer', daemon=True
+                )
+                self._timer_thread.start()
+            self._cond.notify()
+
+    def _timer_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and (not self._timers or self._timers[0][0] > time.monotonic()):
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, fn, args, kwargs, overflow = heapq.heappop(self._timers)
+            self.submit(fn, *args, overflow=overflow, **kwargs)
+
+    @staticmethod
+    def _schedule_overflow(delay_sec, fn, args, kwargs, overflow) -> None:
+        if overflow is None:
+            logger.warning(f'执行器已关闭，丢弃延迟任务: {getattr(fn, "__name__", fn)}')
+            return
+        overflow.schedule(args, kwargs, delay=max(0.0, delay_sec))
+
+    def shutdown(self, timeout: float) -> None:
+        """停止接收新任务；未到期的延迟任务转投 Huey；最多等待 timeout 秒让已排队任务执行完"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            timers, self._timers = self._timers, []
+            self._cond.notify_all()
+        now = time.monotonic()
+        for due, _, fn, args, kwargs, overflow in timers:
+            try:
+                self._schedule_overflow(due - now, fn, args, kwargs, overflow)
+            except Exception:
+                logger.exception(f'延迟任务转投 Huey 失败: {getattr(fn, "__name__", fn)}')
+
+        deadline = time.monotonic() + timeout
+        for t in self._workers:
+            t.join(max(0.0, deadline - time.monotonic()))
+        remaining = self._queue.qsize()
+        if remaining:
+            logger.warning(f'后台执行器关闭超时，仍有 {remaining} 个任务未执行: {self.name}')
+        else:
+            logger.info(f'后台执行器已关闭: {self.name}')
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            delayed = len(self._timers)
+        return {
+            'workers': len(self._workers),
+            'queued': self._queue.qsize(),
+            'delayed': delayed,
+            'closed': self._closed,
+        }
+
+
+_executor: Optional[BackgroundExecutor] = None
+_owner_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_executor() -> BackgroundExecutor:
+    global _executor, _owner_pid
+    pid = os.getpid()
+    if _executor is not None and _owner_pid == pid:
+        return _executor
+    with _lock:
+        if _executor is None or _owner_pid != pid:
+            _executor = BackgroundExecutor(
+                'background',
+                config.BACKGROUND_MAX_WORKERS,
+                config.BACKGROUND_QUEUE_SIZE,
+            )
+            _owner_pid = pid
+        return _executor
+
+
+def submit(fn: Callable, *args, overflow: Optional[Callable] = None, **kwargs) -> str:
+    return get_executor().submit(fn, *args, overflow=overflow, **kwargs)
+
+
+def schedule(delay_sec: float, fn: Callable, *args, overflow: Optional[Callable] = None, **kwargs) -> None:
+    get_executor().schedule(delay_sec, fn, *args, overflow=overflow, **kwargs)
+
+
+def shutdown(timeout: Optional[float] = None) -> None:
+    """进程退出前调用（FastAPI shutdown 事件）"""
+    with _lock:
+        executor = _executor if _owner_pid == os.getpid() else None
+    if executor is not None:
+        executor.shutdown(config.BACKGROUND_SHUTDOWN_TIMEOUT_SEC if timeout is None else timeout)
@@ -98,6 +98,8 @@ async def codex_start_script_conversation(
     if not conversation:
         raise HTTPException(status_code=500, detail='Codex 创建会话失败')
 
+    codex_model_type = resolve_codex_model_type()
+    ai_model = get_chat_ai_model(codex_model_type)
     user_profile = _user_profile_for_prompt(current_user)
     chat_messages = _build_chat_messages(
         conversation,
@@ -105,6 +107,7 @@ async def codex_start_script_conversation(
         user_content,
         current_snapshots=None,
         user_profile=user_profile,
+        model_name=ai_model.model_name,
     )
 
     with sm.transaction_scope() as sa:
@@ -115,16 +118,14 @@ async def codex_start_script_conversation(
             content=user_content,
         )
 
-    codex_model_type = resolve_codex_model_type()
-    ai_model = get_chat_ai_model(codex_model_type)
-    ai_model.reply = ''
     api_user_mobile = _resolve_api_user(current_user)
     stream_text_parts = []
     stream_error = ''
-    async for chunk in ai_model.reply_stream_text(
+    ai_stream = ai_model.reply_stream_text(
         chat_messages,
         user_mobile=api_user_mobile,
-    ):
+    )
+    async for chunk in ai_stream:
         payload = _parse_sse_payload(chunk)
         if not payload:
             continue
@@ -135,7 +136,7 @@ async def codex_start_script_conversation(
 
     ai_text = ''.join(stream_text_parts).strip()
     if not ai_text:
-        ai_text = (getattr(ai_model, 'reply', None) or '').strip()
+        ai_text = ai_stream.text.strip()
     if not ai_text and not stream_error:
         fallback_text = await ai_model.reply_text(
             chat_messages,
@@ -144,7 +145,12 @@ async def codex_start_script_conversation(
         ai_text = (fallback_text or '').strip()
 
     if ai_text:
-        persist_assistant_reply(conversation_id, ai_text, count_delta=2)
+        persist_assistant_reply(
+            conversation_id,
+            ai_text,
+            count_delta=2,
+            api_metadata=ai_stream.metadata() if ai_stream.text else None,
+        )
     else:
         with sm.transaction_scope() as sa:
             conv = Conversation.get_or_404(sa, conversation_id)
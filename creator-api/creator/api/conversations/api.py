@@ -3,17 +3,19 @@ import logging
 import json
 import os
 from typing import Optional
-from fastapi import Depends, Header, HTTPException
+from fastapi import Depends, Header, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
 from datetime import datetime
 
 from ...db import sm
 from .. import router as app
-from ..jwt import get_user, user_required
+from ..jwt import get_user, get_async_user, user_required
 from ..users.models import User
 from ..ai.openai_api import (
+    deepseek_ai,
     reply_text_default,
     get_chat_ai_model,
     resolve_conversation_model_type,
@@ -40,7 +42,7 @@ from .forms import (
     ArchiveResearchForm,
     ScriptMediaForm,
 )
-from .models import Conversation, Message, Script, UserStyleProfile, ScriptResearch, ScriptMedia
+from .models import Conversation, Message, MessageStreamChunk, Script, UserStyleProfile, ScriptResearch, ScriptMedia
 from .constants import (
     ConversationStatus,
     ConversationType,
@@ -53,10 +55,10 @@ from .constants import (
 )
 from .prompts import (
     get_conversation_system_prompt,
+    get_conversation_context_prompt,
     get_script_generation_prompt,
     get_script_extraction_prompt,
     build_script_reference_block,
-    SCRIPT_REFERENCE_USAGE_HINT,
     # 研究相关prompts
     get_research_system_prompt,
     get_research_initial_message,
@@ -66,6 +68,13 @@ from .prompts import (
 from ..media.models import MediaModel
 from ...config import config
 from .whisper_service import append_webm_segment
+from .status_events import build_message_processing_status, publish_status_on_commit, status_hub
+from .context import (
+    build_summary_message,
+    fit_history,
+    get_conversation_summary,
+    message_tokens,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -106,40 +115,20 @@ def _verify_message_access(db: Session, message_id: int, user_id: int):
     return message
 
 
-def _build_message_processing_status(message: Message) -> dict:
-    """构建语音处理状态（轮询 / SSE 共用）。"""
-    stream_chunks_data = message.stream_chunks or {}
-    chunks_list = stream_chunks_data.get('chunks', [])
-    partial_text = ''.join(
-        c.get('text', '') for c in sorted(chunks_list, key=lambda x: x.get('index', 0))
-    ) if chunks_list else None
-    transcription_status = message.transcription_status
-    transcription_error = message.transcription_error
-
-    # Whisper 冷启动/未就绪属于可恢复状态，尤其已有 partial 时不应在前端展示为失败。
-    if transcription_error and 'Whisper 服务未正确初始化' in transcription_error:
-        transcription_status = TranscriptionStatus.PROCESSING.value
-        transcription_error = None
+async def _averify_message_access(db: AsyncSession, message_id: int, user_id: int):
+    """_verify_message_access 的异步版本。"""
+    message = await Message.aget(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail='消息不存在')
 
-    return {
-        'message_id': message.id,
-        'transcription': {
-            'status': TranscriptionStatus.init(transcription_status).dump() if transcription_status else None,
-            'raw_text': message.raw_transcription,
-            'segments': message.transcription_segments,
-            'error': transcription_error,
-            'audio_duration': message.audio_duration,
-            'partial_text': partial_text,
-            'processed_chunks': message.stream_chunk_count or 0,
-        },
-        'refinement': {
-            'status': RefinementStatus.init(message.refinement_status).dump() if message.refinement_status else None,
-            'result': message.refinement_result,
-            'refined_content': message.refined_content,
-            'error': message.refinement_error,
-        },
-        'user_confirmed': bool(message.user_confirmed) if message.user_confirmed is not None else False,
-    }
+    owned = await Conversation.aexists(
+        db,
+        Conversation.id == message.conversation_id,
+        Conversation.user_id == user_id,
+    )
+    if not owned:
+        raise HTTPException(status_code=403, detail='无权访问此消息')
+    return message
 
 
 # ==================== 会话相关接口 ====================
@@ -260,6 +249,7 @@ async def delete_conversation(
 @user_required
 async def generate_conversation_title(
     conversation_id: int,
+    refresh: bool = False,
     db: Session = Depends(sm.get_db),
     current_user: User = Depends(get_user)
 ):
@@ -268,7 +258,7 @@ async def generate_conversation_title(
     
     逻辑：
     1. 如果第一条消息≤5个字，直接使用原文作为标题
-    2. 如果>5个字，调用AI生成简短标题（5-15字）
+    2. 如果>5个字，调用AI生成简短标题（5-15字）；相同消息复用缓存结果，refresh=true 时重新生成
     """
     # 1. 验证会话是否属于当前用户
     conversation = db.query(Conversation).filter(
@@ -311,7 +301,9 @@ async def generate_conversation_title(
             ]
             
             # 调用AI（非流式，直接获取结果）
-            generated_title = await reply_text_default(messages, current_user)
+            generated_title = await reply_text_default(
+                messages, current_user, cache=True, refresh=refresh
+            )
             
             # 清理标题（去除引号、标点、换行等）
             generated_title = generated_title.strip().strip('"\'""''。，！？、：；\n\r')
@@ -523,7 +515,7 @@ async def create_voice_stream_chunk(
             message.transcription_status = TranscriptionStatus.PROCESSING.value
             message.refinement_status = RefinementStatus.PENDING.value
             message.user_confirmed = 0
-            message.stream_chunks = {'chunks': [], 'last_end_time': 0.0}
+            message.stream_last_end_time = 0.0
             message.stream_chunk_count = 0
             result = message.dump()
 
@@ -600,69 +592,234 @@ async def create_voice_stream_chunk(
     )
 
 
+def _duplicate_chunk_response(message_id: int, chunk_index: int, is_final: bool, size: int) -> dict:
+    """重试的分块已写入过：直接确认，size 为主录音当前字节数"""
+    return dict(
+        success=True,
+        data={
+            'message_id': message_id,
+            'chunk_index': chunk_index,
+            'is_final': is_final,
+            'size': size,
+            'duplicate': True,
+        },
+        message='分块已接收'
+    )
+
+
+@app.post('/web/conversations/{conversation_id}/voice-stream/chunks')
+@user_required
+async def ingest_voice_stream_chunk(
+    conversation_id: int,
+    request: Request,
+    chunk_index: int = Query(..., ge=0, description='块序号（0-based）'),
+    message_id: Optional[int] = Query(None, gt=0, description='消息ID（首块为空，后续块必填）'),
+    offset: Optional[int] = Query(None, ge=0, description='本块写入前主录音应有的字节数（幂等校验）'),
+    upload_id: Optional[str] = Query(None, max_length=64, description='客户端为本次录音生成的ID（首块重试幂等）'),
+    is_final: bool = Query(False, description='是否为最终块'),
+    db: Session = Depends(sm.get_db),
+    current_user: User = Depends(get_user)
+):
+    """
+    流式语音分块直写接口（请求体为切片原始字节）
+
+    与 voice-stream 语义一致，但切片不经 /media 落成独立文件：
+    - 首块（chunk_index=0, message_id 为空）：请求体即主录音，创建 Media + Message；
+      带 upload_id 重试首块时返回已创建的消息，不重复创建
+    - 后续块：请求体直接追加到主录音；offset 与主录音长度不符时按重试（已写入）或缺块（409）处理
+    返回的 size 为主录音当前字节数，即下一块的 offset。
+    """
+    from .voice_ingest import (
+        ChunkAppendResult, append_chunk, bind_upload, cache_owner, claim_upload, get_owner,
+        release_upload, write_master_recording,
+    )
+
+    if chunk_index == 0 and message_id is None:
+        conversation = db.query(Conversation.id).filter(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        ).first()
+        if not conversation:
+            raise HTTPException(status_code=404, detail='会话不存在')
+
+        if upload_id:
+            existing_id = claim_upload(current_user.id, upload_id)
+            if existing_id == 0:
+                return JSONResponse(
+                    status_code=409,
+                    content={'success': False, 'error': {'message': '首块正在写入，请稍后重试'}},
+                )
+            if existing_id:
+                owner = get_owner(db, existing_id)
+                if not owner or owner['conversation_id'] != conversation_id:
+                    raise HTTPException(status_code=404, detail='消息不存在或已取消')
+                size = os.path.getsize(os.path.join(config.UPLOADS_DEFAULT_DEST, owner['filename']))
+                logger.info(f'♻️ 语音首块重复提交，已忽略: message_id={existing_id}, upload_id={upload_id}')
+                return _duplicate_chunk_response(existing_id, chunk_index, is_final, size)
+
+        try:
+            try:
+                filename, sha256, size = await write_master_recording(request.stream())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            with sm.transaction_scope() as sa:
+                media = MediaModel.create(sa, profile={})
+                media.filename = filename
+                media.sha256 = sha256
+                media.size = size
+                message = Message.create(
+                    sa,
+                    conversation_id=conversation_id,
+                    role=MessageRole.USER.value,
+                    content=''
+                )
+                message.audio_media_id = media.id
+                message.transcription_status = TranscriptionStatus.PROCESSING.value
+                message.refinement_status = RefinementStatus.PENDING.value
+                message.user_confirmed = 0
+                message.stream_last_end_time = 0.0
+                message.stream_chunk_count = 0
+                message_id = message.id
+                master_media_id = media.id
+        except BaseException:
+            if upload_id:
+                release_upload(current_user.id, upload_id)
+            raise
+
+        if upload_id:
+            bind_upload(current_user.id, upload_id, message_id)
+        cache_owner(message_id, current_user.id, conversation_id, master_media_id, filename)
+    else:
+        if not message_id:
+            raise HTTPException(status_code=400, detail='非首块请求必须提供 message_id')
+
+        owner = get_owner(db, message_id)
+        if not owner:
+            raise HTTPException(status_code=404, detail='消息不存在或已取消')
+        if owner['user_id'] != current_user.id or owner['conversation_id'] != conversation_id:
+            raise HTTPException(status_code=403, detail='无权访问此消息')
+
+        master_media_id = owner['media_id']
+        master_path = os.path.join(config.UPLOADS_DEFAULT_DEST, owner['filename'])
+        try:
+            result, size = await append_chunk(master_path, request.stream(), offset)
+        except (FileNotFoundError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except TimeoutError:
+            return JSONResponse(
+                status_code=409,
+                content={'success': False, 'error': {'message': '主录音正在写入，请稍后重试'}},
+            )
+
+        if result == ChunkAppendResult.GAP:
+            return JSONResponse(
+                status_code=409,
+                content={
+                    'success': False,
+                    'error': {'message': '前序分块缺失，请从 size 处续传'},
+                    'data': {'message_id': message_id, 'size': size},
+                },
+            )
+        if result == ChunkAppendResult.DUPLICATE:
+            logger.info(f'♻️ 语音分块重复提交，已忽略: message_id={message_id}, chunk_index={chunk_index}')
+            return _duplicate_chunk_response(message_id, chunk_index, is_final, size)
+
+    from .tasks import dispatch_transcribe_voice_chunk
+    dispatch_result = dispatch_transcribe_voice_chunk(
+        message_id,
+        master_media_id,
+        chunk_index,
+        is_final
+    )
+    logger.info(
+        '语音分块直写并分发转写: message_id=%s, chunk_index=%s, size=%s, is_final=%s, mode=%s',
+        message_id,
+        chunk_index,
+        size,
+        is_final,
+        dispatch_result,
+    )
+
+    return dict(
+        success=True,
+        data={
+            'message_id': message_id,
+            'chunk_index': chunk_index,
+            'is_final': is_final,
+            'size': size,
+        },
+        message='分块已接收，正在转写...'
+    )
+
+
 @app.get('/web/messages/{message_id}/processing-status')
 @user_required
 async def get_message_processing_status(
     message_id: int,
-    db: Session = Depends(sm.get_db),
-    current_user: User = Depends(get_user)
+    db: AsyncSession = Depends(sm.get_async_db),
+    current_user: User = Depends(get_async_user)
 ):
     """
     查询消息处理状态（轮询接口）
     
     返回转写和整理的进度状态
     """
-    message = _verify_message_access(db, message_id, current_user.id)
-    return dict(success=True, data=_build_message_processing_status(message))
+    message = await _averify_message_access(db, message_id, current_user.id)
+    chunks = await MessageStreamChunk.alist_for(db, message_id)
+    return dict(success=True, data=build_message_processing_status(message, chunks))
 
 
 @app.get('/web/messages/{message_id}/processing-status/stream')
 @user_required
 async def stream_message_processing_status(
     message_id: int,
-    db: Session = Depends(sm.get_db),
-    current_user: User = Depends(get_user)
+    db: AsyncSession = Depends(sm.get_async_db),
+    current_user: User = Depends(get_async_user)
 ):
     """
     语音处理状态 SSE 推送（有更新时推送，完成/失败后结束）
     """
-    _verify_message_access(db, message_id, current_user.id)
+    await _averify_message_access(db, message_id, current_user.id)
 
     async def event_generator():
-        last_signature = None
-        idle_rounds = 0
-        max_idle_rounds = 120  # 0.5s * 120 ≈ 60s 无变化后结束
+        # 先订阅再读快照，避免两者之间的状态变更丢失
+        queue = status_hub.subscribe(message_id)
+        try:
+            async with sm.async_transaction_scope() as sa:
+                message = await Message.aget_or_404(sa, message_id)
+                chunks = await MessageStreamChunk.alist_for(sa, message_id)
+                status_data = build_message_processing_status(message, chunks)
 
-        while idle_rounds < max_idle_rounds:
-            with sm.transaction_scope() as sa:
-                message = Message.get_or_404(sa, message_id)
-                status_data = _build_message_processing_status(message)
-
-            trans = status_data.get('transcription') or {}
-            trans_status = (trans.get('status') or {}).get('name')
-            signature = (
-                trans.get('partial_text'),
-                trans.get('processed_chunks'),
-                trans_status,
-                trans.get('raw_text'),
-                trans.get('error'),
-            )
+            last_signature = None
+            while True:
+                trans = status_data.get('transcription') or {}
+                trans_status = (trans.get('status') or {}).get('name')
+                signature = (
+                    trans.get('partial_text'),
+                    trans.get('processed_chunks'),
+                    trans_status,
+                    trans.get('raw_text'),
+                    trans.get('error'),
+                )
 
-            if signature != last_signature:
-                payload = json.dumps({'success': True, 'data': status_data}, ensure_ascii=False)
-                yield f'data: {payload}\n\n'
-                last_signature = signature
-                idle_rounds = 0
-            else:
-                idle_rounds += 1
+                if signature != last_signature:
+                    payload = json.dumps({'success': True, 'data': status_data}, ensure_ascii=False)
+                    yield f'data: {payload}\n\n'
+                    last_signature = signature
 
-            if trans_status in ('COMPLETED', 'FAILED'):
-                yield f'data: {json.dumps({"done": True}, ensure_ascii=False)}\n\n'
-                return
+                if trans_status in ('COMPLETED', 'FAILED'):
+                    break
 
-            await asyncio.sleep(0.5)
+                try:
+                    # 60s 无更新后结束，前端可重新连接
+                    status_data = await asyncio.wait_for(queue.get(), timeout=60)
+                except asyncio.TimeoutError:
+                    break
 
-        yield f'data: {json.dumps({"done": True}, ensure_ascii=False)}\n\n'
+            yield f'data: {json.dumps({"done": True}, ensure_ascii=False)}\n\n'
+        finally:
+            status_hub.unsubscribe(message_id, queue)
 
     return StreamingResponse(
         event_generator(),
@@ -766,6 +923,9 @@ async def delete_draft_message(
         msg = Message.get_or_404(sa, message_id)
         sa.delete(msg)
 
+    from .voice_ingest import forget_owner
+    forget_owner(message_id)
+
     return dict(success=True, data={'deleted_id': message_id})
 
 
@@ -828,6 +988,7 @@ async def retry_message_processing(
     # 更新状态并触发重试
     with sm.transaction_scope() as sa:
         msg = Message.get_or_404(sa, message_id)
+        publish_status_on_commit(sa, msg)
         
         if form.retry_type == 'transcription':
             # 重置转写状态
@@ -1029,6 +1190,7 @@ async def delete_script(
 @user_required
 async def extract_script_from_conversation(
     conversation_id: int,
+    refresh: bool = False,
     db: Session = Depends(sm.get_db),
     current_user: User = Depends(get_user)
 ):
@@ -1039,7 +1201,7 @@ async def extract_script_from_conversation(
     1. 验证会话是否属于当前用户
     2. 获取对话的所有消息
     3. 检查是否有AI回复（至少要有对话）
-    4. 调用AI提取脚本（使用提取提示词）
+    4. 调用AI提取脚本（使用提取提示词；相同对话复用缓存结果，refresh=true 时重新提取）
     5. 解析返回的JSON
     6. 验证是否有脚本内容
     7. 返回结构化数据
@@ -1072,18 +1234,31 @@ async def extract_script_from_conversation(
             detail='对话中没有AI回复，请先与AI进行讨论'
         )
 
-    # 4. 构建消息列表供AI分析
+    # 4. 构建消息列表供AI分析（超出 token 预算时只保留最近消息，较早部分用会话摘要代替）
     conversation_messages = []
     for msg in messages:
+        if not (msg.content or '').strip():
+            continue
         conversation_messages.append({
             'role': msg.role,
             'content': msg.content
         })
+    conversation_messages, dropped = fit_history(
+        conversation_messages,
+        config.CHAT_EXTRACT_TOKEN_BUDGET,
+        deepseek_ai.model_name,
+    )
+    earlier_summary = get_conversation_summary(conversation)[0] if dropped else ''
+    if dropped:
+        logger.info(f"提取脚本对话截断: conversation_id={conversation_id}, dropped={dropped}")
 
     # 5. 调用AI提取脚本
     try:
         # 生成提取提示词
-        extraction_prompt = get_script_extraction_prompt(conversation_messages)
+        extraction_prompt = get_script_extraction_prompt(
+            conversation_messages,
+            earlier_summary=earlier_summary,
+        )
         
         # 构建AI消息
         ai_messages = [
@@ -1095,7 +1270,7 @@ async def extract_script_from_conversation(
         
         # 默认 DeepSeek；脚本较长时使用 8000 tokens
         ai_response = await reply_text_default(
-            ai_messages, current_user, max_tokens=8000
+            ai_messages, current_user, max_tokens=8000, cache=True, refresh=refresh
         )
         
         logger.info(f"AI提取响应: {ai_response}")
@@ -1304,13 +1479,13 @@ def _normalize_script_ids(script_ids):
     return result
 
 
-def _load_user_scripts(db: Session, user_id: int, script_ids: list):
+async def _aload_user_scripts(db: AsyncSession, user_id: int, script_ids: list):
     if not script_ids:
         return []
-    scripts = db.query(Script).filter(
+    scripts = (await db.scalars(select(Script).filter(
         Script.id.in_(script_ids),
         Script.user_id == user_id,
-    ).all()
+    ))).all()
     if len(scripts) != len(script_ids):
         raise HTTPException(status_code=400, detail='部分脚本不存在或无权访问')
     by_id = {script.id: script for script in scripts}
@@ -1365,15 +1540,19 @@ def _ai_content_for_message(msg: Message, snapshot_override=None) -> str:
     return text
 
 
+def _truncate_chat_text(text: str, max_chars: int) -> str:
+    if len(text) > max_chars:
+        text = text[:max_chars] + '\n\n…（前文已截断，仅保留最近内容供 AI 参考）'
+    return text
+
+
 def _trim_chat_messages_dict(messages: list, max_messages: int, max_chars_per_msg: int) -> list:
     trimmed = []
     for item in messages[-max_messages:]:
         text = (item.get('content') or '').strip()
         if not text:
             continue
-        if len(text) > max_chars_per_msg:
-            text = text[:max_chars_per_msg] + '\n\n…（前文已截断，仅保留最近内容供 AI 参考）'
-        trimmed.append({'role': item['role'], 'content': text})
+        trimmed.append({'role': item['role'], 'content': _truncate_chat_text(text, max_chars_per_msg)})
     return trimmed
 
 
@@ -1399,20 +1578,47 @@ def _build_chat_messages(
     user_content: str,
     current_snapshots=None,
     user_profile: dict = None,
+    model_name: str = None,
 ) -> list:
-    """构建发给模型的消息列表（引用脚本注入到对应 user 消息）。"""
-    chat_messages = []
-    system_prompt = get_conversation_system_prompt(
-        conversation.topic,
-        user_profile=user_profile,
-    )
-    system_prompt = f'{system_prompt}\n{SCRIPT_REFERENCE_USAGE_HINT}'
-    chat_messages.append({'role': 'system', 'content': system_prompt})
+    """
+    构建发给模型的消息列表（引用脚本注入到对应 user 消息）。
+
+    顺序按变化频率由低到高排列，便于命中模型服务端的提示词缓存：
+    固定系统提示词（所有会话相同）→ 对话背景（主题、用户画像，同一会话内不变）→
+    会话摘要（折叠时才变）→ 历史消息（只追加）→ 当前消息。
+    当前消息与历史消息按同样规则截断，下一轮它作为历史时内容不变。
+
+    历史按 CHAT_CONTEXT_TOKEN_BUDGET 从最新往前装（model_name 决定 tokenizer）；已折叠进
+    会话摘要的较早消息不再发送原文。
+    """
+    chat_messages = [
+        {'role': 'system', 'content': get_conversation_system_prompt()},
+        {'role': 'system', 'content': get_conversation_context_prompt(conversation.topic, user_profile=user_profile)},
+    ]
+
+    summary_text, covered_message_id = get_conversation_summary(conversation)
+    budget = config.CHAT_CONTEXT_TOKEN_BUDGET - sum(message_tokens(m, model_name) for m in chat_messages)
+    if summary_text:
+        summary_message = build_summary_message(summary_text)
+        chat_messages.append(summary_message)
+        budget -= message_tokens(summary_message, model_name)
+
+    current_text = ''
+    if user_content and user_content.strip():
+        current_text = user_content.strip()
+        if current_snapshots:
+            ref_block = build_script_reference_block(current_snapshots)
+            if ref_block:
+                current_text = ref_block + '\n\n---\n\n' + current_text
+        current_text = _truncate_chat_text(current_text, config.CHAT_MAX_MESSAGE_CHARS)
+        budget -= message_tokens({'content': current_text}, model_name)
 
     history_items = []
     for msg in db_messages:
         if msg.role not in ('user', 'assistant'):
             continue
+        if msg.id is not None and msg.id <= covered_message_id:
+            continue
         content = _ai_content_for_message(msg)
         if content:
             history_items.append({'role': msg.role, 'content': content})
@@ -1422,15 +1628,18 @@ def _build_chat_messages(
         config.CHAT_MAX_HISTORY_MESSAGES,
         config.CHAT_MAX_MESSAGE_CHARS,
     )
+    history_items, dropped = fit_history(history_items, max(budget, 0), model_name)
+    if dropped:
+        logger.info(
+            '对话上下文按 token 预算截断: conversation_id=%s dropped=%s budget=%s',
+            conversation.id,
+            dropped,
+            config.CHAT_CONTEXT_TOKEN_BUDGET,
+        )
     for item in history_items:
         chat_messages.append(item)
 
-    if user_content and user_content.strip():
-        current_text = user_content.strip()
-        if current_snapshots:
-            ref_block = build_script_reference_block(current_snapshots)
-            if ref_block:
-                current_text = ref_block + '\n\n---\n\n' + current_text
+    if current_text:
         last = chat_messages[-1] if chat_messages else None
         if not last or last.get('role') != 'user' or last.get('content') != current_text:
             chat_messages.append({'role': 'user', 'content': current_text})
@@ -1447,32 +1656,31 @@ def _apply_message_script_references(message: Message, script_ids: list, snapsho
 @user_required
 async def chat_stream(
     form: ChatStreamForm,
-    db: Session = Depends(sm.get_db),
-    current_user: User = Depends(get_user)
+    db: AsyncSession = Depends(sm.get_async_db),
+    current_user: User = Depends(get_async_user)
 ):
     """AI流式对话接口（SSE）"""
     # 验证会话是否属于当前用户
-    conversation = db.query(Conversation).filter(
+    conversation = await db.scalar(select(Conversation).filter(
         Conversation.id == form.conversation_id,
         Conversation.user_id == current_user.id
-    ).first()
+    ))
 
     if not conversation:
         raise HTTPException(status_code=404, detail='会话不存在')
 
     script_ids = _normalize_script_ids(form.referenced_script_ids)
-    referenced_scripts = _load_user_scripts(db, current_user.id, script_ids) if script_ids else []
+    referenced_scripts = await _aload_user_scripts(db, current_user.id, script_ids) if script_ids else []
     current_snapshots = _build_script_snapshots(referenced_scripts) if referenced_scripts else []
 
     if form.message_id:
-        with sm.transaction_scope() as sa:
-            existing = sa.query(Message).filter(
+        async with sm.async_transaction_scope() as sa:
+            msg = await sa.scalar(select(Message).filter(
                 Message.id == form.message_id,
                 Message.conversation_id == form.conversation_id,
-            ).first()
-            if not existing:
+            ))
+            if not msg:
                 raise HTTPException(status_code=404, detail='消息不存在')
-            msg = Message.get_or_404(sa, form.message_id)
             if msg.content != form.content:
                 msg.content = form.content
             msg.updated_at = datetime.utcnow()
@@ -1480,13 +1688,19 @@ async def chat_stream(
                 _apply_message_script_references(msg, script_ids, current_snapshots)
 
     # 获取会话历史消息
-    messages = db.query(Message).filter(
+    messages = (await db.scalars(select(Message).filter(
         Message.conversation_id == form.conversation_id
-    ).order_by(Message.created_at).all()
+    ).order_by(Message.created_at))).all()
 
     # 语音确认等场景：用户消息已在库中，勿重复追加
     pending_user_content = '' if form.message_id else form.content
     pending_snapshots = None if form.message_id else (current_snapshots or None)
+    # 创作对话模型（config.CHAT_CONVERSATION_MODEL_TYPE，可选允许 form.model_type 覆盖）
+    chat_model_type = resolve_conversation_model_type(form.model_type)
+    ai_model = get_chat_ai_model(chat_model_type)
+    # 所选供应商熔断时 get_chat_ai_model 会换用备选：响应头、日志与断线兜底都按实际供应商
+    chat_model_type = ai_model.provider
+
     user_profile = _user_profile_for_prompt(current_user)
     chat_messages = _build_chat_messages(
         conversation,
@@ -1494,14 +1708,9 @@ async def chat_stream(
         pending_user_content,
         current_snapshots=pending_snapshots,
         user_profile=user_profile,
+        model_name=ai_model.model_name,
     )
 
-    if len(messages) > config.CHAT_MAX_HISTORY_MESSAGES:
-        logger.info(
-            'chat-stream 上下文截断: conversation_id=%s total=%s',
-            form.conversation_id,
-            len(messages),
-        )
     if current_snapshots:
         ref_chars = sum(len((s.get('content') or '')) for s in current_snapshots)
         logger.info(
@@ -1511,9 +1720,6 @@ async def chat_stream(
             ref_chars,
         )
 
-    # 创作对话模型（config.CHAT_CONVERSATION_MODEL_TYPE，可选允许 form.model_type 覆盖）
-    chat_model_type = resolve_conversation_model_type(form.model_type)
-    ai_model = get_chat_ai_model(chat_model_type)
     logger.info(
         "chat-stream: conversation_id=%s request_model_type=%r resolved=%s model=%s",
         form.conversation_id,
@@ -1527,14 +1733,17 @@ async def chat_stream(
 
     # 定义流式生成器（客户端断开后仍后台读完并落库）
     async def generate_stream():
-        ai_model.reply = ''
+        ai_stream = ai_model.reply_stream_text(
+            chat_messages,
+            user_mobile=api_user_mobile,
+        )
         chunk_queue = asyncio.Queue()
         count_delta_local = count_delta
 
         # 如果传入了message_id，使用已存在的消息，不创建新的用户消息
         if not form.message_id:
-            with sm.transaction_scope() as sa:
-                user_message = Message.create(
+            async with sm.async_transaction_scope() as sa:
+                user_message = await Message.acreate(
                     sa,
                     conversation_id=form.conversation_id,
                     role='user',
@@ -1562,10 +1771,7 @@ async def chat_stream(
 
         async def consume_ai():
             try:
-                async for chunk in ai_model.reply_stream_text(
-                    chat_messages,
-                    user_mobile=api_user_mobile,
-                ):
+                async for chunk in ai_stream:
                     await chunk_queue.put(chunk)
             except Exception:
                 logger.exception(
@@ -1575,12 +1781,14 @@ async def chat_stream(
                 )
             finally:
                 await chunk_queue.put(None)
-                ai_text = (getattr(ai_model, 'reply', None) or '').strip()
+                ai_text = ai_stream.text.strip()
                 if ai_text:
-                    persist_assistant_reply(
+                    await asyncio.to_thread(
+                        persist_assistant_reply,
                         form.conversation_id,
                         ai_text,
                         count_delta_local,
+                        ai_stream.metadata(),
                     )
 
         consumer_task = asyncio.create_task(consume_ai())
@@ -1595,19 +1803,16 @@ async def chat_stream(
                 yield chunk
         except asyncio.CancelledError:
             client_disconnected = True
-            partial = (getattr(ai_model, 'reply', None) or '').strip()
+            # 停止生成；消费任务收尾时经 asyncio.to_thread 把已生成的部分回复落库
+            consumer_task.cancel()
+            await asyncio.gather(consumer_task, return_exceptions=True)
+            partial = ai_stream.text.strip()
             logger.warning(
                 'chat-stream 客户端断开: conversation_id=%s partial_len=%s',
                 form.conversation_id,
                 len(partial),
             )
-            if partial:
-                persist_assistant_reply(
-                    form.conversation_id,
-                    partial,
-                    count_delta_local,
-                )
-            else:
+            if not partial:
                 schedule_complete_chat_reply(
                     form.conversation_id,
                     chat_messages,
@@ -1713,13 +1918,11 @@ async def generate_script(
 
     # 定义流式生成器
     async def generate_stream():
-        script_content = ""
-        
         # 调用AI生成脚本
-        async for chunk in ai_model.reply_stream_text(chat_messages, current_user):
+        ai_stream = ai_model.reply_stream_text(chat_messages, current_user)
+        async for chunk in ai_stream:
             yield chunk
-            if hasattr(ai_model, 'reply'):
-                script_content = ai_model.reply
+        script_content = ai_stream.text
 
         # 生成完成后保存脚本
         if script_content:
@@ -2051,10 +2254,10 @@ async def research_chat(
         ai_response_content = ""
         
         try:
-            async for chunk in ai_model.reply_stream_text(conversation_history, current_user):
+            ai_stream = ai_model.reply_stream_text(conversation_history, current_user)
+            async for chunk in ai_stream:
                 yield chunk
-                if hasattr(ai_model, 'reply'):
-                    ai_response_content = ai_model.reply
+            ai_response_content = ai_stream.text
             
             # 保存AI回复消息
             if ai_response_content:
@@ -2206,6 +2409,7 @@ async def analyze_research(
         result_text = await reply_text_default(
             messages=[{"role": "user", "content": analyze_prompt}],
             max_tokens=2000,
+            cache=True,
         )
         
         # 解析AI返回的结果
@@ -2534,9 +2738,9 @@ async def share_script(
     db: Session = Depends(sm.get_db),
     current_user: User = Depends(get_user),
 ):
-    """导出脚本分享包（ZIP：index.html + 本地图片资源）"""
-    import io
-    from .script_share import build_script_share_zip, build_content_disposition
+    """导出脚本分享包（ZIP：index.html + 本地图片资源）；内容未变时直接返回缓存的 ZIP"""
+    from fastapi.responses import FileResponse
+    from .script_share import prepare_script_share, stream_script_share_zip, build_content_disposition
 
     script = db.query(Script).filter(
         Script.id == script_id,
@@ -2545,13 +2749,18 @@ async def share_script(
     if not script:
         raise HTTPException(status_code=404, detail='脚本不存在')
 
-    zip_bytes, filename = build_script_share_zip(db, script, current_user.id)
+    export = prepare_script_share(db, script, current_user.id)
+    # 先查缓存：命中时下载文件名取缓存包的导出时间
+    cached_path = export.cached_path()
+    headers = {
+        'Content-Disposition': build_content_disposition(export.filename),
+    }
+    if cached_path:
+        return FileResponse(cached_path, media_type='application/zip', headers=headers)
     return StreamingResponse(
-        io.BytesIO(zip_bytes),
+        stream_script_share_zip(export),
         media_type='application/zip',
-        headers={
-            'Content-Disposition': build_content_disposition(filename),
-        },
+        headers=headers,
     )
 
 
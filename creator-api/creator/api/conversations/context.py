@@ -0,0 +1,142 @@
+"""
+对话上下文组装（按 token 预算）
+
+- count_tokens / message_tokens：用 tiktoken 计数，编码按模型名选择；DeepSeek、通义、豆包等
+  没有公开的 tiktoken 编码，统一用 cl100k_base 近似（预算留有余量）；编码加载失败时按字符数估算，
+  ENCODING_RETRY_SEC 内不再重试（加载会阻塞下载 BPE 文件，对话接口在事件循环里同步调用）
+- fit_history：从最新一条往前装，直到用完 token 预算
+- 会话摘要存于 Conversation.context_summary：
+    {'text': 摘要正文, 'covered_message_id': 已折叠进摘要的最后一条消息 id,
+     'covered_count': 已折叠的消息条数, 'updated_at': 更新时间}
+  组装上下文时只取 covered_message_id 之后的原文，摘要作为一条 system 消息放在历史之前；
+  每轮回复落库后由 update_conversation_summary_task 把超出 CHAT_SUMMARY_TRIGGER_TOKENS 的
+  较早轮次增量折叠进摘要（只把新增轮次与旧摘要一起交给模型，不重读整段对话）
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = 'cl100k_base'
+# 每条消息的格式开销（role 与分隔符），与 utils.num_tokens_from_messages 一致
+MESSAGE_OVERHEAD_TOKENS = 4
+# 编码加载失败后多久再重试（秒）
+ENCODING_RETRY_SEC = 300
+
+_encodings: Dict[str, object] = {}
+_encoding_retry_at: Dict[str, float] = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding_for(model_name: Optional[str]):
+    key = model_name or DEFAULT_ENCODING
+    encoding = _encodings.get(key)
+    if encoding is not None:
+        return encoding
+    if time.monotonic() < _encoding_retry_at.get(key, 0.0):
+        return None
+    with _encodings_lock:
+        encoding = _encodings.get(key)
+        if encoding is not None:
+            return encoding
+        if time.monotonic() < _encoding_retry_at.get(key, 0.0):
+            return None
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name) if model_name else None
+            except KeyError:
+                encoding = None
+            if encoding is None:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as exc:
+            # 编码文件下载失败等：按字符估算，ENCODING_RETRY_SEC 后再尝试加载
+            _encoding_retry_at[key] = time.monotonic() + ENCODING_RETRY_SEC
+            logger.warning(f'tiktoken 编码加载失败，{ENCODING_RETRY_SEC}s 内按字符数估算 token: {exc}')
+            return None
+        _encoding_retry_at.pop(key, None)
+        _encodings[key] = encoding
+        return encoding
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message: dict, model_name: Optional[str] = None) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get('content') or '', model_name)
+
+
+def fit_history(items: List[dict], budget: int, model_name: Optional[str] = None) -> Tuple[List[dict], int]:
+    """
+    从最新一条往前保留，直到超出 budget（至少保留最新一条）。
+
+    Returns:
+        (保留的消息（按时间顺序）, 被丢弃的较早消息条数)
+    """
+    kept = []
+    used = 0
+    for item in reversed(items):
+        tokens = message_tokens(item, model_name)
+        if kept and used + tokens > budget:
+            break
+        kept.append(item)
+        used += tokens
+    kept.reverse()
+    return kept, len(items) - len(kept)
+
+
+def get_conversation_summary(conversation) -> Tuple[str, int]:
+    """返回 (摘要正文, 已折叠进摘要的最后一条消息 id)；没有摘要时为 ('', 0)"""
+    data = conversation.context_summary
+    if not isinstance(data, dict):
+        return '', 0
+    return (data.get('text') or '').strip(), int(data.get('covered_message_id') or 0)
+
+
+def build_summary_message(summary_text: str) -> dict:
+    return {
+        'role': 'system',
+        'content': (
+            '## 早前对话摘要\n'
+            '以下是本次对话较早轮次的摘要（原文已省略），请结合摘要理解后续对话：\n\n'
+            f'{summary_text}'
+        ),
+    }
+
+
+def plan_summary_fold(history: List[dict], model_name: Optional[str] = None) -> List[dict]:
+    """
+    选出应折叠进摘要的较早消息（history 为摘要之后的原文，按时间顺序）。
+
+    未摘要部分不超过 CHAT_SUMMARY_TRIGGER_TOKENS 时返回空列表；否则保留最近
+    CHAT_SUMMARY_KEEP_RECENT_TOKENS 的原文，其余较早消息折叠，且折叠边界对齐到
+    assistant 回复（只折叠完整的轮次）。
+    """
+    tokens = [message_tokens(item, model_name) for item in history]
+    if sum(tokens) <= config.CHAT_SUMMARY_TRIGGER_TOKENS:
+        return []
+
+    split = len(history)
+    recent = 0
+    for i in range(len(history) - 1, -1, -1):
+        if recent + tokens[i] > config.CHAT_SUMMARY_KEEP_RECENT_TOKENS:
+            break
+        recent += tokens[i]
+        split = i
+    # 最新一条本身超出保留额度时也至少保留它的原文
+    split = min(split, len(history) - 1)
+    while split > 0 and history[split - 1].get('role') != 'assistant':
+        split -= 1
+    return history[:split]
@@ -6,14 +6,19 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     Boolean,
+    Float,
+    UniqueConstraint,
+    select,
 )
 import logging
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from sqlalchemy.orm import (
     Mapped,
+    Session,
     mapped_column,
 )
+from sqlalchemy.ext.asyncio import AsyncSession
 from ...db import (
     CRUDMixin,
     ProfileMixin,
@@ -115,6 +120,30 @@ class Message(CRUDMixin, ProfileMixin):
     )
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
 
+    # ===== 语音处理的高频读写 / 查询字段（独立列，写入时不重写整个 profile）=====
+    audio_media_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True, index=True, comment='音频文件Media ID（关联media表）'
+    )
+    transcription_status: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, index=True, comment='转写状态（TranscriptionStatus枚举值）'
+    )
+    refinement_status: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, index=True, comment='整理状态（RefinementStatus枚举值）'
+    )
+    user_confirmed: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, comment='用户是否确认（0=未确认, 1=已确认）'
+    )
+    raw_transcription: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, comment='原始转写文本（口语化、未整理）'
+    )
+    # 流式分块转写进度；各块结果见 MessageStreamChunk
+    stream_chunk_count: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, comment='已完成转写的块数（用于轮询时判断进度）'
+    )
+    stream_last_end_time: Mapped[Optional[float]] = mapped_column(
+        Float, nullable=True, comment='已转写到的录音时间点（秒）'
+    )
+
     # ===== 原有字段 =====
     @string_property
     def audio_url(self):
@@ -137,21 +166,6 @@ class Message(CRUDMixin, ProfileMixin):
         pass
 
     # ===== 语音识别相关字段 =====
-    @integer_property
-    def audio_media_id(self):
-        """音频文件Media ID（关联media表）"""
-        pass
-
-    @integer_property
-    def transcription_status(self):
-        """转写状态（TranscriptionStatus枚举值）"""
-        pass
-
-    @string_property
-    def raw_transcription(self):
-        """原始转写文本（口语化、未整理）"""
-        pass
-
     @object_property
     def transcription_segments(self):
         """转写分段信息（仅长音频，用于前端展示）
@@ -177,11 +191,6 @@ class Message(CRUDMixin, ProfileMixin):
         """转写错误信息（如果失败）"""
         pass
 
-    @integer_property
-    def refinement_status(self):
-        """整理状态（RefinementStatus枚举值）"""
-        pass
-
     @object_property
     def refinement_result(self):
         """AI整理结果
@@ -206,35 +215,6 @@ class Message(CRUDMixin, ProfileMixin):
         """整理错误信息（如果失败）"""
         pass
 
-    @integer_property
-    def user_confirmed(self):
-        """用户是否确认（0=未确认, 1=已确认）"""
-        pass
-
-    # ===== 流式分块转写相关字段 =====
-    @object_property
-    def stream_chunks(self):
-        """分块转写结果，用于流式上传时追踪各块的转写进度
-        {
-            "chunks": [
-                {
-                    "index": 0,
-                    "media_id": 123,
-                    "text": "第一块的转写文本...",
-                    "end_time": 28.5
-                },
-                ...
-            ],
-            "last_end_time": 57.2
-        }
-        """
-        pass
-
-    @integer_property
-    def stream_chunk_count(self):
-        """已完成转写的块数（用于轮询时判断进度）"""
-        pass
-
     @array_property
     def referenced_script_ids(self):
         """本条消息引用的脚本 ID 列表"""
@@ -289,6 +269,72 @@ class Message(CRUDMixin, ProfileMixin):
         )
 
 
+class MessageStreamChunk(CRUDMixin):
+    """
+    流式录音的分块转写结果
+
+    只追加：每块一行，(message_id, chunk_index) 唯一（重复任务插入即冲突），
+    每块的写入量与已转写文本总长无关。
+    """
+    __tablename__ = 'message_stream_chunks'
+    __table_args__ = (
+        UniqueConstraint('message_id', 'chunk_index', name='uq_message_stream_chunks_message_chunk'),
+    )
+
+    message_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey('messages.id', ondelete='CASCADE'), comment='消息ID'
+    )
+    chunk_index: Mapped[int] = mapped_column(
+        Integer, comment='块序号（0-based）'
+    )
+    media_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True, comment='转写所用的音频 Media ID'
+    )
+    text: Mapped[str] = mapped_column(
+        Text, default='', comment='本块转写文本'
+    )
+    end_time: Mapped[float] = mapped_column(
+        Float, default=0.0, comment='本块结束的录音时间点（秒）'
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.utcnow
+    )
+
+    def dump(self):
+        return dict(
+            index=self.chunk_index,
+            media_id=self.media_id,
+            text=self.text or '',
+            end_time=self.end_time,
+        )
+
+    @classmethod
+    def list_for(cls, db: Session, message_id: int) -> List[dict]:
+        """按块序号排列的全部分块"""
+        rows = db.query(cls).filter(cls.message_id == message_id).order_by(cls.chunk_index).all()
+        return [row.dump() for row in rows]
+
+    @classmethod
+    async def alist_for(cls, db: AsyncSession, message_id: int) -> List[dict]:
+        rows = await db.scalars(
+            select(cls).filter(cls.message_id == message_id).order_by(cls.chunk_index)
+        )
+        return [row.dump() for row in rows]
+
+    @classmethod
+    def recent_text(cls, db: Session, message_id: int, max_chars: int) -> str:
+        """最近若干块拼接的结尾文本（至少 max_chars 字，不足时为全部），不读取整段转写"""
+        texts = []
+        total = 0
+        query = db.query(cls.text).filter(cls.message_id == message_id).order_by(cls.chunk_index.desc())
+        for (text,) in query.yield_per(20):
+            texts.append(text or '')
+            total += len(text or '')
+            if total >= max_chars:
+                break
+        return ''.join(reversed(texts)).strip()
+
+
 class Script(CRUDMixin, ProfileMixin):
     """视频脚本"""
     __tablename__ = 'scripts'
@@ -0,0 +1,311 @@
+"""
+流式录音的增量解码缓存
+
+每条流式语音消息在 VOICE_PCM_CACHE_DIR 下维护（不在对外提供的 instance/ 下）：
+- {message_id}.f32：已解码的 16kHz 单声道 float32 PCM（按采样位置写入，读取时内存映射）
+- {message_id}.json：解码进度（WebM 头长度、已消费字节数、最后一个 Cluster 的偏移与起始采样）
+- {message_id}.json.lock：同一 message 的读写互斥（flock）
+
+TTL 清理按 message 整组进行：非阻塞拿到该 message 的锁后一起删除 PCM、进度与锁文件；
+锁文件可能在等锁期间被删除，因此加锁后核对路径仍指向同一文件，否则重新打开。
+PCM 缺失或短于进度记录时视为无缓存，从头解码。
+
+MediaRecorder 切片不保证在 Cluster 边界上切开，因此每次从「最后一个已解码 Cluster」
+重新解码：WebM 头 + master[resume_offset:] 经 stdin 交给 ffmpeg，输出覆盖写到该 Cluster
+起始采样处。单次解码量只与新增切片大小相关，与录音总长无关。
+
+非 WebM（如 Safari 的 mp4）或解析失败时回退到 decode_audio_to_pcm 整段 seek 解码。
+"""
+
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from ...config import config
+from .whisper_pool import SAMPLE_RATE
+from .whisper_service import _resolve_binary, decode_audio_to_pcm
+
+logger = logging.getLogger(__name__)
+
+_EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+_CLUSTER_ID = b'\x1f\x43\xb6\x75'
+_TIMECODE_ID = 0xE7
+_BYTES_PER_SAMPLE = 4
+
+_last_sweep_at = 0.0
+
+
+def _cache_dir() -> str:
+    path = config.VOICE_PCM_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(message_id: int) -> Tuple[str, str]:
+    base = os.path.join(_cache_dir(), str(message_id))
+    return base + '.f32', base + '.json'
+
+
+def _lock_path(message_id) -> str:
+    return _paths(message_id)[1] + '.lock'
+
+
+def _acquire_lock(message_id, blocking: bool = True) -> Optional[int]:
+    """加 message 锁，返回锁文件 fd；非阻塞且已被占用时返回 None"""
+    lock_path = _lock_path(message_id)
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        # 等锁期间锁文件已被清理删除：重新打开
+        os.close(fd)
+
+
+def _release_lock(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def _read_vint(buf: bytes, pos: int, keep_marker: bool = False) -> Tuple[int, int]:
+    """读取 EBML 变长整数，返回 (值, 字节数)"""
+    first = buf[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not (first & mask):
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError('invalid vint')
+    value = first if keep_marker else first & (mask - 1)
+    for b in buf[pos + 1:pos + length]:
+        value = (value << 8) | b
+    return value, length
+
+
+def _cluster_timecode(buf: bytes, pos: int) -> Optional[int]:
+    """解析 pos 处 Cluster 的 Timecode（毫秒，默认 TimecodeScale）；不是合法 Cluster 时返回 None"""
+    try:
+        cursor = pos + len(_CLUSTER_ID)
+        _, size_len = _read_vint(buf, cursor)
+        cursor += size_len
+        element_id, id_len = _read_vint(buf, cursor, keep_marker=True)
+        if element_id != _TIMECODE_ID:
+            return None
+        cursor += id_len
+        value_len, len_len = _read_vint(buf, cursor)
+        cursor += len_len
+        if value_len > 8 or cursor + value_len > len(buf):
+            return None
+        return int.from_bytes(buf[cursor:cursor + value_len], 'big')
+    except (ValueError, IndexError):
+        return None
+
+
+def _last_cluster(buf: bytes) -> Optional[Tuple[int, int]]:
+    """返回 buf 中最后一个合法 Cluster 的 (偏移, 时间码毫秒)"""
+    pos = buf.rfind(_CLUSTER_ID)
+    while pos >= 0:
+        timecode = _cluster_timecode(buf, pos)
+        if timecode is not None:
+            return pos, timecode
+        pos = buf.rfind(_CLUSTER_ID, 0, pos)
+    return None
+
+
+def _decode_webm_bytes(data: bytes) -> np.ndarray:
+    ffmpeg_bin = _resolve_binary('ffmpeg') or 'ffmpeg'
+    cmd = [
+        ffmpeg_bin, '-nostdin', '-v', 'error',
+        '-f', 'matroska', '-i', 'pipe:0',
+        '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1',
+    ]
+    result = subprocess.run(cmd, input=data, capture_output=True, timeout=120)
+    if result.returncode != 0 and not result.stdout:
+        raise RuntimeError(f'ffmpeg 音频解码失败: {result.stderr.decode("utf-8", "ignore")}')
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _load_state(meta_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(meta_path: str, state: dict) -> None:
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _advance(master_path: str, pcm_path: str, state: Optional[dict]) -> Optional[dict]:
+    """把 master 中尚未解码的字节解码进 PCM 缓存，返回新的状态；非 WebM 返回 None"""
+    if state is not None:
+        try:
+            pcm_size = os.path.getsize(pcm_path)
+        except FileNotFoundError:
+            pcm_size = -1
+        if pcm_size < state['resume_sample'] * _BYTES_PER_SAMPLE:
+            # PCM 已丢失（或被截短）：不能只补新增部分，否则之前的音频会变成静音
+            logger.info(f'PCM 缓存缺失，从头解码: {pcm_path}')
+            state = None
+
+    size = os.path.getsize(master_path)
+    if state and state.get('file_offset') == size:
+        return state
+
+    with open(master_path, 'rb') as f:
+        if state is None:
+            data = f.read(size)
+            if not data.startswith(_EBML_MAGIC):
+                return None
+            first_cluster = data.find(_CLUSTER_ID)
+            if first_cluster < 0 or _cluster_timecode(data, first_cluster) is None:
+                return None
+            header = data[:first_cluster]
+            state = {
+                'header_size': first_cluster,
+                'base_timecode': _cluster_timecode(data, first_cluster),
+                'resume_offset': first_cluster,
+                'resume_sample': 0,
+                'file_offset': 0,
+            }
+            tail = data[first_cluster:]
+        else:
+            header = f.read(state['header_size'])
+            f.seek(state['resume_offset'])
+            tail = f.read(size - state['resume_offset'])
+
+    samples = _decode_webm_bytes(header + tail)
+
+    fd = os.open(pcm_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, state['resume_sample'] * _BYTES_PER_SAMPLE)
+        os.pwrite(fd, samples.tobytes(), state['resume_sample'] * _BYTES_PER_SAMPLE)
+    finally:
+        os.close(fd)
+
+    # 下次从最后一个 Cluster 起重解码（该 Cluster 可能被切片截断）
+    last = _last_cluster(tail)
+    if last is not None:
+        offset, timecode = last
+        state['resume_offset'] += offset
+        state['resume_sample'] = max(0, timecode - state['base_timecode']) * SAMPLE_RATE // 1000
+    state['file_offset'] = size
+    return state
+
+
+def read_stream_pcm(message_id: int, master_path: str, start_sec: float = 0.0) -> np.ndarray:
+    """
+    读取流式录音从 start_sec 到当前末尾的 PCM，只解码上次之后新增的字节。
+
+    同一 message 的调用由文件锁串行化；缓存异常时回退到整段 seek 解码。
+    """
+    _maybe_sweep()
+    pcm_path, meta_path = _paths(message_id)
+    lock_fd = _acquire_lock(message_id)
+    try:
+        os.utime(lock_fd)
+        state = _load_state(meta_path)
+        try:
+            new_state = _advance(master_path, pcm_path, state)
+        except Exception as exc:
+            logger.warning(f'增量解码失败，回退整段解码: message_id={message_id}, error={exc}')
+            _remove_files(message_id)
+            new_state = None
+        if new_state is None:
+            return decode_audio_to_pcm(master_path, start_sec)
+        _save_state(meta_path, new_state)
+
+        total = os.path.getsize(pcm_path) // _BYTES_PER_SAMPLE
+        start = min(int(start_sec * SAMPLE_RATE), total)
+        if start >= total:
+            return np.zeros(0, dtype=np.float32)
+        mapped = np.memmap(pcm_path, dtype=np.float32, mode='r')
+        try:
+            return np.array(mapped[start:total])
+        finally:
+            del mapped
+    finally:
+        _release_lock(lock_fd)
+
+
+def _remove_files(message_id) -> None:
+    pcm_path, meta_path = _paths(message_id)
+    for path in (pcm_path, meta_path, meta_path + '.tmp'):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _remove_locked(message_id, lock_fd: int) -> None:
+    """持锁删除整组缓存；最后删除锁文件，等锁的一方加锁后会发现并重新打开"""
+    _remove_files(message_id)
+    try:
+        os.unlink(_lock_path(message_id))
+    except OSError:
+        pass
+    _release_lock(lock_fd)
+
+
+def drop_stream_pcm(message_id: int) -> None:
+    """录音转写完成后释放缓存"""
+    _remove_locked(message_id, _acquire_lock(message_id))
+
+
+def _last_access(message_id) -> float:
+    pcm_path, meta_path = _paths(message_id)
+    mtimes = []
+    for path in (pcm_path, meta_path, _lock_path(message_id)):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes) if mtimes else 0.0
+
+
+def _maybe_sweep() -> None:
+    """按 TTL 清理长时间未访问的缓存（每进程最多每分钟扫描一次；正在使用的 message 跳过）"""
+    global _last_sweep_at
+    now = time.time()
+    if now - _last_sweep_at < 60:
+        return
+    _last_sweep_at = now
+    ttl = config.VOICE_PCM_CACHE_TTL_SEC
+    try:
+        message_ids = {name.split('.', 1)[0] for name in os.listdir(_cache_dir())}
+    except OSError as exc:
+        logger.warning(f'PCM 缓存清理失败: {exc}')
+        return
+    for message_id in message_ids:
+        if not message_id.isdigit() or now - _last_access(message_id) <= ttl:
+            continue
+        try:
+            lock_fd = _acquire_lock(message_id, blocking=False)
+            if lock_fd is None:
+                continue
+            # 加锁前可能刚被访问过
+            if now - _last_access(message_id) <= ttl:
+                _release_lock(lock_fd)
+                continue
+            _remove_locked(message_id, lock_fd)
+        except OSError as exc:
+            logger.warning(f'PCM 缓存清理失败: message_id={message_id}, error={exc}')
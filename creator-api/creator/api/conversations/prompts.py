@@ -91,16 +91,19 @@ def build_script_reference_block(snapshots: list) -> str:
     return '\n'.join(parts).strip()
 
 
-def get_conversation_system_prompt(topic: str, user_profile: dict = None) -> str:
+def get_conversation_context_prompt(topic: str, user_profile: dict = None) -> str:
     """
-    获取对话系统提示词
+    获取对话背景提示词（紧跟在固定系统提示词之后的第二条 system 消息）
+    
+    主题与用户画像因会话/用户而异，单独成段放在固定前缀之后，使所有会话共享
+    同一段系统提示词前缀，命中模型服务端的提示词缓存。
     
     Args:
         topic: 视频创作主题
         user_profile: 用户画像信息（可选），包含 ai_summary 和 tags
         
     Returns:
-        str: 系统提示词
+        str: 对话背景提示词
     """
     
     # 构建用户画像部分（每轮 system 注入，让 AI 持续知道「我是谁」）
@@ -137,11 +140,14 @@ def get_conversation_system_prompt(topic: str, user_profile: dict = None) -> str
             ])
             profile_section = "\n".join(lines) + "\n"
 
-    return f"""你是一位资深的科技/AI领域视频内容创作顾问，帮助创作者打造高质量的短视频内容。
-
-## 当前创作主题
+    return f"""## 当前创作主题
 {topic}
-{profile_section}
+{profile_section}"""
+
+
+CONVERSATION_SYSTEM_PROMPT = f"""你是一位资深的科技/AI领域视频内容创作顾问，帮助创作者打造高质量的短视频内容。
+当前创作主题和创作者身份会在下一条系统消息中给出。
+
 {CREATOR_STRATEGY_PROFILE}
 
 ## 输入说明
@@ -285,7 +291,20 @@ AI回复：
 - **中期要发散**：确定方向后，大胆给创意，这是你的价值所在
 - **后期要聚焦**：帮助用户把想法变成可执行的方案
 
-记住：**先问清楚，再脑洞大开，最后落地执行**！"""
+记住：**先问清楚，再脑洞大开，最后落地执行**！
+{SCRIPT_REFERENCE_USAGE_HINT}"""
+
+
+def get_conversation_system_prompt() -> str:
+    """
+    获取对话系统提示词（固定前缀，不含任何会话/用户相关内容）
+    
+    当前创作主题和创作者身份见 get_conversation_context_prompt。
+    
+    Returns:
+        str: 系统提示词
+    """
+    return CONVERSATION_SYSTEM_PROMPT
 
 
 def get_script_generation_prompt(
@@ -609,6 +628,40 @@ def get_conversation_title_prompt(first_message: str) -> str:
 现在请生成标题："""
 
 
+def get_conversation_summary_prompt(previous_summary: str, new_messages: list) -> str:
+    """
+    增量更新会话滚动摘要的提示词
+    
+    Args:
+        previous_summary: 已有摘要（首次折叠时为空）
+        new_messages: 需要并入摘要的新一批对话（按时间顺序）
+        
+    Returns:
+        str: 摘要更新提示词
+    """
+    conversation_text = ""
+    for msg in new_messages:
+        role_name = "创作者" if msg.get('role') == 'user' else "顾问"
+        conversation_text += f"\n\n【{role_name}】\n{msg.get('content', '')}"
+
+    return f"""你是对话记录整理助手。下面是一段视频创作对话的【已有摘要】和之后新增的【新增对话】，请把两者合并成一份新的摘要，供顾问在后续对话中回顾上下文。
+
+## 摘要要求
+- 保留：视频主题与目标受众、创作者提出的要求和偏好、已确定的选题/标题/结构/关键文案、顾问给出并被认可的方案、尚未解决的问题
+- 已定稿或反复修改的脚本：保留最新版本的结构要点和关键句，不要逐字照抄全文
+- 被否定或已被替换的方案只需一句话带过
+- 按时间顺序组织，使用简洁的条目，总长度控制在 1000 字以内
+- 只依据给出的内容，不要补充或推测
+
+## 已有摘要
+{previous_summary or '（无）'}
+
+## 新增对话
+{conversation_text}
+
+请直接输出新的完整摘要，不要有任何其他说明。"""
+
+
 def get_optimization_prompt(script_content: str, optimization_type: str) -> str:
     """
     获取脚本优化提示词
@@ -666,7 +719,7 @@ def get_optimization_prompt(script_content: str, optimization_type: str) -> str:
 请输出优化后的版本，并简要说明优化思路。优化时必须同步检查并规避敏感词、绝对化表达、未经证明的数据、未授权品牌/人像和仿新闻标题。"""
 
 
-def get_script_extraction_prompt(conversation_messages: list) -> str:
+def get_script_extraction_prompt(conversation_messages: list, earlier_summary: str = "") -> str:
     """
     从对话中提取脚本内容的提示词
     
@@ -677,12 +730,15 @@ def get_script_extraction_prompt(conversation_messages: list) -> str:
     
     Args:
         conversation_messages: 对话消息列表
+        earlier_summary: 较早对话的摘要（对话超出 token 预算、只传入最近消息时提供）
         
     Returns:
         str: 提取提示词
     """
     # 构建对话历史
     conversation_text = ""
+    if earlier_summary:
+        conversation_text += f"\n\n【早前对话摘要（原文已省略）】\n{earlier_summary}"
     for msg in conversation_messages:
         role_name = "用户" if msg.get('role') == 'user' else "AI助手"
         content = msg.get('content', '')
@@ -1,11 +1,24 @@
-"""脚本分享：打包 index.html + 本地图片资源为 ZIP。"""
+"""
+脚本分享：打包 index.html + 本地图片资源为 ZIP。
+
+- 边打包边输出（StreamingResponse 逐块发送），不在内存中拼整个 ZIP
+- 图片本身已压缩，用 ZIP_STORED 原样存入；只有 index.html 用 ZIP_DEFLATED
+- 打包结果同时写入 SCRIPT_SHARE_CACHE_DIR（不在对外提供的 instance/ 下），
+  key = 脚本内容 + 素材批次/图片的哈希，内容未变时再次导出直接返回磁盘上的文件（FileResponse）
+- 缓存文件的 mtime 即导出时间（index.html 中显示的时间），命中缓存时下载文件名按它生成；
+  超过 SCRIPT_SHARE_CACHE_TTL_SEC 的缓存视为失效，并由定期清理删除（含已删除脚本的包）
+"""
+import hashlib
 import html
-import io
+import json
+import logging
 import os
 import re
+import time
+import uuid
 import zipfile
-from datetime import datetime
-from typing import List, Dict, Any, Tuple
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterator, Optional
 from urllib.parse import quote
 
 from sqlalchemy.orm import Session
@@ -15,6 +28,12 @@ from ..media.models import MediaModel
 from .models import Script, ScriptMedia
 from .constants import ScriptMediaType, ScriptMediaStatus
 
+logger = logging.getLogger(__name__)
+
+_COPY_CHUNK = 1024 * 1024
+
+_last_sweep_at = 0.0
+
 
 def _safe_filename(name: str, max_len: int = 36) -> str:
     s = re.sub(r'[\\/:*?"<>|\s]+', '_', (name or '').strip())
@@ -314,8 +333,86 @@ def _build_share_html(script: Script, batches: List[Dict[str, Any]], exported_at
     )
 
 
-def build_script_share_zip(db: Session, script: Script, user_id: int) -> Tuple[bytes, str]:
-    """构建分享 ZIP（index.html + images/），图片从磁盘复制。"""
+def _share_cache_dir() -> str:
+    path = config.SCRIPT_SHARE_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class ScriptShareExport:
+    """一次分享导出：打包所需的全部数据在请求内从数据库取齐，流式打包时不再访问数据库。"""
+
+    def __init__(
+        self,
+        script_id: int,
+        cache_key: str,
+        html_content: str,
+        images: List[Dict[str, str]],
+        title: str,
+        exported_at: datetime,
+    ):
+        self.script_id = script_id
+        self.cache_key = cache_key
+        self.html_content = html_content
+        self.images = images
+        self.title = title
+        self.exported_at = exported_at
+
+    @property
+    def filename(self) -> str:
+        return f"{_safe_filename(self.title or 'script', 40)}_{self.exported_at.strftime('%Y-%m-%d-%H%M')}.zip"
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(_share_cache_dir(), f'{self.script_id}_{self.cache_key[:32]}.zip')
+
+    def cached_path(self) -> Optional[str]:
+        """
+        已缓存的 ZIP 路径（未启用缓存、未命中或已过期时为 None）。
+
+        命中时 exported_at 改为缓存包的导出时间，下载文件名与包内 index.html 一致。
+        """
+        if not config.SCRIPT_SHARE_CACHE_ENABLED:
+            return None
+        path = self.cache_path
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - mtime > config.SCRIPT_SHARE_CACHE_TTL_SEC:
+            return None
+        self.exported_at = datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+        return path
+
+
+def _share_cache_key(script: Script, batches: List[Dict[str, Any]], media_map: Dict[int, MediaModel]) -> str:
+    raw = json.dumps(
+        {
+            'script': [
+                script.id, script.title, script.subtitle, script.content,
+                script.status, script.word_count,
+                script.created_at.isoformat() if script.created_at else None,
+                script.updated_at.isoformat() if script.updated_at else None,
+            ],
+            'batches': [
+                [
+                    batch['id'], batch['created_at'], batch['completed_count'], batch['total_count'],
+                    [
+                        [img['zip_path'], img['label'], media_map[img['media_id']].filename]
+                        for img in batch['packed_images']
+                    ],
+                ]
+                for batch in batches
+            ],
+        },
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def prepare_script_share(db: Session, script: Script, user_id: int) -> ScriptShareExport:
+    """收集分享包内容（index.html + 图片路径）并计算缓存 key。"""
     batches = collect_script_media_batches(db, script.id, user_id)
     media_ids: List[int] = []
     for batch in batches:
@@ -328,7 +425,7 @@ def build_script_share_zip(db: Session, script: Script, user_id: int) -> Tuple[b
             media_map[m.id] = m
 
     upload_dir = config.UPLOADS_DEFAULT_DEST
-    exported_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M')
+    exported_at = datetime.utcnow().replace(second=0, microsecond=0)
 
     for batch in batches:
         type_prefix = 'cover' if batch['type_name'] == 'COVER' else 'material'
@@ -348,23 +445,133 @@ def build_script_share_zip(db: Session, script: Script, user_id: int) -> Tuple[b
                 'zip_path': zip_rel,
                 'src_path': src_path,
                 'label': item['label'],
+                'media_id': media.id,
             })
 
-    html_content = _build_share_html(script, batches, exported_at)
+    images: List[Dict[str, str]] = []
+    written: set = set()
+    for batch in batches:
+        for img in batch['packed_images']:
+            if img['zip_path'] in written:
+                continue
+            written.add(img['zip_path'])
+            images.append({'zip_path': img['zip_path'], 'src_path': img['src_path']})
+
+    _maybe_sweep_share_cache()
+    return ScriptShareExport(
+        script_id=script.id,
+        cache_key=_share_cache_key(script, batches, media_map),
+        html_content=_build_share_html(script, batches, exported_at.strftime('%Y-%m-%d %H:%M')),
+        images=images,
+        title=script.title,
+        exported_at=exported_at,
+    )
 
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr('index.html', html_content.encode('utf-8'))
-        written: set = set()
-        for batch in batches:
-            for img in batch.get('packed_images') or []:
-                zip_path = img['zip_path']
-                if zip_path in written:
-                    continue
-                zf.write(img['src_path'], zip_path)
-                written.add(zip_path)
 
-    buf.seek(0)
-    zip_bytes = buf.getvalue()
-    filename = f"{_safe_filename(script.title or 'script', 40)}_{exported_at.replace(':', '').replace(' ', '-')}.zip"
-    return zip_bytes, filename
+class _ChunkSink:
+    """ZipFile 的输出目标：写入的数据同时进入待发送缓冲区和缓存临时文件（不可 seek，ZipFile 会用数据描述符）。"""
+
+    def __init__(self, cache_fp=None):
+        self._pending: List[bytes] = []
+        self._cache_fp = cache_fp
+        self._offset = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        if data:
+            self._pending.append(data)
+            if self._cache_fp is not None:
+                self._cache_fp.write(data)
+            self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._pending)
+        self._pending = []
+        return data
+
+
+def stream_script_share_zip(export: ScriptShareExport) -> Iterator[bytes]:
+    """
+    逐块生成分享 ZIP；完整生成后原子写入缓存（客户端中途断开时丢弃临时文件）。
+
+    同步生成器：由 StreamingResponse 放到线程池里迭代，磁盘读写不阻塞事件循环。
+    """
+    cache_fp = None
+    tmp_path = None
+    if config.SCRIPT_SHARE_CACHE_ENABLED:
+        tmp_path = os.path.join(_share_cache_dir(), f'.tmp_{uuid.uuid4().hex}')
+        cache_fp = open(tmp_path, 'wb')
+    completed = False
+    try:
+        sink = _ChunkSink(cache_fp)
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+            zf.writestr('index.html', export.html_content.encode('utf-8'), compress_type=zipfile.ZIP_DEFLATED)
+            yield sink.drain()
+            for img in export.images:
+                zinfo = zipfile.ZipInfo.from_file(img['src_path'], img['zip_path'])
+                zinfo.compress_type = zipfile.ZIP_STORED
+                with open(img['src_path'], 'rb') as src, zf.open(zinfo, 'w') as dest:
+                    for block in iter(lambda: src.read(_COPY_CHUNK), b''):
+                        dest.write(block)
+                        yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+        completed = True
+    finally:
+        if cache_fp is not None:
+            cache_fp.close()
+            if completed:
+                _store_share_cache(export, tmp_path)
+            elif os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+def _store_share_cache(export: ScriptShareExport, tmp_path: str) -> None:
+    path = export.cache_path
+    # mtime 记为导出时间（命中缓存时据此生成下载文件名）
+    exported_ts = export.exported_at.replace(tzinfo=timezone.utc).timestamp()
+    os.utime(tmp_path, (exported_ts, exported_ts))
+    os.replace(tmp_path, path)
+    # 同一脚本只保留最新内容对应的一份
+    prefix = f'{export.script_id}_'
+    keep = os.path.basename(path)
+    for name in os.listdir(_share_cache_dir()):
+        if name.startswith(prefix) and name.endswith('.zip') and name != keep:
+            try:
+                os.unlink(os.path.join(_share_cache_dir(), name))
+            except OSError:
+                pass
+    logger.info(f'📦 分享包已缓存: script_id={export.script_id}, file={keep}')
+
+
+def _maybe_sweep_share_cache() -> None:
+    """删除超过 TTL 的分享包与中断遗留的临时文件（每进程最多每小时扫描一次）"""
+    global _last_sweep_at
+    if not config.SCRIPT_SHARE_CACHE_ENABLED:
+        return
+    now = time.time()
+    if now - _last_sweep_at < 3600:
+        return
+    _last_sweep_at = now
+    try:
+        entries = list(os.scandir(_share_cache_dir()))
+    except OSError as exc:
+        logger.warning(f'分享包缓存清理失败: {exc}')
+        return
+    removed = 0
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime > config.SCRIPT_SHARE_CACHE_TTL_SEC:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f'🧹 已清理过期分享包: {removed} 个')
@@ -0,0 +1,189 @@
+"""
+语音消息处理状态推送
+
+- 转写/整理任务在事务提交后，把消息最新的处理状态发布到 Redis 频道 voice_status:{message_id}
+- API 进程内只有一个订阅线程（psubscribe voice_status:*），按 message_id 分发给
+  各 SSE 连接的 asyncio.Queue；SSE 只在建立连接时读一次数据库
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ...app_factory import get_redis_client
+from .constants import TranscriptionStatus, RefinementStatus
+from .models import MessageStreamChunk
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHANNEL_PREFIX = 'voice_status:'
+
+
+def status_channel(message_id: int) -> str:
+    return f'{STATUS_CHANNEL_PREFIX}{message_id}'
+
+
+def build_message_processing_status(message, chunks_list: Optional[List[dict]] = None) -> dict:
+    """构建语音处理状态（轮询 / SSE / 任务推送共用）。chunks_list 为 MessageStreamChunk.list_for 的结果。"""
+    partial_text = ''.join(
+        c.get('text', '') for c in sorted(chunks_list, key=lambda x: x.get('index', 0))
+    ) if chunks_list else None
+    transcription_status = message.transcription_status
+    transcription_error = message.transcription_error
+
+    # Whisper 冷启动/未就绪属于可恢复状态，尤其已有 partial 时不应在前端展示为失败。
+    if transcription_error and 'Whisper 服务未正确初始化' in transcription_error:
+        transcription_status = TranscriptionStatus.PROCESSING.value
+        transcription_error = None
+
+    return {
+        'message_id': message.id,
+        'transcription': {
+            'status': TranscriptionStatus.init(transcription_status).dump() if transcription_status else None,
+            'raw_text': message.raw_transcription,
+            'segments': message.transcription_segments,
+            'error': transcription_error,
+            'audio_duration': message.audio_duration,
+            'partial_text': partial_text,
+            'processed_chunks': message.stream_chunk_count or 0,
+        },
+        'refinement': {
+            'status': RefinementStatus.init(message.refinement_status).dump() if message.refinement_status else None,
+            'result': message.refinement_result,
+            'refined_content': message.refined_content,
+            'error': message.refinement_error,
+        },
+        'user_confirmed': bool(message.user_confirmed) if message.user_confirmed is not None else False,
+    }
+
+
+def publish_message_status(message_id: int, status_data: dict) -> None:
+    try:
+        get_redis_client().publish(
+            status_channel(message_id),
+            json.dumps(status_data, ensure_ascii=False, default=str),
+        )
+    except Exception as exc:
+        logger.warning(f'发布消息状态失败: message_id={message_id}, error={exc}')
+
+
+_PENDING_KEY = 'status_publish_messages'
+_SNAPSHOT_KEY = 'status_publish_snapshots'
+
+
+def publish_status_on_commit(session, message) -> None:
+    """
+    在事务内调用：提交前按最终状态构建快照，提交成功后发布；回滚则不发布。
+    同一事务内多次调用只发布一次。
+    """
+    if message is None:
+        return
+    session.info.setdefault(_PENDING_KEY, {})[message.id] = message
+
+
+# 会话级钩子只在导入时注册一次：待发布消息记在 session.info 中，
+# 不在每次调用时 listen / remove（在 after_commit 内 remove 监听器会打断 SQLAlchemy 的分发循环）
+@event.listens_for(Session, 'before_commit')
+def _snapshot_pending_status(session) -> None:
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    snapshots = session.info.setdefault(_SNAPSHOT_KEY, {})
+    for message_id, message in pending.items():
+        snapshots[message_id] = build_message_processing_status(
+            message, MessageStreamChunk.list_for(session, message_id)
+        )
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending_status(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    snapshots = session.info.pop(_SNAPSHOT_KEY, None)
+    for message_id, status_data in (snapshots or {}).items():
+        publish_message_status(message_id, status_data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_status(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_SNAPSHOT_KEY, None)
+
+
+class MessageStatusHub:
+    """进程内状态订阅中心：一个 Redis 订阅线程 → 多个 SSE 连接"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, message_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=100)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[message_id].add(entry)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._listen_forever, name='voice-status-hub', daemon=True
+                )
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, message_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            entries = self._subscribers.get(message_id)
+            if not entries:
+                return
+            entries.difference_update({e for e in entries if e[1] is queue})
+            if not entries:
+                self._subscribers.pop(message_id, None)
+
+    def _dispatch(self, message_id: int, status_data: dict) -> None:
+        with self._lock:
+            entries = list(self._subscribers.get(message_id, ()))
+        for loop, queue in entries:
+            loop.call_soon_threadsafe(_offer, queue, status_data)
+
+    def _listen_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{STATUS_CHANNEL_PREFIX}*')
+                backoff = 1.0
+                for item in pubsub.listen():
+                    if item.get('type') != 'pmessage':
+                        continue
+                    channel = item['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+                    try:
+                        message_id = int(channel[len(STATUS_CHANNEL_PREFIX):])
+                        status_data = json.loads(item['data'])
+                    except (ValueError, TypeError):
+                        continue
+                    self._dispatch(message_id, status_data)
+            except Exception as exc:
+                logger.warning(f'消息状态订阅断开，{backoff:.0f}s 后重连: {exc}')
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+def _offer(queue: asyncio.Queue, status_data: dict) -> None:
+    if queue.full():
+        # 慢消费者只需要最新状态
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(status_data)
+
+
+status_hub = MessageStatusHub()
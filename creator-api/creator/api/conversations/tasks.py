@@ -1,32 +1,44 @@
 """
 对话相关后台任务
 """
-import base64
 import logging
-import asyncio
 import json
 import os
+import random
 import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
 
 import redis
 
-from ...huey_config import huey
+from huey import crontab
+
+from ...huey_config import huey, voice_huey, bulk_huey
 from ...db import sm
 from ...config import config
-from .models import Message, Conversation, ScriptResearch, Script, UserStyleProfile
+from .models import Message, MessageStreamChunk, Conversation, ScriptResearch, Script, UserStyleProfile
 from .constants import TranscriptionStatus, RefinementStatus, ResearchStatus, MessageRole
 from .prompts import (
+    get_conversation_summary_prompt,
     get_refinement_prompt,
     get_research_analysis_prompt,
     get_research_summary_prompt,
     get_style_profile_update_prompt,
 )
-from .whisper_service import get_whisper_service, extract_audio_segment_to_wav
+from .whisper_service import get_whisper_service, decode_audio_to_pcm
+from .pcm_cache import read_stream_pcm, drop_stream_pcm
+from .status_events import publish_status_on_commit
+from .context import get_conversation_summary, plan_summary_fold
+from . import transcript_cache
+from .whisper_pool import SAMPLE_RATE
 from ..media.models import MediaModel
+from ..media.tasks import generate_media_derivatives_task
 from sqlalchemy import desc
+from ..ai.runtime import run_ai
+from .. import background
 from ..ai.openai_api import (
     ali_chat_ai,
     deepseek_ai,
@@ -40,8 +52,8 @@ from ..users.models import User
 logger = logging.getLogger(__name__)
 
 
-def persist_assistant_reply(conversation_id: int, content: str, count_delta: int = 1):
-    """将 AI 回复写入数据库（幂等：相同正文不重复插入）。"""
+def persist_assistant_reply(conversation_id: int, content: str, count_delta: int = 1, api_metadata: dict = None):
+    """将 AI 回复写入数据库（幂等：相同正文不重复插入）。api_metadata 为模型/用量/耗时等调用信息。"""
     text = (content or '').strip()
     if not text:
         return
@@ -57,12 +69,14 @@ def persist_assistant_reply(conversation_id: int, content: str, count_delta: int
         ):
             return
 
-        Message.create(
+        reply = Message.create(
             sa,
             conversation_id=conversation_id,
             role=MessageRole.ASSISTANT.value,
             content=text
         )
+        if api_metadata:
+            reply.api_metadata = api_metadata
         conv = Conversation.get_or_404(sa, conversation_id)
         conv.message_count = (conv.message_count or 0) + count_delta
         conv.updated_at = datetime.utcnow()
@@ -72,6 +86,84 @@ def persist_assistant_reply(conversation_id: int, content: str, count_delta: int
             len(text),
         )
 
+    update_conversation_summary_task(conversation_id)
+
+
+@huey.task()
+def update_conversation_summary_task(conversation_id: int):
+    """
+    每轮回复落库后增量更新会话滚动摘要。
+
+    未摘要的原文超过 CHAT_SUMMARY_TRIGGER_TOKENS 时，把较早的完整轮次与已有摘要一起交给模型
+    合并成新摘要，并前移 covered_message_id；同一会话同时只跑一个，其余直接跳过（下一轮再折叠）。
+    """
+    lock = _get_redis_client().lock(f'conversation_summary:{conversation_id}', timeout=300)
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        _update_conversation_summary(conversation_id)
+    except Exception:
+        logger.exception('更新会话摘要失败: conversation_id=%s', conversation_id)
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def _update_conversation_summary(conversation_id: int):
+    with sm.transaction_scope() as sa:
+        conv = Conversation.get(sa, conversation_id)
+        if not conv:
+            return
+        summary_text, covered_message_id = get_conversation_summary(conv)
+        covered_count = int((conv.context_summary or {}).get('covered_count') or 0) if covered_message_id else 0
+        messages = sa.query(Message).filter(
+            Message.conversation_id == conversation_id,
+            Message.id > covered_message_id,
+            Message.role.in_((MessageRole.USER.value, MessageRole.ASSISTANT.value)),
+        ).order_by(Message.created_at, Message.id).all()
+        history = [
+            {'id': msg.id, 'role': msg.role, 'content': (msg.content or '').strip()}
+            for msg in messages
+            if (msg.content or '').strip()
+        ]
+
+    model_name = get_chat_ai_model(resolve_conversation_model_type()).model_name
+    to_fold = plan_summary_fold(history, model_name)
+    if not to_fold:
+        return
+
+    for item in to_fold:
+        if len(item['content']) > config.CHAT_MAX_MESSAGE_CHARS:
+            item['content'] = item['content'][:config.CHAT_MAX_MESSAGE_CHARS] + '…'
+    prompt = get_conversation_summary_prompt(summary_text, to_fold)
+    new_summary = run_ai(reply_text_default(
+        [{'role': 'user', 'content': prompt}],
+        max_tokens=config.CHAT_SUMMARY_MAX_TOKENS,
+    ))
+    new_summary = (new_summary or '').strip()
+    if not new_summary:
+        logger.warning('会话摘要生成为空: conversation_id=%s', conversation_id)
+        return
+
+    with sm.transaction_scope() as sa:
+        conv = Conversation.get(sa, conversation_id)
+        if not conv or get_conversation_summary(conv)[1] != covered_message_id:
+            return
+        conv.context_summary = {
+            'text': new_summary,
+            'covered_message_id': to_fold[-1]['id'],
+            'covered_count': covered_count + len(to_fold),
+            'updated_at': datetime.utcnow().isoformat(),
+        }
+    logger.info(
+        '📝 会话摘要已更新: conversation_id=%s folded=%s covered_message_id=%s',
+        conversation_id,
+        len(to_fold),
+        to_fold[-1]['id'],
+    )
+
 
 def _run_complete_chat_reply(
     conversation_id: int,
@@ -88,8 +180,6 @@ def _run_complete_chat_reply(
         user_id,
         model_type or config.CHAT_CONVERSATION_MODEL_TYPE,
     )
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
         messages = json.loads(chat_messages_json)
         api_user = user_mobile
@@ -101,7 +191,7 @@ def _run_complete_chat_reply(
         ai_model = get_chat_ai_model(
             model_type or resolve_conversation_model_type()
         )
-        text = loop.run_until_complete(
+        text = run_ai(
             ai_model.reply_text(messages, user_mobile=api_user)
         )
         if text and str(text).strip():
@@ -116,8 +206,6 @@ def _run_complete_chat_reply(
             '兜底生成失败: conversation_id=%s',
             conversation_id,
         )
-    finally:
-        loop.close()
 
 
 def schedule_complete_chat_reply(
@@ -128,19 +216,17 @@ def schedule_complete_chat_reply(
     user_mobile: str = None,
     model_type: str = None,
 ):
-    """SSE 断开后在独立守护线程中完成 AI 调用（无需 Huey worker）。"""
+    """SSE 断开后由进程内后台执行器完成 AI 调用（执行器满载时转投 Huey）。"""
     payload = json.dumps(chat_messages, ensure_ascii=False)
-    thread = threading.Thread(
-        target=_run_complete_chat_reply,
-        args=(conversation_id, payload, count_delta, user_id, user_mobile, model_type),
-        daemon=True,
-        name=f'chat-reply-{conversation_id}',
+    mode = background.submit(
+        _run_complete_chat_reply,
+        conversation_id, payload, count_delta, user_id, user_mobile, model_type,
+        overflow=complete_chat_reply_task,
     )
-    thread.start()
     logger.info(
-        '已启动断线兜底线程: conversation_id=%s thread=%s',
+        '已投递断线兜底生成: conversation_id=%s mode=%s',
         conversation_id,
-        thread.name,
+        mode,
     )
 
 
@@ -150,13 +236,17 @@ def complete_chat_reply_task(
     chat_messages_json: str,
     count_delta: int,
     user_id: int,
+    user_mobile: str = None,
+    model_type: str = None,
 ):
-    """Huey 版断线兜底（可选，与线程版逻辑相同）。"""
+    """Huey 版断线兜底（进程内执行器满载时转投，与进程内逻辑相同）。"""
     _run_complete_chat_reply(
         conversation_id,
         chat_messages_json,
         count_delta,
         user_id,
+        user_mobile,
+        model_type,
     )
 
 # Whisper 在无语音/损坏音频时的常见幻听文本
@@ -179,40 +269,82 @@ def _filter_whisper_hallucination(text: str) -> str:
     return normalized
 
 
-def _transcribe_chunk_audio(whisper_service, audio_path: str, start_sec: float = 0.0) -> dict:
+def _transcribe_chunk_audio(
+    whisper_service,
+    audio_path: str,
+    start_sec: float = 0.0,
+    message_id: int = None,
+    prev_text: str = '',
+) -> dict:
     """
-    转写分块音频：统一转为 16k WAV 再送入 Whisper；空结果时用更大 beam 重试。
+    流式分块转写：从 start_sec 前回退一小段重叠音频一起解码（能量 VAD + 词级时间戳），
+    再按时间戳丢弃落在 start_sec 之前、已属于上一块的词；上一块结尾作为 initial_prompt。
+
+    返回的 duration 为 start_sec 之后新增音频的时长，调用方据此推进 last_end_time。
+    流式录音（传 message_id）走增量解码缓存，只解码新追加的切片。
+    API 模式没有词级时间戳，无法裁掉重叠区，此时不回退重叠音频。
     """
-    converted_wav_path = None
-    try:
-        converted_wav_path = extract_audio_segment_to_wav(audio_path, start_sec)
-        result = {'text': '', 'duration': 0.0}
-        for attempt, beam in enumerate((1, 5), start=1):
-            result = whisper_service.transcribe(
-                audio_path=converted_wav_path,
-                language='zh',
-                word_timestamps=False,
-                beam_size=beam,
-                vad_filter=False,
-            )
-            raw_text = (result.get('text') or '').strip()
-            if raw_text:
-                if attempt > 1:
-                    logger.info(f'转写重试成功: beam_size={beam}')
-                return result
-            logger.warning(f'转写结果为空: attempt={attempt}, beam_size={beam}, start_sec={start_sec}')
-        return result
-    finally:
-        if converted_wav_path and os.path.exists(converted_wav_path):
-            try:
-                os.unlink(converted_wav_path)
-            except OSError:
-                pass
+    overlap = max(0.0, float(config.VOICE_STREAM_OVERLAP_SEC)) if whisper_service.use_local else 0.0
+    decode_start = max(0.0, start_sec - overlap)
+    if message_id is not None:
+        samples = read_stream_pcm(message_id, audio_path, decode_start)
+    else:
+        samples = decode_audio_to_pcm(audio_path, decode_start)
+
+    lead = start_sec - decode_start
+    new_duration = max(0.0, len(samples) / SAMPLE_RATE - lead)
+    if new_duration <= 0:
+        logger.warning(f'分块无新增音频: start_sec={start_sec}')
+        return {'text': '', 'duration': 0.0}
+
+    prompt_chars = config.VOICE_STREAM_PROMPT_CHARS
+    prompt = (prev_text or '')[-prompt_chars:] if prompt_chars > 0 else ''
+    result = whisper_service.transcribe(
+        audio_path=samples,
+        language='zh',
+        word_timestamps=True,
+        beam_size=config.VOICE_STREAM_BEAM_SIZE,
+        vad_filter=False,
+        initial_prompt=prompt or None,
+        keep_words=True,
+        speech_only=True,
+    )
+    if result.get('speech_skipped'):
+        return {'text': '', 'duration': new_duration}
+
+    words = [
+        w for seg in result.get('segments') or [] for w in seg.get('words') or []
+    ]
+    if words:
+        # 词中点落在重叠区内的视为上一块已识别内容
+        kept = [w for w in words if (w['start'] + w['end']) / 2 >= lead]
+        text = ''.join(w['word'] for w in kept).strip()
+    else:
+        text = (result.get('text') or '').strip()
+
+    return {
+        'text': _dedupe_chunk_boundary(prev_text, text),
+        'duration': new_duration,
+    }
+
+
+_CHUNK_BOUNDARY_OVERLAP_CHARS = 12
+
+
+def _dedupe_chunk_boundary(prev_text: str, text: str, max_overlap: int = _CHUNK_BOUNDARY_OVERLAP_CHARS) -> str:
+    """时间戳去重后的兜底：去掉与上一块结尾逐字重复的开头（至少 3 个字）"""
+    prev_text = (prev_text or '').strip()
+    if not prev_text or not text:
+        return text
+    for size in range(min(max_overlap, len(prev_text), len(text)), 2, -1):
+        if prev_text[-size:] == text[:size]:
+            return text[size:].lstrip()
+    return text
 
 
 # ==================== 语音转写任务 ====================
 
-@huey.task()
+@bulk_huey.task()
 def transcribe_audio_task(message_id: int):
     """
     语音转写任务
@@ -229,6 +361,7 @@ def transcribe_audio_task(message_id: int):
         # 1. 获取消息记录
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             audio_media_id = message.audio_media_id
             
             # 更新状态为处理中
@@ -266,6 +399,7 @@ def transcribe_audio_task(message_id: int):
         
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             message.raw_transcription = transcription_result['text']
             message.audio_duration = audio_duration
             message.transcription_status = TranscriptionStatus.COMPLETED.value
@@ -311,6 +445,7 @@ def transcribe_audio_task(message_id: int):
         # 5. 直接标记整理完成（跳过 LLM 校对，由 AI 对话提示词处理口语化文本）
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             message.refinement_status = RefinementStatus.COMPLETED.value
             message.refined_content = transcription_result['text']
             message.refinement_result = {
@@ -326,6 +461,7 @@ def transcribe_audio_task(message_id: int):
         # 保存错误信息
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             message.transcription_status = TranscriptionStatus.FAILED.value
             message.transcription_error = str(e)
 
@@ -374,6 +510,12 @@ def transcribe_with_whisper(audio_path: str) -> dict:
         sys.stdout.flush()
         sys.stderr.flush()
         
+        # 相同音频内容 + 模型 + 精度 + 语言只转写一次（重试/重复上传直接复用）
+        cache_key = transcript_cache.cache_key(audio_path, whisper_service.model_name, 'zh')
+        cached = transcript_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         logger.info(f"🔍 [诊断] 准备调用 transcribe_with_segments()")
         
         # 调用转写服务（带智能分段）
@@ -383,6 +525,7 @@ def transcribe_with_whisper(audio_path: str) -> dict:
             max_segment_duration=180,  # 单段最多3分钟
             language="zh"
         )
+        transcript_cache.put(cache_key, result)
         
         logger.info(f"🔍 [诊断] transcribe_with_segments() 调用完成")
         logger.info(f"Whisper转写完成: 文本长度={len(result['text'])}, 时长={result['duration']}秒")
@@ -399,6 +542,14 @@ def transcribe_with_whisper(audio_path: str) -> dict:
 
 # ==================== 语音流式分块转写任务 ====================
 
+def _stream_chunk_exists(sa, message_id: int, chunk_index: int) -> bool:
+    return MessageStreamChunk.exists(
+        sa,
+        MessageStreamChunk.message_id == message_id,
+        MessageStreamChunk.chunk_index == chunk_index,
+    )
+
+
 def _merge_stream_chunks_text(chunks_list: list) -> str:
     sorted_chunks = sorted(chunks_list, key=lambda c: c.get('index', 0))
     return ''.join(c.get('text', '') for c in sorted_chunks).strip()
@@ -425,28 +576,22 @@ def _complete_message_transcription(message, chunks_list: list, new_end_time=Non
     return True
 
 
-def _transcribe_chunk_with_whisper_retry(whisper_service, audio_path: str, prev_end_time: float, max_retries: int = 5):
-    """Whisper 冷启动/并发时可能未就绪，短暂重试。"""
-    last_error = None
-    for attempt in range(max_retries):
-        svc = get_whisper_service()
-        if svc.use_local and svc.model is None:
-            wait = min(2 * (attempt + 1), 10)
-            logger.info(f'Whisper 模型未就绪，{wait}s 后重试 ({attempt + 1}/{max_retries})')
-            time.sleep(wait)
-            continue
-        try:
-            return _transcribe_chunk_audio(svc, audio_path, prev_end_time)
-        except RuntimeError as exc:
-            last_error = exc
-            if 'Whisper 服务未正确初始化' not in str(exc):
-                raise
-            wait = min(2 * (attempt + 1), 10)
-            logger.warning(f'Whisper 未就绪，{wait}s 后重试 ({attempt + 1}/{max_retries}): {exc}')
-            time.sleep(wait)
-    if last_error:
-        raise last_error
-    raise RuntimeError('Whisper 服务未正确初始化：模型未加载且 API 客户端未配置')
+def _transcribe_chunk_when_ready(
+    audio_path: str,
+    prev_end_time: float,
+    message_id: int = None,
+    prev_text: str = '',
+):
+    """
+    等待 Whisper 就绪后转写分块（基于就绪事件，不 sleep 轮询）。
+    超时/加载失败抛出「Whisper 未就绪」，由任务层延迟重调度，不占着 worker 等待。
+    """
+    svc = get_whisper_service()
+    if not svc.wait_until_ready(timeout=config.WHISPER_READY_TIMEOUT_SEC):
+        raise RuntimeError(f'Whisper 未就绪: {svc.health()}')
+    return _transcribe_chunk_audio(
+        svc, audio_path, prev_end_time, message_id=message_id, prev_text=prev_text
+    )
 
 
 _redis_client = None
@@ -463,56 +608,12 @@ def _get_redis_client():
     return _redis_client
 
 
-@contextmanager
-def _message_transcribe_lock(message_id: int, timeout_sec: int = 300):
-    """同一 message 的转写任务串行执行，避免多 Worker 并发抢 Whisper。"""
-    lock = _get_redis_client().lock(
-        f'voice_transcribe:{message_id}',
-        timeout=timeout_sec,
-        blocking_timeout=timeout_sec,
-    )
-    acquired = lock.acquire(blocking=True)
-    if not acquired:
-        raise RuntimeError(f'获取语音转写锁超时: message_id={message_id}')
-    try:
-        yield
-    finally:
-        try:
-            lock.release()
-        except Exception:
-            pass
-
-
 def _is_whisper_init_error(exc: Exception) -> bool:
     msg = str(exc)
     return 'Whisper 服务未正确初始化' in msg or 'Whisper 未就绪' in msg
 
 
-def _schedule_transcribe_retry(message_id, media_id, chunk_index, is_final, delay_sec=5):
-    if config.VOICE_TRANSCRIBE_USE_HUEY:
-        transcribe_voice_chunk_task.schedule(
-            (message_id, media_id, chunk_index, is_final),
-            delay=delay_sec,
-        )
-    else:
-        def _retry():
-            time.sleep(delay_sec)
-            dispatch_transcribe_voice_chunk(
-                message_id, media_id, chunk_index, is_final
-            )
-
-        threading.Thread(
-            target=_retry,
-            daemon=True,
-            name=f'voice-retry-{message_id}-{chunk_index}',
-        ).start()
-    logger.info(
-        f'已调度转写重试: message_id={message_id}, chunk_index={chunk_index}, '
-        f'delay={delay_sec}s'
-    )
-
-
-@huey.task()
+@voice_huey.task()
 def transcribe_voice_chunk_task(message_id: int, media_id: int, chunk_index: int, is_final: bool):
     """
     流式分块语音转写任务
@@ -523,22 +624,222 @@ def transcribe_voice_chunk_task(message_id: int, media_id: int, chunk_index: int
     
     流程：
     1. 获取消息的已处理时长（prev_end_time）
-    2. 用 ffmpeg 从累积音频中截取 [prev_end_time : ] 的新增部分
-    3. Whisper 转写新增部分
-    4. 将结果追加到 message.stream_chunks
+    2. 从累积音频中取 [prev_end_time - 重叠 : ] 的 PCM（增量解码缓存）
+    3. 能量 VAD 预筛（静音块跳过），Whisper 只解码语音区间，丢弃重叠区内已属于上一块的词
+    4. 将结果追加为一行 MessageStreamChunk，更新消息上的进度列
     5. is_final=True 时：合并所有块文本 → 触发 refine_transcription_task
+
+    分块按消息入队（见 _enqueue_voice_chunk），同一消息同时只有一个 worker 按 chunk_index 顺序处理；
+    该消息已有 worker 在处理时本任务入队后立即返回。
     """
-    logger.info(f"开始分块转写任务: message_id={message_id}, chunk_index={chunk_index}, media_id={media_id}, is_final={is_final}")
+    token = _enqueue_voice_chunk(message_id, media_id, chunk_index, is_final)
+    if token:
+        _drain_voice_transcribe_queue(message_id, token)
+
+
+@voice_huey.task()
+def drain_voice_transcribe_queue_task(message_id: int, token: str):
+    """持有租约的 worker 排空消息的分块队列"""
+    _drain_voice_transcribe_queue(message_id, token)
+
+
+@voice_huey.task()
+def resume_voice_transcribe_queue_task(message_id: int):
+    """队首分块延迟重试：重新抢租约后排空队列"""
+    _resume_voice_drain(message_id)
+
+
+# ==================== 语音分块转写：按消息串行的队列 ====================
+#
+# 每条消息一个 Redis hash 队列 voice_transcribe:queue:{message_id}（field=chunk_index），
+# 加一个单消费者租约 voice_transcribe:lease:{message_id}：
+# - 分发时先 HSET 入队，再 SET NX 抢租约；抢到的一方负责排空队列，没抢到说明已有 worker
+#   在处理这条消息，入队即返回，worker 不会停在锁上等别人的分块
+# - 排空时每次取最小的 chunk_index 处理，处理完才出队，处理期间心跳续租
+# - 队首分块可重试失败时把尝试次数写回队列项、释放租约并延迟重新排空，不占着 worker 等待；
+#   期间新分块入队会抢到租约并立即重试队首，后续分块仍不会越过它
+# - 队列为空时用 Lua 原子地「确认仍为空再删租约」，不会与并发入队错过
+# - worker 异常退出时租约到期，voice_transcribe_watchdog 每分钟接管无租约的非空队列
+
+_VOICE_QUEUE_PREFIX = 'voice_transcribe:queue:'
+_VOICE_LEASE_PREFIX = 'voice_transcribe:lease:'
+# 队首分块可重试失败（Whisper 未就绪等）时延迟重新排空的间隔与次数上限，超过后按失败写入消息状态
+_VOICE_RETRY_DELAY_SEC = 5
+_VOICE_RETRY_LIMIT = 12
+
+# 返回 1=已释放，0=队列非空（继续排空），-1=租约已不属于自己
+_RELEASE_VOICE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return -1
+end
+if redis.call('hlen', KEYS[2]) > 0 then
+    return 0
+end
+redis.call('del', KEYS[1])
+return 1
+"""
+_RENEW_VOICE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# 可重试失败：写回尝试次数（同一块期间被重新入队时保留新值）并释放自己的租约
+_DEFER_VOICE_CHUNK_SCRIPT = """
+if redis.call('hget', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[3])
+end
+if redis.call('get', KEYS[2]) == ARGV[4] then
+    redis.call('del', KEYS[2])
+end
+return 1
+"""
+# 只删除取出时的那一版（期间同一块被重新入队时保留新值）
+_POP_VOICE_CHUNK_SCRIPT = """
+if redis.call('hget', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('hdel', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def _voice_queue_keys(message_id: int):
+    return f'{_VOICE_QUEUE_PREFIX}{message_id}', f'{_VOICE_LEASE_PREFIX}{message_id}'
+
+
+def _enqueue_voice_chunk(message_id: int, media_id: int, chunk_index: int, is_final: bool):
+    """分块入队；抢到消息租约时返回租约 token（调用方负责排空队列），否则返回 None"""
+    client = _get_redis_client()
+    queue_key, lease_key = _voice_queue_keys(message_id)
+    pipe = client.pipeline()
+    pipe.hset(queue_key, chunk_index, json.dumps({'media_id': media_id, 'is_final': bool(is_final)}))
+    pipe.expire(queue_key, config.VOICE_TRANSCRIBE_QUEUE_TTL_SEC)
+    pipe.execute()
+    token = uuid.uuid4().hex
+    if client.set(lease_key, token, nx=True, ex=config.VOICE_TRANSCRIBE_LEASE_SEC):
+        return token
+    logger.info(f'分块已入队，等待当前 worker 处理: message_id={message_id}, chunk_index={chunk_index}')
+    return None
+
+
+@contextmanager
+def _voice_lease_heartbeat(client, lease_key: str, token: str):
+    """后台续租；租约被他人接管时置位 lost"""
+    stop = threading.Event()
+    lost = threading.Event()
+    lease_sec = config.VOICE_TRANSCRIBE_LEASE_SEC
+
+    def _beat():
+        while not stop.wait(max(1, lease_sec // 3)):
+            try:
+                if not client.eval(_RENEW_VOICE_LEASE_SCRIPT, 1, lease_key, token, lease_sec):
+                    lost.set()
+                    return
+            except Exception as exc:
+                logger.warning(f'语音转写租约续期失败: key={lease_key}, error={exc}')
 
+    threading.Thread(target=_beat, daemon=True, name=f'voice-lease-{lease_key}').start()
     try:
-        with _message_transcribe_lock(message_id):
-            _run_transcribe_voice_chunk(message_id, media_id, chunk_index, is_final)
+        yield lost
+    finally:
+        stop.set()
+
+
+def _drain_voice_transcribe_queue(message_id: int, token: str):
+    client = _get_redis_client()
+    queue_key, lease_key = _voice_queue_keys(message_id)
+    with _voice_lease_heartbeat(client, lease_key, token) as lease_lost:
+        while not lease_lost.is_set():
+            pending = client.hgetall(queue_key)
+            if not pending:
+                if client.eval(_RELEASE_VOICE_LEASE_SCRIPT, 2, lease_key, queue_key, token) != 0:
+                    return
+                continue
+            field = min(pending, key=int)
+            raw = pending[field]
+            item = json.loads(raw)
+            attempt = item.get('attempt', 0)
+            # 处理完才出队：可重试的失败让分块留在队首，释放租约后延迟重新排空，后续分块不会越过它
+            if not _transcribe_voice_chunk_item(
+                message_id, item['media_id'], int(field), item['is_final'], attempt=attempt
+            ):
+                item['attempt'] = attempt + 1
+                client.eval(
+                    _DEFER_VOICE_CHUNK_SCRIPT, 2, queue_key, lease_key, field, raw, json.dumps(item), token
+                )
+                _schedule_voice_drain(message_id, _VOICE_RETRY_DELAY_SEC)
+                return
+            client.eval(_POP_VOICE_CHUNK_SCRIPT, 1, queue_key, field, raw)
+    logger.warning(f'语音转写租约已失效，停止处理: message_id={message_id}')
+
+
+def _resume_voice_drain(message_id: int):
+    """抢到租约时排空队列；已有 worker 在处理（如新分块入队时抢到）则直接返回"""
+    _, lease_key = _voice_queue_keys(message_id)
+    token = uuid.uuid4().hex
+    if _get_redis_client().set(lease_key, token, nx=True, ex=config.VOICE_TRANSCRIBE_LEASE_SEC):
+        _drain_voice_transcribe_queue(message_id, token)
+
+
+def _schedule_voice_drain(message_id: int, delay_sec: float):
+    if config.VOICE_TRANSCRIBE_USE_HUEY:
+        resume_voice_transcribe_queue_task.schedule((message_id,), delay=delay_sec)
+        return
+    background.schedule(
+        delay_sec, _resume_voice_drain, message_id,
+        overflow=resume_voice_transcribe_queue_task,
+    )
+
+
+def _transcribe_voice_chunk_item(
+    message_id: int, media_id: int, chunk_index: int, is_final: bool, attempt: int = 0
+) -> bool:
+    """
+    处理队首分块。返回 True 表示可以出队（已转写，或失败已写入消息状态）；
+    Whisper 未就绪、写状态时数据库异常等可重试错误返回 False，由排空循环延迟重试同一块。
+    """
+    logger.info(f"开始分块转写任务: message_id={message_id}, chunk_index={chunk_index}, media_id={media_id}, is_final={is_final}")
+    try:
+        _run_transcribe_voice_chunk(message_id, media_id, chunk_index, is_final)
+        return True
     except Exception as e:
-        if _is_whisper_init_error(e):
-            logger.warning(f'Whisper 未就绪，任务级重试: message_id={message_id}, chunk={chunk_index}')
-            _schedule_transcribe_retry(message_id, media_id, chunk_index, is_final, delay_sec=5)
-            return
-        raise
+        if attempt < _VOICE_RETRY_LIMIT:
+            logger.warning(
+                f'分块转写暂时失败，{_VOICE_RETRY_DELAY_SEC}s 后重试: message_id={message_id}, '
+                f'chunk={chunk_index}, attempt={attempt + 1}, error={e}'
+            )
+            return False
+        logger.exception(f'分块转写重试 {attempt} 次仍失败: message_id={message_id}, chunk={chunk_index}, error={e}')
+        try:
+            _record_voice_chunk_failure(message_id, chunk_index, is_final, e)
+        except Exception:
+            logger.exception(f'分块转写失败状态写入失败: message_id={message_id}, chunk={chunk_index}')
+        return True
+
+
+def _start_voice_drain(message_id: int, token: str) -> str:
+    if config.VOICE_TRANSCRIBE_USE_HUEY:
+        drain_voice_transcribe_queue_task(message_id, token)
+        return 'huey'
+
+    return background.submit(
+        _drain_voice_transcribe_queue,
+        message_id, token,
+        overflow=drain_voice_transcribe_queue_task,
+    )
+
+
+@voice_huey.periodic_task(crontab(minute='*'))
+def voice_transcribe_watchdog():
+    """接管租约已过期（worker 异常退出）但仍有待转写分块的消息"""
+    client = _get_redis_client()
+    for key in client.scan_iter(match=f'{_VOICE_QUEUE_PREFIX}*', count=200):
+        message_id = int(key[len(_VOICE_QUEUE_PREFIX):])
+        _, lease_key = _voice_queue_keys(message_id)
+        token = uuid.uuid4().hex
+        if client.set(lease_key, token, nx=True, ex=config.VOICE_TRANSCRIBE_LEASE_SEC):
+            logger.warning(f'⚠️ 语音转写队列无人处理，重新分发: message_id={message_id}')
+            _start_voice_drain(message_id, token)
 
 
 def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int, is_final: bool):
@@ -553,22 +854,23 @@ def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int
         # 1. 获取音频文件路径 & 上一块的结束时间
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
-            existing_chunks = message.stream_chunks or {}
-            prev_end_time = existing_chunks.get('last_end_time', 0.0)
-            chunks_list_existing = existing_chunks.get('chunks', [])
 
             # 幂等：同一 chunk_index 已处理则跳过
-            if any(c.get('index') == chunk_index for c in chunks_list_existing):
+            if _stream_chunk_exists(sa, message_id, chunk_index):
                 logger.info(f'块 {chunk_index} 已处理，跳过重复任务')
                 return
 
             if chunk_index == 0:
+                publish_status_on_commit(sa, message)
                 message.transcription_status = TranscriptionStatus.PROCESSING.value
 
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
-            existing_chunks = message.stream_chunks or {}
-            prev_end_time = existing_chunks.get('last_end_time', 0.0)
+            prev_end_time = message.stream_last_end_time or 0.0
+            # 只取提示词与边界去重需要的结尾文本
+            prev_text = MessageStreamChunk.recent_text(
+                sa, message_id, max(config.VOICE_STREAM_PROMPT_CHARS, _CHUNK_BOUNDARY_OVERLAP_CHARS)
+            )
 
         with sm.transaction_scope() as sa:
             media = MediaModel.get_or_404(sa, media_id)
@@ -590,8 +892,8 @@ def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int
 
         os.environ['DISABLE_OUTPUT_REDIRECT'] = '1'
 
-        transcription = _transcribe_chunk_with_whisper_retry(
-            None, audio_path, prev_end_time
+        transcription = _transcribe_chunk_when_ready(
+            audio_path, prev_end_time, message_id=message_id, prev_text=prev_text
         )
 
         chunk_duration = transcription.get('duration', 0.0)
@@ -619,30 +921,25 @@ def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int
                     '未识别到语音内容。请确认浏览器已允许麦克风，并在系统设置中选择了正确的输入设备'
                 )
 
-        # 3. 将结果追加到 message.stream_chunks
+        # 3. 追加本块结果（单行插入 + 消息进度列，不重写已有分块）
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
 
-            current_stream = message.stream_chunks or {'chunks': [], 'last_end_time': 0.0}
-            chunks_list = current_stream.get('chunks', [])
-
-            if any(c.get('index') == chunk_index for c in chunks_list):
+            if _stream_chunk_exists(sa, message_id, chunk_index):
                 logger.info(f'块 {chunk_index} 已写入，跳过重复追加')
                 return
 
-            chunks_list.append({
-                'index': chunk_index,
-                'media_id': media_id,
-                'text': chunk_text,
-                'end_time': new_end_time
-            })
-
-            # 更新 stream_chunks
-            message.stream_chunks = {
-                'chunks': chunks_list,
-                'last_end_time': new_end_time
-            }
-            message.stream_chunk_count = len(chunks_list)
+            MessageStreamChunk.create(
+                sa,
+                message_id=message_id,
+                chunk_index=chunk_index,
+                media_id=media_id,
+                text=chunk_text,
+                end_time=new_end_time,
+            )
+            message.stream_last_end_time = new_end_time
+            message.stream_chunk_count = (message.stream_chunk_count or 0) + 1
 
             # 后续块成功时清除先前非最终块失败留下的 FAILED 状态
             if message.transcription_status == TranscriptionStatus.FAILED.value:
@@ -651,12 +948,14 @@ def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int
 
             if is_final:
                 # 5. 合并所有块文本，完成转写
+                chunks_list = MessageStreamChunk.list_for(sa, message_id)
                 if _complete_message_transcription(
                     message,
                     chunks_list,
                     new_end_time=new_end_time,
                     media_id=media_id,
                 ):
+                    drop_stream_pcm(message_id)
                     logger.info(
                         f"分块转写全部完成: message_id={message_id}, "
                         f"共 {len(chunks_list)} 块, 合并文本={len(message.raw_transcription)} 字"
@@ -667,61 +966,60 @@ def _run_transcribe_voice_chunk(message_id: int, media_id: int, chunk_index: int
                     )
 
     except Exception as e:
+        if _is_whisper_init_error(e):
+            # 可恢复：分块留在队首，由排空循环持租约重试
+            raise
         logger.error(f"分块转写失败: message_id={message_id}, chunk_index={chunk_index}, error={str(e)}")
         import traceback
         logger.error(traceback.format_exc())
+        _record_voice_chunk_failure(message_id, chunk_index, is_final, e)
 
-        with sm.transaction_scope() as sa:
-            message = sa.query(Message).filter(Message.id == message_id).first()
-            if not message:
-                logger.info(f'消息已删除，跳过转写失败状态写入: message_id={message_id}')
-                return
-
-            current_stream = message.stream_chunks or {'chunks': [], 'last_end_time': 0.0}
-            chunks_list = current_stream.get('chunks', [])
 
-            # Whisper 冷启动/未就绪是可恢复错误，不应写成 FAILED 暴露给前端。
-            if _is_whisper_init_error(e):
-                message.transcription_status = TranscriptionStatus.PROCESSING.value
-                message.transcription_error = None
-                _schedule_transcribe_retry(message_id, media_id, chunk_index, is_final)
-                return
+def _record_voice_chunk_failure(message_id: int, chunk_index: int, is_final: bool, error: Exception):
+    """把分块转写失败写入消息状态"""
+    with sm.transaction_scope() as sa:
+        message = sa.query(Message).filter(Message.id == message_id).first()
+        if not message:
+            logger.info(f'消息已删除，跳过转写失败状态写入: message_id={message_id}')
+            return
+        publish_status_on_commit(sa, message)
 
-            # 最终块失败但已有分块：合并已有结果，避免前序块白转
-            if is_final and chunks_list:
-                if _complete_message_transcription(
-                    message,
-                    chunks_list,
-                    new_end_time=current_stream.get('last_end_time', 0.0),
-                ):
-                    logger.info(
-                        f'最终块失败但已有分块，合并完成: message_id={message_id}, '
-                        f'共 {len(chunks_list)} 块'
-                    )
-                    return
+        chunks_list = MessageStreamChunk.list_for(sa, message_id)
 
-            # 非最终块失败：保留已识别分块，继续等待后续块
-            if not is_final:
-                if chunks_list:
-                    message.transcription_status = TranscriptionStatus.PROCESSING.value
-                    message.transcription_error = None
-                    logger.warning(
-                        f'块 {chunk_index} 转写失败，保留已有 {len(chunks_list)} 块继续处理: {str(e)}'
-                    )
-                elif chunk_index == 0:
-                    message.transcription_status = TranscriptionStatus.FAILED.value
-                    message.transcription_error = f"块 {chunk_index} 转写失败: {str(e)}"
-                else:
-                    # 后续块失败且尚无分块：多为并发抢跑，不回写 FAILED，等待前序块
-                    message.transcription_status = TranscriptionStatus.PROCESSING.value
-                    message.transcription_error = None
-                    logger.warning(
-                        f'块 {chunk_index} 转写失败（前序块可能仍在处理），忽略: {str(e)}'
-                    )
+        # 最终块失败但已有分块：合并已有结果，避免前序块白转
+        if is_final and chunks_list:
+            if _complete_message_transcription(
+                message,
+                chunks_list,
+                new_end_time=message.stream_last_end_time or 0.0,
+            ):
+                logger.info(
+                    f'最终块失败但已有分块，合并完成: message_id={message_id}, '
+                    f'共 {len(chunks_list)} 块'
+                )
                 return
 
-            message.transcription_status = TranscriptionStatus.FAILED.value
-            message.transcription_error = f"块 {chunk_index} 转写失败: {str(e)}"
+        # 非最终块失败：下一块从 stream_last_end_time 起重新截取，本块音频不会丢，继续等待后续块
+        if not is_final:
+            if chunks_list:
+                message.transcription_status = TranscriptionStatus.PROCESSING.value
+                message.transcription_error = None
+                logger.warning(
+                    f'块 {chunk_index} 转写失败，保留已有 {len(chunks_list)} 块继续处理: {str(error)}'
+                )
+            elif chunk_index == 0:
+                message.transcription_status = TranscriptionStatus.FAILED.value
+                message.transcription_error = f"块 {chunk_index} 转写失败: {str(error)}"
+            else:
+                message.transcription_status = TranscriptionStatus.PROCESSING.value
+                message.transcription_error = None
+                logger.warning(
+                    f'块 {chunk_index} 转写失败且尚无已识别分块，由后续块重新截取: {str(error)}'
+                )
+            return
+
+        message.transcription_status = TranscriptionStatus.FAILED.value
+        message.transcription_error = f"块 {chunk_index} 转写失败: {str(error)}"
 
 
 def dispatch_transcribe_voice_chunk(
@@ -730,37 +1028,17 @@ def dispatch_transcribe_voice_chunk(
     chunk_index: int,
     is_final: bool,
 ):
-    """分发语音分块转写：默认在 API 进程内执行（复用已预热的 Whisper）。"""
-    if config.VOICE_TRANSCRIBE_USE_HUEY:
-        return transcribe_voice_chunk_task(
-            message_id, media_id, chunk_index, is_final
-        )
-
-    def _runner():
-        try:
-            logger.info(
-                '开始 in-process 分块转写: message_id=%s, chunk_index=%s, is_final=%s',
-                message_id, chunk_index, is_final,
-            )
-            with _message_transcribe_lock(message_id):
-                _run_transcribe_voice_chunk(
-                    message_id, media_id, chunk_index, is_final
-                )
-        except Exception as exc:
-            logger.exception(
-                'in-process 分块转写异常: message_id=%s, chunk=%s, error=%s',
-                message_id, chunk_index, exc,
-            )
-
-    threading.Thread(
-        target=_runner,
-        daemon=True,
-        name='voice-transcribe-%s-%s' % (message_id, chunk_index),
-    ).start()
-    return 'in-process'
+    """
+    分发语音分块转写：分块先进入消息队列，抢到租约时才启动排空
+    （VOICE_TRANSCRIBE_USE_HUEY=False 时在 API 进程内执行，复用已预热的 Whisper）。
+    """
+    token = _enqueue_voice_chunk(message_id, media_id, chunk_index, is_final)
+    if not token:
+        return 'queued'
+    return _start_voice_drain(message_id, token)
 
 
-@huey.task()
+@voice_huey.task()
 def finalize_voice_transcription_task(message_id: int):
     """流式录音结束收尾：合并已转写分块（最后 stop 可能无有效尾片）。"""
     _finalize_voice_transcription(message_id)
@@ -777,9 +1055,9 @@ def _finalize_voice_transcription(message_id: int):
                 return
             if message.transcription_status == TranscriptionStatus.COMPLETED.value:
                 return
+            publish_status_on_commit(sa, message)
 
-            current_stream = message.stream_chunks or {'chunks': [], 'last_end_time': 0.0}
-            chunks_list = current_stream.get('chunks', [])
+            chunks_list = MessageStreamChunk.list_for(sa, message_id)
             if not chunks_list:
                 message.transcription_status = TranscriptionStatus.FAILED.value
                 message.transcription_error = '未采集到有效录音，请检查麦克风权限与输入设备'
@@ -787,7 +1065,7 @@ def _finalize_voice_transcription(message_id: int):
 
             sorted_chunks = sorted(chunks_list, key=lambda c: c['index'])
             merged_text = ''.join(c.get('text', '') for c in sorted_chunks).strip()
-            new_end_time = current_stream.get('last_end_time', 0.0)
+            new_end_time = message.stream_last_end_time or 0.0
 
             message.raw_transcription = merged_text
             message.audio_duration = int(new_end_time)
@@ -817,6 +1095,7 @@ def _finalize_voice_transcription(message_id: int):
             message = sa.query(Message).filter(Message.id == message_id).first()
             if not message:
                 return
+            publish_status_on_commit(sa, message)
             message.transcription_status = TranscriptionStatus.FAILED.value
             message.transcription_error = f"收尾转写失败: {str(e)}"
 
@@ -844,6 +1123,7 @@ def refine_transcription_task(message_id: int):
             audio_duration = message.audio_duration or 0
             
             # 更新状态为处理中
+            publish_status_on_commit(sa, message)
             message.refinement_status = RefinementStatus.PROCESSING.value
         
         if not raw_text:
@@ -862,6 +1142,7 @@ def refine_transcription_task(message_id: int):
         # 4. 保存校对结果
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             message.refinement_result = refinement_result
             message.refined_content = refinement_result.get('final_text', '')
             message.refinement_status = RefinementStatus.COMPLETED.value
@@ -874,6 +1155,7 @@ def refine_transcription_task(message_id: int):
         # 保存错误信息
         with sm.transaction_scope() as sa:
             message = Message.get_or_404(sa, message_id)
+            publish_status_on_commit(sa, message)
             message.refinement_status = RefinementStatus.FAILED.value
             message.refinement_error = str(e)
 
@@ -947,9 +1229,9 @@ def refine_content_with_llm(raw_text: str, conversation_context: str = "", audio
         ]
         
         # 调用LLM API（使用DeepSeek，性价比高）
-        # 在后台任务中调用异步函数，需要使用 asyncio.run
+        # 在后台任务中调用异步函数，通过 AI 运行时的常驻事件循环执行
         try:
-            result_text = asyncio.run(
+            result_text = run_ai(
                 deepseek_ai.reply_text(
                     messages=messages,
                     user=None,
@@ -959,7 +1241,7 @@ def refine_content_with_llm(raw_text: str, conversation_context: str = "", audio
         except Exception as api_error:
             logger.warning(f"DeepSeek调用失败，尝试通义千问: {str(api_error)}")
             # 如果DeepSeek失败，尝试通义千问
-            result_text = asyncio.run(
+            result_text = run_ai(
                 ali_chat_ai.reply_text(
                     messages=messages,
                     user=None,
@@ -1011,7 +1293,7 @@ def refine_content_with_llm(raw_text: str, conversation_context: str = "", audio
 
 # ==================== 脚本研究任务 ====================
 
-@huey.task()
+@bulk_huey.task()
 def analyze_research_task(research_id: int):
     """
     AI深度分析任务
@@ -1057,13 +1339,14 @@ def analyze_research_task(research_id: int):
         
         # 3. 调用AI进行分析
         logger.info("调用AI进行深度分析...")
-        analysis_result = asyncio.run(
+        analysis_result = run_ai(
             reply_text_default(
                 messages=[
                     {'role': 'system', 'content': '你是一个专业的内容分析专家。'},
                     {'role': 'user', 'content': analysis_prompt},
                 ],
                 response_format='json_object',
+                cache=True,
             )
         )
         
@@ -1121,7 +1404,7 @@ def analyze_research_task(research_id: int):
         raise
 
 
-@huey.task()
+@bulk_huey.task()
 def generate_research_summary_task(research_id: int):
     """
     生成研究总结任务
@@ -1157,7 +1440,7 @@ def generate_research_summary_task(research_id: int):
         
         # 3. 调用AI生成总结
         logger.info("调用AI生成研究总结...")
-        summary_text = asyncio.run(
+        summary_text = run_ai(
             reply_text_default(
                 messages=[
                     {'role': 'system', 'content': '你是一个专业的内容总结专家。'},
@@ -1181,7 +1464,7 @@ def generate_research_summary_task(research_id: int):
         raise
 
 
-@huey.task()
+@bulk_huey.task()
 def update_style_profile_task(user_id: int, research_id: int):
     """
     更新用户创作风格档案任务
@@ -1230,7 +1513,7 @@ def update_style_profile_task(user_id: int, research_id: int):
         
         # 3. 调用AI生成更新后的档案
         logger.info("调用AI更新风格档案...")
-        updated_profile_text = asyncio.run(
+        updated_profile_text = run_ai(
             reply_text_default(
                 messages=[
                     {'role': 'system', 'content': '你是一个专业的用户画像分析师。'},
@@ -1278,7 +1561,7 @@ def update_style_profile_task(user_id: int, research_id: int):
         raise
 
 
-@huey.task()
+@bulk_huey.task()
 def extract_success_patterns_task(research_id: int):
     """
     提取成功模式任务
@@ -1339,7 +1622,7 @@ def extract_success_patterns_task(research_id: int):
         
         # 3. 调用AI提取模式
         logger.info("调用AI提取成功模式...")
-        patterns_text = asyncio.run(
+        patterns_text = run_ai(
             reply_text_default(
                 messages=[
                     {'role': 'system', 'content': '你是一个专业的内容模式识别专家。'},
@@ -1496,7 +1779,7 @@ def _plan_script_media_with_ai(
         )
 
     plan_model = get_chat_ai_model(resolve_script_media_plan_model_type())
-    result_text = asyncio.run(
+    result_text = run_ai(
         plan_model.reply_text(
             messages=[
                 {'role': 'system', 'content': get_script_media_plan_system_prompt()},
@@ -1515,36 +1798,36 @@ def _plan_script_media_with_ai(
     return plan
 
 
-def _image_bytes_from_gpt_result(result: dict) -> bytes:
-    """从 gpt-image-2 返回结果提取图片字节。"""
+def _save_gpt_image_to_media(result: dict) -> int:
+    """
+    把 gpt-image-2 返回的图片（b64_json 分块解码或 url 流式下载）写入文件并建 media 记录，
+    返回 media_id。
+    """
+    from ..media.storage import MediaFileWriter, write_base64, write_url
+
     b64_data = result.get('b64_json')
     img_url = result.get('url')
-    if b64_data:
-        return base64.b64decode(b64_data)
-    if img_url:
-        import requests as _req
-        r = _req.get(img_url, timeout=60)
-        r.raise_for_status()
-        return r.content
-    raise RuntimeError('gpt-image-2 返回数据中既无 b64_json 也无 url')
-
-
-def _save_image_bytes_to_media(image_bytes: bytes) -> int:
-    """保存图片字节到 media 表，返回 media_id。"""
-    import uuid as _uuid
-    from ..media.models import MediaModel
-
-    filename = f'script_media_{_uuid.uuid4().hex}.png'
-    filepath = os.path.join(config.UPLOADS_DEFAULT_DEST, filename)
-    with open(filepath, 'wb') as f:
-        f.write(image_bytes)
-    logger.info('生图文件已保存: %s', filename)
+    if not b64_data and not img_url:
+        raise RuntimeError('gpt-image-2 返回数据中既无 b64_json 也无 url')
+
+    with MediaFileWriter() as writer:
+        if b64_data:
+            write_base64(writer, b64_data)
+        else:
+            write_url(writer, img_url, timeout=60)
+        filename = writer.commit('script_media', 'png', dedup=True)
+    logger.info('生图文件已保存: %s size=%s', filename, writer.size)
 
     with sm.transaction_scope() as sa:
         media = MediaModel.create(sa, profile={})
         media.filename = filename
+        media.sha256 = writer.hexdigest
+        media.size = writer.size
         sa.flush()
-        return media.id
+        media_id = media.id
+
+    generate_media_derivatives_task(media_id)
+    return media_id
 
 
 def _generate_one_image(prompt: str, size: str) -> int:
@@ -1552,18 +1835,141 @@ def _generate_one_image(prompt: str, size: str) -> int:
     from ..ai.openai_api import gpt_image_2_ai
 
     quality = getattr(config, 'GPT_IMAGE_2_DEFAULT_QUALITY', 'high')
-    result = gpt_image_2_ai.generate_image(
+    result, error = gpt_image_2_ai.try_generate_image(
         prompt,
         size=size,
         quality=quality,
     )
     if not result:
-        raise RuntimeError(f'gpt-image-2 生图失败: {gpt_image_2_ai.last_error}')
-    image_bytes = _image_bytes_from_gpt_result(result)
-    return _save_image_bytes_to_media(image_bytes)
+        raise RuntimeError(f'gpt-image-2 生图失败: {error}')
+    return _save_gpt_image_to_media(result)
 
 
-@huey.task()
+_IMAGE_SLOT_PREFIX = 'gpt_image_slot:'
+# 只释放自己持有的槽位（租约过期后可能已被别人占用）
+_RELEASE_IMAGE_SLOT_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@contextmanager
+def _image_generation_slot():
+    """
+    全局生图并发槽位：所有 worker 共享 SCRIPT_MEDIA_GLOBAL_CONCURRENCY 个 Redis key，
+    SET NX EX 占用，租约略长于单张生图超时，worker 异常退出时到期自动释放。
+    """
+    from ..ai.openai_api import gpt_image_2_http_timeout
+
+    client = _get_redis_client()
+    token = uuid.uuid4().hex
+    lease_sec = gpt_image_2_http_timeout() + 60
+    slots = max(1, config.SCRIPT_MEDIA_GLOBAL_CONCURRENCY)
+    deadline = time.monotonic() + config.SCRIPT_MEDIA_SLOT_WAIT_SEC
+    key = None
+    while key is None:
+        offset = random.randrange(slots)
+        for i in range(slots):
+            candidate = f'{_IMAGE_SLOT_PREFIX}{(offset + i) % slots}'
+            if client.set(candidate, token, nx=True, ex=lease_sec):
+                key = candidate
+                break
+        if key is None:
+            if time.monotonic() >= deadline:
+                raise RuntimeError('等待生图并发槽位超时')
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        try:
+            client.eval(_RELEASE_IMAGE_SLOT_SCRIPT, 1, key, token)
+        except Exception as exc:
+            logger.warning('释放生图槽位失败（将按租约过期）: key=%s err=%s', key, exc)
+
+
+class _GeneratedItemsWriter:
+    """
+    ScriptMedia.generated_items 的合并写入。
+
+    各段结果在内存中整条替换（同一段的 media_id / status / error_message 同时生效），
+    按 SCRIPT_MEDIA_PROGRESS_FLUSH_SEC 间隔把整份快照写一次库，避免每张图都开事务重写列表。
+    """
+
+    def __init__(self, script_media_id: int, items: list):
+        self.script_media_id = script_media_id
+        self._items = [dict(item) for item in items]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def items(self) -> list:
+        with self._lock:
+            return [dict(item) for item in self._items]
+
+    def set_item(self, index: int, **fields):
+        with self._lock:
+            self._items[index] = {**self._items[index], **fields}
+            due = time.monotonic() - self._last_flush >= config.SCRIPT_MEDIA_PROGRESS_FLUSH_SEC
+        if due:
+            self.flush()
+
+    def flush(self, **extra):
+        """写入当前快照；extra 为同一事务内一并更新的 ScriptMedia 字段"""
+        from .models import ScriptMedia
+
+        with self._flush_lock:
+            with self._lock:
+                snapshot = [dict(item) for item in self._items]
+                self._last_flush = time.monotonic()
+            with sm.transaction_scope() as sa:
+                sm_obj = ScriptMedia.get_or_404(sa, self.script_media_id)
+                sm_obj.generated_items = snapshot
+                for name, value in extra.items():
+                    setattr(sm_obj, name, value)
+
+
+def _generate_images_concurrently(writer: _GeneratedItemsWriter, jobs: list) -> int:
+    """
+    并发生成多张图（单任务最多 SCRIPT_MEDIA_TASK_CONCURRENCY 张，全局受槽位限制）。
+
+    Args:
+        writer: generated_items 写入器
+        jobs: [(item 下标, 生图提示词, 尺寸)]
+
+    Returns:
+        int: 成功张数
+    """
+    if not jobs:
+        return 0
+
+    def run(job) -> bool:
+        index, prompt, size = job
+        try:
+            with _image_generation_slot():
+                media_id = _generate_one_image(prompt, size)
+        except Exception as exc:
+            logger.warning(
+                '生图失败: script_media_id=%s item=%s err=%s',
+                writer.script_media_id,
+                index,
+                exc,
+            )
+            writer.set_item(index, status='failed', error_message=str(exc)[:300])
+            return False
+        writer.set_item(index, media_id=media_id, status='completed')
+        return True
+
+    workers = max(1, min(config.SCRIPT_MEDIA_TASK_CONCURRENCY, len(jobs)))
+    with ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix=f'script-media-{writer.script_media_id}',
+    ) as pool:
+        return sum(pool.map(run, jobs))
+
+
+@bulk_huey.task()
 def generate_script_media_task(script_media_id: int):
     """异步生成脚本 AI 素材：先 GPT 分析规划，再 gpt-image-2 生图。"""
     from .models import ScriptMedia, Script
@@ -1624,28 +2030,23 @@ def generate_script_media_task(script_media_id: int):
             with sm.transaction_scope() as sa:
                 sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
                 sm_obj.total_segment_count = len(cover_variants)
-                sm_obj.generated_items = []
-
-            generated_items = []
-            success_count = 0
-            first_media_id = None
-            combined_prompts = []
 
+            items = []
+            jobs = []
             for variant in cover_variants:
                 image_prompt = _build_cover_image_prompt(
                     plan,
                     orientation=variant['orientation'],
                 )
+                items.append({
+                    'segment_index': variant['segment_index'],
+                    'segment_title': variant['segment_title'],
+                    'ai_prompt': image_prompt or '',
+                    'media_id': None,
+                    'status': 'pending' if image_prompt else 'failed',
+                })
                 if not image_prompt:
-                    generated_items.append({
-                        'segment_index': variant['segment_index'],
-                        'segment_title': variant['segment_title'],
-                        'ai_prompt': '',
-                        'media_id': None,
-                        'status': 'failed',
-                    })
                     continue
-
                 logger.info(
                     '生成封面: variant=%s headline=%s subline=%s prompt_prefix=%s',
                     variant['segment_title'],
@@ -1653,51 +2054,28 @@ def generate_script_media_task(script_media_id: int):
                     plan.get('cover_subline'),
                     image_prompt[:100],
                 )
-                try:
-                    media_id = _generate_one_image(image_prompt, variant['size'])
-                    success_count += 1
-                    if first_media_id is None:
-                        first_media_id = media_id
-                    generated_items.append({
-                        'segment_index': variant['segment_index'],
-                        'segment_title': variant['segment_title'],
-                        'ai_prompt': image_prompt,
-                        'media_id': media_id,
-                        'status': 'completed',
-                    })
-                    combined_prompts.append(image_prompt)
-                except Exception as seg_err:
-                    logger.error(
-                        '封面生成失败: script_media_id=%s variant=%s err=%s',
-                        script_media_id,
-                        variant['segment_title'],
-                        seg_err,
-                    )
-                    generated_items.append({
-                        'segment_index': variant['segment_index'],
-                        'segment_title': variant['segment_title'],
-                        'ai_prompt': image_prompt,
-                        'media_id': None,
-                        'status': 'failed',
-                    })
-
-                with sm.transaction_scope() as sa:
-                    sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
-                    sm_obj.generated_items = generated_items
+                jobs.append((len(items) - 1, image_prompt, variant['size']))
+
+            writer = _GeneratedItemsWriter(script_media_id, items)
+            writer.flush()
+            success_count = _generate_images_concurrently(writer, jobs)
+            generated_items = writer.items()
 
             if success_count == 0:
+                writer.flush()
                 raise RuntimeError('封面两张均生成失败')
 
-            with sm.transaction_scope() as sa:
-                sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
-                sm_obj.media_id = first_media_id
-                sm_obj.ai_prompt = '\n\n---\n\n'.join(combined_prompts)
-                sm_obj.generated_items = generated_items
-                sm_obj.status = ScriptMediaStatus.COMPLETED.value
-                if success_count < len(cover_variants):
-                    sm_obj.error_message = (
-                        f'部分封面生成失败：{success_count}/{len(cover_variants)} 张成功'
-                    )
+            completed = [item for item in generated_items if item['status'] == 'completed']
+            final_fields = dict(
+                media_id=completed[0]['media_id'],
+                ai_prompt='\n\n---\n\n'.join(item['ai_prompt'] for item in completed),
+                status=ScriptMediaStatus.COMPLETED.value,
+            )
+            if success_count < len(cover_variants):
+                final_fields['error_message'] = (
+                    f'部分封面生成失败：{success_count}/{len(cover_variants)} 张成功'
+                )
+            writer.flush(**final_fields)
 
             logger.info(
                 '封面生成完成: script_media_id=%s success=%s/%s',
@@ -1707,7 +2085,7 @@ def generate_script_media_task(script_media_id: int):
             )
             return
 
-        # 2) 素材：按段落批量生成
+        # 2) 素材：按段落并发生成
         segments = plan.get('segments') or []
         if not segments:
             raise RuntimeError('素材规划未返回任何段落')
@@ -1715,13 +2093,11 @@ def generate_script_media_task(script_media_id: int):
         with sm.transaction_scope() as sa:
             sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
             sm_obj.total_segment_count = len(segments)
-            sm_obj.generated_items = []
-
-        generated_items = []
-        success_count = 0
 
+        items = []
+        jobs = []
         for seg in segments:
-            segment_index = seg.get('segment_index') or (len(generated_items) + 1)
+            segment_index = seg.get('segment_index') or (len(items) + 1)
             segment_title = (seg.get('segment_title') or f'段落 {segment_index}').strip()
             image_prompt = _build_material_image_prompt(seg.get('image_prompt') or '')
             item = {
@@ -1733,48 +2109,36 @@ def generate_script_media_task(script_media_id: int):
                 'media_id': None,
                 'status': 'pending',
             }
-
-            if not image_prompt:
+            if image_prompt:
+                jobs.append((len(items), image_prompt, size))
+            else:
                 item['status'] = 'failed'
                 item['error_message'] = '该段落缺少 image_prompt'
-                generated_items.append(item)
-                with sm.transaction_scope() as sa:
-                    sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
-                    sm_obj.generated_items = list(generated_items)
-                continue
-
-            try:
-                logger.info(
-                    '生成素材段落 %s/%s: %s',
-                    len(generated_items) + 1,
-                    len(segments),
-                    segment_title[:40],
-                )
-                media_id = _generate_one_image(image_prompt, size)
-                item['media_id'] = media_id
-                item['status'] = 'completed'
-                success_count += 1
-            except Exception as seg_exc:
-                logger.warning('段落生图失败: %s err=%s', segment_title, seg_exc)
-                item['status'] = 'failed'
-                item['error_message'] = str(seg_exc)[:300]
+            items.append(item)
 
-            generated_items.append(item)
-            with sm.transaction_scope() as sa:
-                sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
-                sm_obj.generated_items = list(generated_items)
-                if success_count == 1 and item.get('media_id'):
-                    sm_obj.media_id = item['media_id']
-                    sm_obj.ai_prompt = image_prompt
+        logger.info(
+            '并发生成素材段落: script_media_id=%s segments=%s concurrency=%s',
+            script_media_id,
+            len(jobs),
+            min(config.SCRIPT_MEDIA_TASK_CONCURRENCY, len(jobs)),
+        )
+        writer = _GeneratedItemsWriter(script_media_id, items)
+        writer.flush()
+        success_count = _generate_images_concurrently(writer, jobs)
 
         if success_count == 0:
+            writer.flush()
             raise RuntimeError('所有段落素材生成均失败')
 
-        with sm.transaction_scope() as sa:
-            sm_obj = ScriptMedia.get_or_404(sa, script_media_id)
-            sm_obj.status = ScriptMediaStatus.COMPLETED.value
-            if success_count < len(segments):
-                sm_obj.error_message = f'部分段落生成失败：成功 {success_count}/{len(segments)}'
+        first = next(item for item in writer.items() if item['status'] == 'completed')
+        final_fields = dict(
+            media_id=first['media_id'],
+            ai_prompt=first['ai_prompt'],
+            status=ScriptMediaStatus.COMPLETED.value,
+        )
+        if success_count < len(segments):
+            final_fields['error_message'] = f'部分段落生成失败：成功 {success_count}/{len(segments)}'
+        writer.flush(**final_fields)
 
         logger.info(
             '素材批次生成完成: script_media_id=%s success=%s/%s',
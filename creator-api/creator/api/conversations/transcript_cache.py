@@ -0,0 +1,108 @@
+"""
+转写结果缓存（按音频内容寻址）
+
+key = sha256(音频字节) + 模型名 + 计算精度 + 语言，结果（文本 + 分段）gzip 后存于
+WHISPER_TRANSCRIPT_CACHE_DIR，命中时刷新 mtime，写入时按 mtime 淘汰最久未用的条目（LRU）。
+
+同一份音频（重试、worker 重启后的重放、重复上传）只会真正跑一次 Whisper。
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Optional
+
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK = 1024 * 1024
+
+
+def _cache_dir() -> str:
+    path = config.WHISPER_TRANSCRIPT_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def audio_digest(audio_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(audio_path: str, model_name: str, language: str) -> str:
+    compute_type = config.WHISPER_COMPUTE_TYPE if config.WHISPER_USE_LOCAL else 'api'
+    raw = '|'.join([audio_digest(audio_path), model_name, compute_type, language or ''])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(_cache_dir(), f'{key}.json.gz')
+
+
+def get(key: str) -> Optional[Dict]:
+    if not config.WHISPER_TRANSCRIPT_CACHE_ENABLED:
+        return None
+    path = _entry_path(key)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            result = json.load(f)
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning(f'转写缓存读取失败，忽略: {exc}')
+        return None
+    logger.info(f'🎯 转写缓存命中: key={key[:12]}')
+    return result
+
+
+def put(key: str, result: Dict) -> None:
+    if not config.WHISPER_TRANSCRIPT_CACHE_ENABLED:
+        return
+    """写入缓存；任何写入失败（磁盘满、结果不可序列化）只记日志，不影响已完成的转写"""
+    tmp_path = None
+    try:
+        cache_dir = _cache_dir()
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            f.write(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        os.replace(tmp_path, _entry_path(key))
+        tmp_path = None
+    except (OSError, TypeError, ValueError) as exc:
+        logger.warning(f'转写缓存写入失败: {exc}')
+        return
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    _evict(cache_dir)
+
+
+def _evict(cache_dir: str) -> None:
+    """超过条目上限时按最近使用时间淘汰"""
+    max_entries = config.WHISPER_TRANSCRIPT_CACHE_MAX_ENTRIES
+    try:
+        entries = [e for e in os.scandir(cache_dir) if e.name.endswith('.json.gz')]
+    except OSError:
+        return
+    overflow = len(entries) - max_entries
+    if overflow <= 0:
+        return
+    try:
+        entries.sort(key=lambda e: e.stat().st_mtime)
+    except OSError:
+        return
+    for entry in entries[:overflow]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
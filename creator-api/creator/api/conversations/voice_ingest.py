@@ -0,0 +1,202 @@
+"""
+流式录音分块直写
+
+录音切片不再先走 /media 上传成独立文件（每片一条 MediaModel、一个 instance/ 下的文件），
+而是由 voice-stream/chunks 接口把请求体直接流式追加到主录音：
+- 首块：请求体经 MediaFileWriter 流式落盘为主录音（audio_{uuid}.webm），建一条 MediaModel
+- 后续块：O_APPEND 打开主录音，flock 互斥后逐块写入请求体；写入中断时 ftruncate 回退到写前长度
+- 幂等：客户端携带 offset（本块写入前主录音应有的字节数）；文件已超过 offset 说明本块已写过
+  （重试），直接确认不再追加；文件短于 offset 说明前序块缺失，返回 409 与当前长度
+- 首块幂等：客户端为每次录音生成 upload_id，首块先在 Redis voice_stream:upload:{user_id}:{upload_id}
+  占位（SET NX），建好消息后改写为 message_id；重试的首块据此返回已建的消息，不再重复建 Media/Message
+- 归属校验结果（user / conversation / 主录音文件）缓存在 Redis voice_stream:owner:{message_id}，
+  后续块不再逐次查库；删除草稿消息时清除
+"""
+
+import asyncio
+import errno
+import fcntl
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ...app_factory import get_redis_client
+from ...config import config
+from ..media.models import MediaModel
+from ..media.storage import MediaFileWriter
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+OWNER_KEY = 'voice_stream:owner:{}'
+UPLOAD_KEY = 'voice_stream:upload:{}:{}'
+_LOCK_POLL_SEC = 0.02
+
+
+class ChunkAppendResult:
+    APPENDED = 'appended'
+    DUPLICATE = 'duplicate'
+    GAP = 'gap'
+
+
+def _owner_key(message_id: int) -> str:
+    return OWNER_KEY.format(message_id)
+
+
+def cache_owner(message_id: int, user_id: int, conversation_id: int, media_id: int, filename: str) -> dict:
+    owner = {
+        'user_id': user_id,
+        'conversation_id': conversation_id,
+        'media_id': media_id,
+        'filename': filename,
+    }
+    try:
+        get_redis_client().set(
+            _owner_key(message_id), json.dumps(owner), ex=config.VOICE_STREAM_OWNER_TTL_SEC
+        )
+    except Exception as exc:
+        logger.warning(f'语音分块归属缓存写入失败: message_id={message_id}, error={exc}')
+    return owner
+
+
+def forget_owner(message_id: int) -> None:
+    try:
+        get_redis_client().delete(_owner_key(message_id))
+    except Exception as exc:
+        logger.warning(f'语音分块归属缓存清除失败: message_id={message_id}, error={exc}')
+
+
+def _upload_key(user_id: int, upload_id: str) -> str:
+    return UPLOAD_KEY.format(user_id, upload_id)
+
+
+def claim_upload(user_id: int, upload_id: str) -> Optional[int]:
+    """
+    首块占用 upload_id。
+
+    Returns:
+        None：本请求占到，应创建消息；0：同一 upload_id 的首块正在写入；
+        其他：已为该 upload_id 创建的 message_id
+    """
+    key = _upload_key(user_id, upload_id)
+    try:
+        client = get_redis_client()
+        if client.set(key, '', nx=True, ex=config.VOICE_STREAM_OWNER_TTL_SEC):
+            return None
+        raw = client.get(key)
+    except Exception as exc:
+        logger.warning(f'语音首块幂等键读取失败，按新录音处理: upload_id={upload_id}, error={exc}')
+        return None
+    # 占位键恰好过期时按新录音处理
+    if raw is None:
+        return None
+    return int(raw) if raw else 0
+
+
+def bind_upload(user_id: int, upload_id: str, message_id: int) -> None:
+    try:
+        get_redis_client().set(
+            _upload_key(user_id, upload_id), message_id, ex=config.VOICE_STREAM_OWNER_TTL_SEC
+        )
+    except Exception as exc:
+        logger.warning(f'语音首块幂等键写入失败: upload_id={upload_id}, error={exc}')
+
+
+def release_upload(user_id: int, upload_id: str) -> None:
+    """首块写入失败：释放占位，允许客户端重试"""
+    try:
+        get_redis_client().delete(_upload_key(user_id, upload_id))
+    except Exception as exc:
+        logger.warning(f'语音首块幂等键释放失败: upload_id={upload_id}, error={exc}')
+
+
+def get_owner(db: Session, message_id: int) -> Optional[dict]:
+    """
+    返回消息归属与主录音文件 {'user_id', 'conversation_id', 'media_id', 'filename'}；
+    消息或主录音不存在时为 None。先读 Redis，未命中时一次联表查询后回填。
+    """
+    try:
+        raw = get_redis_client().get(_owner_key(message_id))
+    except Exception as exc:
+        logger.warning(f'语音分块归属缓存读取失败: message_id={message_id}, error={exc}')
+        raw = None
+    if raw:
+        return json.loads(raw)
+
+    row = db.query(Message, Conversation.user_id).join(
+        Conversation, Conversation.id == Message.conversation_id
+    ).filter(Message.id == message_id).first()
+    if not row:
+        return None
+    message, user_id = row
+    media_id = message.audio_media_id
+    media = db.query(MediaModel).filter(MediaModel.id == media_id).first() if media_id else None
+    if not media or not media.filename:
+        return None
+    return cache_owner(message_id, user_id, message.conversation_id, media.id, media.filename)
+
+
+async def write_master_recording(body: AsyncIterator[bytes], ext: str = 'webm') -> Tuple[str, str, int]:
+    """首块：请求体流式落盘为主录音，返回 (文件名, sha256, 字节数)"""
+    with MediaFileWriter() as writer:
+        async for data in body:
+            writer.write(data)
+        if not writer.size:
+            raise ValueError('切片为空')
+        filename = writer.commit('audio', ext)
+    return filename, writer.hexdigest, writer.size
+
+
+async def _flock(fd: int, timeout_sec: float) -> None:
+    """非阻塞轮询 flock：持锁方在等待请求体时会让出事件循环，阻塞式 flock 会把整个循环卡死"""
+    deadline = time.monotonic() + timeout_sec
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except OSError as exc:
+            if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+        if time.monotonic() >= deadline:
+            raise TimeoutError('主录音文件正被其他请求写入')
+        await asyncio.sleep(_LOCK_POLL_SEC)
+
+
+async def append_chunk(path: str, body: AsyncIterator[bytes], offset: Optional[int]) -> Tuple[str, int]:
+    """
+    把请求体追加到主录音（O_APPEND + flock）。
+
+    Returns:
+        (ChunkAppendResult, 处理后的主录音字节数)
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'主录音文件不存在: {path}')
+    try:
+        await _flock(fd, config.VOICE_STREAM_LOCK_TIMEOUT_SEC)
+        size_before = os.fstat(fd).st_size
+        if offset is not None and size_before > offset:
+            return ChunkAppendResult.DUPLICATE, size_before
+        if offset is not None and size_before < offset:
+            return ChunkAppendResult.GAP, size_before
+
+        written = 0
+        try:
+            async for data in body:
+                if data:
+                    os.write(fd, data)
+                    written += len(data)
+            if not written:
+                raise ValueError('切片为空')
+        except BaseException:
+            # 客户端断开或写入失败：回退到写前长度，重试时 offset 仍然对得上
+            os.ftruncate(fd, size_before)
+            raise
+        return ChunkAppendResult.APPENDED, size_before + written
+    finally:
+        os.close(fd)  # 关闭即释放 flock
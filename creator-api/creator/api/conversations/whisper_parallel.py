@@ -0,0 +1,246 @@
+"""
+长音频并行转写
+
+先在 PCM 上按静音切片，再把切片分发给多个 Whisper 实例并行解码，最后按时间顺序合并：
+- 优先使用进程池（spawn 启动，每个进程独占一个 CTranslate2 模型，cpu_threads 按核数均分）
+- 进程数受 WHISPER_PARALLEL_WORKERS 与内存预算 WHISPER_PARALLEL_MEMORY_MB 共同约束；
+  预算包含当前进程已常驻的推理池模型，扣除后剩余不足两个模型时不启用进程池
+- 子进程异常退出（如加载模型时被 OOM kill）导致进程池损坏时丢弃该池（下次重建），
+  本次改用进程内推理池完成
+- 当前进程是守护进程（Huey 的 -k process worker）时不能再派生子进程，
+  退回进程内推理池（WHISPER_POOL_REPLICAS 个副本）并发解码；
+  因此 bulk 队列默认以线程 worker 运行（entrypoint.sh 的 BULK_WORKER_TYPE）
+- 子进程与 WhisperService 用同一套模型定位（WHISPER_MODEL_DIR / 本地缓存，默认不在线下载）
+"""
+
+import logging
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ...config import config
+from .whisper_pool import DEFAULT_DECODE_OPTIONS, SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# int8 推理时单个模型的常驻内存估算（MB），用于按内存预算限制进程数
+_MODEL_MEMORY_MB = {
+    'tiny': 150,
+    'base': 250,
+    'small': 600,
+    'medium': 1500,
+    'large': 3000,
+    'large-v2': 3000,
+    'large-v3': 3000,
+}
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+# 子进程内的模型实例
+_worker_model = None
+
+
+def _worker_init(source: str, device: str, compute_type: str, cpu_threads: int, local_files_only: bool) -> None:
+    global _worker_model
+    from faster_whisper import WhisperModel
+
+    _worker_model = WhisperModel(
+        source,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+        num_workers=1,
+        download_root=None,  # 与 WhisperService 相同：使用默认缓存目录
+        local_files_only=local_files_only,
+    )
+
+
+def _worker_transcribe(pcm_path: str, start: int, end: int, language: str, beam_size: int) -> List[Dict]:
+    samples = np.fromfile(pcm_path, dtype=np.float32, count=end - start, offset=start * 4)
+    segments, _ = _worker_model.transcribe(
+        samples,
+        language=language,
+        beam_size=beam_size,
+        vad_filter=False,
+        **DEFAULT_DECODE_OPTIONS,
+    )
+    offset = start / SAMPLE_RATE
+    return [
+        {'start': seg.start + offset, 'end': seg.end + offset, 'text': seg.text.strip()}
+        for seg in segments
+    ]
+
+
+def plan_workers(resident_models: int = 0) -> int:
+    """
+    并行度 = min(配置进程数或核数, (内存预算 - 已常驻模型) / 单模型内存)
+
+    resident_models 为当前进程内已加载的模型副本数（WhisperService 推理池），同样占用预算
+    """
+    per_model = _MODEL_MEMORY_MB.get(config.WHISPER_MODEL_NAME, 1500)
+    budget = config.WHISPER_PARALLEL_MEMORY_MB - resident_models * per_model
+    by_memory = max(1, budget // per_model)
+    by_cpu = config.WHISPER_PARALLEL_WORKERS or os.cpu_count() or 1
+    return max(1, min(by_cpu, by_memory))
+
+
+def _can_spawn_processes() -> bool:
+    return not multiprocessing.current_process().daemon
+
+
+def _get_process_executor(workers: int) -> ProcessPoolExecutor:
+    """进程池常驻复用，避免每个长音频任务都重新加载模型"""
+    from .whisper_service import resolve_model_source
+
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_worker_init,
+                initargs=(
+                    resolve_model_source(config.WHISPER_MODEL_NAME),
+                    config.WHISPER_DEVICE,
+                    config.WHISPER_COMPUTE_TYPE,
+                    cpu_threads,
+                    not config.WHISPER_ALLOW_DOWNLOAD,
+                ),
+            )
+            _executor_workers = workers
+            logger.info(f'🚀 Whisper 并行进程池已创建: workers={workers}, cpu_threads={cpu_threads}')
+        return _executor
+
+
+def _discard_process_executor(executor: ProcessPoolExecutor) -> None:
+    """进程池已损坏：关闭并置空，下次使用时重建"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+            _executor_workers = 0
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _decode_to_pcm_file(audio_path: str, pcm_path: str) -> None:
+    from .whisper_service import _resolve_binary
+
+    ffmpeg_bin = _resolve_binary('ffmpeg') or 'ffmpeg'
+    cmd = [
+        ffmpeg_bin, '-nostdin', '-v', 'error', '-y',
+        '-i', audio_path,
+        '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 'f32le', '-acodec', 'pcm_f32le', pcm_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg 音频解码失败: {result.stderr}')
+
+
+def split_on_silence(samples: np.ndarray, target_sec: float) -> List[Tuple[int, int]]:
+    """
+    按语音区间切片：相邻区间合并到不超过 target_sec，切点落在静音处；
+    单段连续语音超过 target_sec（中间没有足够长的停顿）时，只能在 target_sec 处硬切
+    """
+    from .whisper_service import detect_speech_regions
+
+    regions = detect_speech_regions(samples, max_region_sec=target_sec)
+    pieces = []
+    current = None
+    for start, end in regions:
+        if current is None:
+            current = [start, end]
+        elif end - current[0] > target_sec:
+            pieces.append(tuple(current))
+            current = [start, end]
+        else:
+            current[1] = end
+    if current is not None:
+        pieces.append(tuple(current))
+    return [(int(s * SAMPLE_RATE), int(e * SAMPLE_RATE)) for s, e in pieces]
+
+
+def transcribe_long_audio(service, audio_path: str, language: str = 'zh', beam_size: int = 5) -> Dict:
+    """
+    并行转写长音频，返回与 WhisperService.transcribe 相同结构的结果（分段为绝对时间）
+    """
+    fd, pcm_path = tempfile.mkstemp(suffix='.f32')
+    os.close(fd)
+    started = time.time()
+    try:
+        _decode_to_pcm_file(audio_path, pcm_path)
+        samples = np.memmap(pcm_path, dtype=np.float32, mode='r')
+        duration = len(samples) / SAMPLE_RATE
+        pieces = split_on_silence(samples, float(config.WHISPER_PARALLEL_SEGMENT_SEC))
+        if not pieces:
+            logger.info(f'长音频未检测到语音: {audio_path}')
+            return {'text': '', 'duration': duration, 'language': language, 'segments': []}
+
+        piece_results = None
+        resident = max(1, config.WHISPER_POOL_REPLICAS) if service.pool is not None else 0
+        workers = plan_workers(resident)
+        if _can_spawn_processes() and workers > 1:
+            executor = _get_process_executor(workers)
+            try:
+                futures = [
+                    executor.submit(_worker_transcribe, pcm_path, start, end, language, beam_size)
+                    for start, end in pieces
+                ]
+                mode = f'进程池 x{_executor_workers}'
+                piece_results = [f.result() for f in futures]
+            except BrokenProcessPool as e:
+                logger.error(f'❌ Whisper 并行进程池已损坏，丢弃并改用进程内推理池: {e}')
+                _discard_process_executor(executor)
+        if piece_results is None:
+            with service.use_pool() as pool:
+                futures = [
+                    (start, pool.submit(
+                        np.array(samples[start:end]),
+                        language=language,
+                        beam_size=beam_size,
+                        vad_filter=False,
+                    ))
+                    for start, end in pieces
+                ]
+                mode = f'推理池 x{pool.replicas}'
+                piece_results = []
+                for start, future in futures:
+                    offset = start / SAMPLE_RATE
+                    piece_results.append([
+                        {'start': seg['start'] + offset, 'end': seg['end'] + offset, 'text': seg['text']}
+                        for seg in future.result()['segments']
+                    ])
+        del samples
+
+        segments = []
+        for piece in piece_results:
+            for seg in piece:
+                seg['id'] = len(segments)
+                segments.append(seg)
+
+        logger.info(
+            f'⏱️ 长音频并行转写完成: 时长={duration:.0f}秒, 切片={len(pieces)}, '
+            f'模式={mode}, 耗时={time.time() - started:.1f}秒'
+        )
+        return {
+            'text': ''.join(seg['text'] for seg in segments).strip(),
+            'duration': duration,
+            'language': language,
+            'segments': segments,
+        }
+    finally:
+        try:
+            os.unlink(pcm_path)
+        except OSError:
+            pass
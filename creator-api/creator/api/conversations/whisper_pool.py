@@ -0,0 +1,385 @@
+"""
+Whisper 进程内推理池
+
+- 常驻 N 个 faster-whisper 模型副本，每个副本由一个工作线程独占
+- 各 Huey 线程 / 后台线程提交的转写请求统一排队，空闲副本即取即做
+- 短音频（单段 ≤30 秒）在排队时合并为一次 BatchedInferencePipeline 批量解码，
+  多条消息的流式分块共享一次前向计算（每个 clip 独占一个批元素，不与其它请求的语音拼在一起）
+- stats() 暴露队列深度、忙碌副本数与平均等待/执行耗时
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# BatchedInferencePipeline 每个 clip 不能超过一个 30 秒窗口
+BATCH_CLIP_MAX_SEC = 30.0
+
+# 单次解码的默认参数（与原单模型调用保持一致）
+DEFAULT_DECODE_OPTIONS = dict(
+    condition_on_previous_text=False,
+    no_speech_threshold=0.6,
+    log_prob_threshold=-1.0,
+)
+
+
+class _TranscribeJob:
+    __slots__ = ('audio', 'options', 'keep_words', 'future', 'enqueued_at', 'samples')
+
+    def __init__(self, audio, options: Dict, keep_words: bool = False):
+        self.audio = audio
+        self.options = options
+        self.keep_words = keep_words
+        self.future = Future()
+        self.enqueued_at = time.time()
+        self.samples = None
+
+    @property
+    def batch_key(self):
+        """只有解码参数完全一致的请求才能合并到同一批；Silero VAD 需逐条执行"""
+        opts = self.options
+        if opts.get('vad_filter'):
+            return None
+        return (
+            opts.get('language'),
+            opts.get('beam_size'),
+            bool(opts.get('word_timestamps')),
+            opts.get('initial_prompt') or '',
+        )
+
+
+def _segment_to_dict(seg, offset: float = 0.0, with_words: bool = False) -> Dict:
+    item = {
+        'id': seg.id,
+        'start': max(0.0, seg.start - offset),
+        'end': max(0.0, seg.end - offset),
+        'text': seg.text.strip(),
+    }
+    if with_words and getattr(seg, 'words', None):
+        item['words'] = [
+            {
+                'start': max(0.0, w.start - offset),
+                'end': max(0.0, w.end - offset),
+                'word': w.word,
+                'probability': w.probability,
+            }
+            for w in seg.words
+        ]
+    return item
+
+
+def _job_clip_ranges(clip_timestamps, total: int) -> List[tuple]:
+    """把请求的语音区间（秒，扁平列表 start,end,...）转为采样区间，超过 30 秒的区间再切分"""
+    if not clip_timestamps:
+        return [(0, total)]
+    window = int(BATCH_CLIP_MAX_SEC * SAMPLE_RATE)
+    ranges = []
+    for i in range(0, len(clip_timestamps) - 1, 2):
+        start = max(0, int(clip_timestamps[i] * SAMPLE_RATE))
+        end = min(total, int(clip_timestamps[i + 1] * SAMPLE_RATE))
+        while end - start > 0:
+            ranges.append((start, min(end, start + window)))
+            start += window
+    return ranges or [(0, min(total, window))]
+
+
+class WhisperInferencePool:
+    """
+    faster-whisper 推理池
+
+    使用方法：
+        pool = WhisperInferencePool(model_factory, replicas=2, batch_size=8)
+        pool.start()
+        result = pool.transcribe(audio, language='zh', beam_size=1)
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[int], object],
+        replicas: int = 1,
+        batch_size: int = 8,
+        batch_wait_ms: int = 20,
+    ):
+        self._model_factory = model_factory
+        self.replicas = max(1, int(replicas or 1))
+        self.batch_size = max(1, int(batch_size or 1))
+        self.batch_wait = max(0, int(batch_wait_ms or 0)) / 1000.0
+        self.models: List[object] = []
+        self._queue: 'queue.Queue[Optional[_TranscribeJob]]' = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._batched_jobs = 0
+        self._batches = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """加载全部副本并启动工作线程；任一副本加载失败则抛出异常"""
+        for index in range(self.replicas):
+            self.models.append(self._model_factory(index))
+        for index, model in enumerate(self.models):
+            t = threading.Thread(
+                target=self._worker_loop,
+                args=(index, model),
+                name=f'whisper-replica-{index}',
+                daemon=True,
+            )
+            t.start()
+            self._threads.append(t)
+        logger.info(
+            '✅ Whisper 推理池已启动: replicas=%s, batch_size=%s, batch_wait=%.0fms',
+            self.replicas, self.batch_size, self.batch_wait * 1000,
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止接收新请求；已排队的请求处理完后工作线程退出"""
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join(timeout=30)
+            # 与 shutdown 并发提交、落在停止信号之后的请求直接失败，避免调用方永久等待
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.future.set_exception(RuntimeError('Whisper 推理池已关闭'))
+        self._threads = []
+        self.models = []
+
+    @property
+    def primary_model(self):
+        return self.models[0] if self.models else None
+
+    # ------------------------------------------------------------------
+    # 提交与指标
+    # ------------------------------------------------------------------
+
+    def submit(self, audio, keep_words: bool = False, **options) -> Future:
+        """
+        提交转写请求，audio 可为文件路径或 16kHz float32 numpy 数组；
+        keep_words=True 时分段中附带词级时间戳（需同时开启 word_timestamps）
+        """
+        if not self._threads or self._closed:
+            raise RuntimeError('Whisper 推理池未启动或已关闭')
+        merged = dict(DEFAULT_DECODE_OPTIONS)
+        merged.update({k: v for k, v in options.items() if v is not None})
+        job = _TranscribeJob(audio, merged, keep_words=keep_words)
+        self._queue.put(job)
+        depth = self._queue.qsize()
+        if depth > self.replicas:
+            logger.info('Whisper 推理池排队中: queue_depth=%s, replicas=%s', depth, self.replicas)
+        return job.future
+
+    def transcribe(self, audio, timeout: Optional[float] = None, **options) -> Dict:
+        return self.submit(audio, **options).result(timeout=timeout)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            done = (self._completed + self._failed) or 1
+            return {
+                'replicas': self.replicas,
+                'queue_depth': self._queue.qsize(),
+                'busy': self._busy,
+                'completed': self._completed,
+                'failed': self._failed,
+                'batches': self._batches,
+                'batched_jobs': self._batched_jobs,
+                'avg_wait_ms': round(self._total_wait / done * 1000, 1),
+                'avg_run_ms': round(self._total_run / done * 1000, 1),
+            }
+
+    def _record(self, jobs: List[_TranscribeJob], started: float, ok: bool) -> None:
+        # 一批共用一次推理，耗时按请求数均摊
+        run_per_job = (time.time() - started) / len(jobs)
+        with self._stats_lock:
+            for job in jobs:
+                self._total_wait += started - job.enqueued_at
+                self._total_run += run_per_job
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            if len(jobs) > 1:
+                self._batches += 1
+                self._batched_jobs += len(jobs)
+
+    # ------------------------------------------------------------------
+    # 工作线程
+    # ------------------------------------------------------------------
+
+    def _worker_loop(self, index: int, model) -> None:
+        batched = self._make_batched_pipeline(model) if self.batch_size > 1 else None
+        pending: List[_TranscribeJob] = []
+        while True:
+            job = pending.pop(0) if pending else self._queue.get()
+            if job is None:
+                break
+
+            jobs = [job]
+            if batched is not None and job.batch_key is not None and self._fits_batch(job):
+                # 不兼容的请求（含停止信号）按原顺序留到本批之后处理
+                jobs, leftovers = self._collect_batch(job)
+                pending.extend(leftovers)
+
+            with self._stats_lock:
+                self._busy += 1
+            started = time.time()
+            ok = True
+            try:
+                if len(jobs) > 1:
+                    self._run_batch(batched, jobs)
+                else:
+                    self._run_single(model, job)
+            except Exception:
+                logger.exception(f'Whisper 推理池任务失败: worker={index}, jobs={len(jobs)}')
+                ok = False
+            finally:
+                with self._stats_lock:
+                    self._busy -= 1
+                self._record(jobs, started, ok)
+
+    @staticmethod
+    def _make_batched_pipeline(model):
+        try:
+            from faster_whisper import BatchedInferencePipeline
+        except ImportError:
+            logger.warning('当前 faster-whisper 版本不支持 BatchedInferencePipeline，推理池不做批量合并')
+            return None
+        return BatchedInferencePipeline(model=model)
+
+    @staticmethod
+    def _load_samples(job: _TranscribeJob):
+        if job.samples is None:
+            if isinstance(job.audio, str):
+                from faster_whisper import decode_audio
+                job.samples = decode_audio(job.audio, sampling_rate=SAMPLE_RATE)
+            else:
+                job.samples = job.audio
+        return job.samples
+
+    def _fits_batch(self, job: _TranscribeJob) -> bool:
+        try:
+            samples = self._load_samples(job)
+        except Exception:
+            return False
+        if not len(samples):
+            return False
+        # 带语音区间的请求按区间切 clip；否则整段必须落在一个窗口内
+        return bool(job.options.get('clip_timestamps')) or len(samples) <= BATCH_CLIP_MAX_SEC * SAMPLE_RATE
+
+    def _collect_batch(self, first: _TranscribeJob):
+        """在 batch_wait 内尽量收集同参数的短音频请求；不兼容的请求留给本线程随后处理"""
+        jobs = [first]
+        leftovers: List[Optional[_TranscribeJob]] = []
+        deadline = time.time() + self.batch_wait
+        while len(jobs) < self.batch_size:
+            try:
+                remaining = deadline - time.time()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                leftovers.append(None)
+                break
+            if job.batch_key == first.batch_key and self._fits_batch(job):
+                jobs.append(job)
+            else:
+                leftovers.append(job)
+        return jobs, leftovers
+
+    @staticmethod
+    def _run_single(model, job: _TranscribeJob) -> None:
+        try:
+            audio = job.samples if job.samples is not None else job.audio
+            with_words = job.keep_words
+            # faster-whisper 返回 (segments, info)，segments 是惰性生成器，必须在副本线程内遍历完
+            segments, info = model.transcribe(audio, **job.options)
+            all_text = []
+            all_segments = []
+            for seg in segments:
+                all_text.append(seg.text)
+                all_segments.append(_segment_to_dict(seg, with_words=with_words))
+            job.future.set_result({
+                'text': ''.join(all_text).strip(),
+                'duration': info.duration,
+                'language': info.language,
+                'segments': all_segments,
+            })
+        except Exception as exc:
+            job.future.set_exception(exc)
+            raise
+
+    def _run_batch(self, batched, jobs: List[_TranscribeJob]) -> None:
+        """
+        每个 clip 单独占一个 30 秒槽位（不足部分补零，与 Whisper 自身的补齐方式一致），
+        各槽位首尾拼接为一条时间轴交给 BatchedInferencePipeline。
+
+        BatchedInferencePipeline 会把相邻的 clip 合并到不超过 30 秒的块里一起解码，
+        clip 占满整个窗口后无法再合并，保证一个分段只含一个请求的语音；
+        解码后按分段所在槽位拆回各自的请求。
+        """
+        import numpy as np
+
+        window = int(BATCH_CLIP_MAX_SEC * SAMPLE_RATE)
+        slots = []  # (请求序号, clip 在原音频中的起止采样)
+        for index, job in enumerate(jobs):
+            for start, end in _job_clip_ranges(job.options.get('clip_timestamps'), len(job.samples)):
+                slots.append((index, start, end))
+        audio = np.zeros(len(slots) * window, dtype=np.float32)
+        for slot, (index, start, end) in enumerate(slots):
+            audio[slot * window:slot * window + end - start] = jobs[index].samples[start:end]
+        clips = [{'start': slot * window, 'end': (slot + 1) * window} for slot in range(len(slots))]
+
+        options = dict(jobs[0].options)
+        options.pop('condition_on_previous_text', None)
+        options['vad_filter'] = False
+        options['clip_timestamps'] = clips
+
+        try:
+            segments, info = batched.transcribe(
+                audio, batch_size=min(len(clips), self.batch_size), **options
+            )
+            texts: List[List[str]] = [[] for _ in jobs]
+            results: List[List[Dict]] = [[] for _ in jobs]
+            for seg in segments:
+                slot = min(len(slots) - 1, int((seg.start + 1e-3) * SAMPLE_RATE // window))
+                index, start, end = slots[slot]
+                # 槽位时间轴 → 请求原时间轴；补零部分不计入分段
+                offset = (slot * window - start) / SAMPLE_RATE
+                item = _segment_to_dict(seg, offset=offset, with_words=jobs[index].keep_words)
+                item['end'] = min(item['end'], end / SAMPLE_RATE)
+                texts[index].append(seg.text)
+                results[index].append(item)
+        except Exception as exc:
+            for job in jobs:
+                job.future.set_exception(exc)
+            raise
+
+        for job, text, items in zip(jobs, texts, results):
+            job.future.set_result({
+                'text': ''.join(text).strip(),
+                'duration': len(job.samples) / SAMPLE_RATE,
+                'language': info.language,
+                'segments': items,
+            })
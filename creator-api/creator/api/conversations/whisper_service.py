@@ -14,7 +14,7 @@ Whisper 语音识别服务
 - 引擎：faster-whisper（基于 CTranslate2，速度快 4 倍）
 - 模型：medium（准确率 96%+，1.5GB）
 - 设备：M1/M2 Mac CPU 模式即可（速度很快）
-- 首次运行会自动下载模型到 ~/.cache/huggingface/
+- 模型预先放到 WHISPER_MODEL_DIR 或 ~/.cache/huggingface/（默认不在线下载）
 
 依赖安装：
 1. pip install faster-whisper
@@ -28,11 +28,14 @@ import tempfile
 import shutil
 import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
 import soundfile as sf
 
 from ...config import config
+from .whisper_pool import SAMPLE_RATE, WhisperInferencePool
 
 logger = logging.getLogger(__name__)
 
@@ -51,12 +54,68 @@ def _resolve_binary(name: str) -> Optional[str]:
             return candidate
     return None
 
+class ModelState:
+    """本地模型生命周期状态"""
+    UNLOADED = 'unloaded'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+
+# int8 推理时模型体积参考（仅用于日志）
+_MODEL_SIZES = {
+    'tiny': '~75MB',
+    'base': '~145MB',
+    'small': '~488MB',
+    'medium': '~1.5GB',
+    'large': '~3GB',
+    'large-v2': '~3GB',
+    'large-v3': '~3GB'
+}
+
+
+def _current_rss_mb() -> float:
+    """当前进程常驻内存（MB），优先读 /proc，其次 getrusage 峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    except Exception:
+        return 0.0
+
+
+def resolve_model_source(model_name: str) -> str:
+    """本地模型目录优先；否则按模型名从 HuggingFace 缓存加载（是否允许下载见 WHISPER_ALLOW_DOWNLOAD）"""
+    model_dir = (config.WHISPER_MODEL_DIR or '').strip()
+    if model_dir:
+        if not os.path.isdir(model_dir):
+            raise FileNotFoundError(f"Whisper 模型目录不存在: {model_dir}")
+        return model_dir
+    return model_name
+
+
 class WhisperService:
     """
     Whisper 语音识别服务（支持本地模型和 API）
     
+    本地模型有显式生命周期：
+    - UNLOADED → LOADING → READY / FAILED，加载在后台线程进行，不占用调用方的锁
+    - wait_until_ready() 基于 Event 等待就绪，不再 sleep 轮询
+    - 只从本地模型目录 / HuggingFace 缓存加载（WHISPER_ALLOW_DOWNLOAD=True 时才允许下载）
+    - 记录加载前后 RSS 差值作为模型内存占用；WHISPER_IDLE_UNLOAD_SEC>0 时空闲自动卸载
+      （use_pool 计数不为 0 时不卸载，进行中的转写不会遇到模型被释放）
+    
     使用方法：
-        service = WhisperService()
+        service = get_whisper_service()
+        service.ensure_loaded()
         result = service.transcribe(audio_path)
     """
     
@@ -64,113 +123,219 @@ class WhisperService:
         """
         初始化 Whisper 服务
         
-        根据配置选择本地模型或 API
+        根据配置选择本地模型或 API；本地模型不在构造时加载
         """
         self.use_local = config.WHISPER_USE_LOCAL
         self.model = None
+        self.pool = None
         self.api_client = None
+        self.state = ModelState.UNLOADED
+        self.load_error = None
+        self.model_rss_mb = 0.0
+        self.last_used_at = 0.0
+        self._in_use = 0
+        self._ready = threading.Event()
+        self._state_lock = threading.Lock()
+        self._idle_watcher = None
         
         if self.use_local:
             # 使用本地 Whisper 模型
             self.model_name = config.WHISPER_MODEL_NAME
             self.device = config.WHISPER_DEVICE
-            self._load_local_model()
         else:
             # 使用 OpenAI API
             self.model_name = 'whisper-1'
             self._init_api_client()
     
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    
+    @property
+    def is_ready(self) -> bool:
+        if not self.use_local:
+            return self.api_client is not None
+        return self.state == ModelState.READY
+    
+    def ensure_loaded(self, background: bool = True) -> None:
+        """未加载/加载失败时触发加载；background=False 时在当前线程加载完成后返回"""
+        if not self.use_local:
+            return
+        with self._state_lock:
+            if self.state in (ModelState.LOADING, ModelState.READY):
+                return
+            self.state = ModelState.LOADING
+            self.load_error = None
+            self._ready.clear()
+        if background:
+            threading.Thread(target=self._load_local_model, name='whisper-loader', daemon=True).start()
+        else:
+            self._load_local_model()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """触发加载并等待就绪；超时或加载失败返回 False"""
+        if not self.use_local:
+            return self.api_client is not None
+        self.ensure_loaded()
+        self._ready.wait(timeout)
+        return self.state == ModelState.READY
+    
+    def health(self) -> Dict:
+        """模型健康状态与内存占用"""
+        return {
+            'use_local': self.use_local,
+            'state': self.state if self.use_local else ('ready' if self.api_client else 'failed'),
+            'model_name': self.model_name,
+            'error': self.load_error,
+            'model_rss_mb': round(self.model_rss_mb, 1),
+            'process_rss_mb': round(_current_rss_mb(), 1),
+            'idle_sec': round(time.time() - self.last_used_at, 1) if self.last_used_at else None,
+            'pool': self.pool.stats() if self.pool is not None else None,
+        }
+    
+    @contextmanager
+    def use_pool(self):
+        """转写期间持有推理池；持有者计数不为 0 时 unload 不会释放模型"""
+        with self._state_lock:
+            pool = self.pool
+            if pool is None:
+                raise RuntimeError("Whisper 服务未正确初始化：模型已卸载")
+            self._in_use += 1
+            self.last_used_at = time.time()
+        try:
+            yield pool
+        finally:
+            with self._state_lock:
+                self._in_use -= 1
+                self.last_used_at = time.time()
+    
+    def unload(self, min_idle_sec: float = 0) -> bool:
+        """
+        卸载本地模型，释放内存（下次转写时重新加载）
+        
+        有转写正在使用推理池、或距上次使用不足 min_idle_sec 秒时不卸载，返回 False。
+        """
+        with self._state_lock:
+            if self.state != ModelState.READY or self._in_use:
+                return False
+            if min_idle_sec and time.time() - self.last_used_at < min_idle_sec:
+                return False
+            pool, self.pool, self.model = self.pool, None, None
+            self.state = ModelState.UNLOADED
+            self._ready.clear()
+        if pool is not None:
+            pool.shutdown(wait=True)
+        import gc
+        gc.collect()
+        logger.info(f"💤 Whisper 模型已卸载: {self.model_name}, 进程 RSS={_current_rss_mb():.0f}MB")
+        return True
+    
+    def _idle_watch_loop(self) -> None:
+        idle_sec = config.WHISPER_IDLE_UNLOAD_SEC
+        while self.state == ModelState.READY:
+            time.sleep(max(5.0, idle_sec / 4))
+            # 空闲判断与卸载在同一把锁内完成，不会与刚进入的转写竞争
+            if self.unload(min_idle_sec=idle_sec):
+                logger.info(f"Whisper 模型空闲 {idle_sec}s，已自动卸载")
+        self._idle_watcher = None
+    
     def _load_local_model(self):
         """
-        加载本地 Whisper 模型（使用 faster-whisper）
+        加载本地 Whisper 模型（使用 faster-whisper），结果写入 state / _ready
         
-        服务启动时会自动下载模型到 ~/.cache/huggingface/
-        如果模型未下载，会立即触发下载（约 1.5GB，需要 5-10 分钟）
+        默认只读本地：WHISPER_MODEL_DIR 或 ~/.cache/huggingface/ 中已存在的模型，
+        缺失时直接失败而不是在请求路径上下载（约 1.5GB）。
         """
         import sys
-        import os
         
-        # 配置 HuggingFace 镜像源（国内用户推荐）
+        allow_download = config.WHISPER_ALLOW_DOWNLOAD
+        # 配置 HuggingFace 镜像源（国内用户推荐），仅允许下载时需要
         # 如果设置了 HF_ENDPOINT 环境变量，优先使用
-        if not os.environ.get('HF_ENDPOINT'):
-            # 使用国内镜像源（hf-mirror.com）
+        if allow_download and not os.environ.get('HF_ENDPOINT'):
             os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
             logger.info(f"🌐 使用 HuggingFace 镜像源: https://hf-mirror.com")
         
-        logger.info(f"🔍 [诊断] 开始加载 faster-whisper 模型")
-        logger.info(f"🔍 [诊断] 模型名称: {self.model_name}")
-        logger.info(f"🔍 [诊断] 设备: {self.device}")
-        logger.info(f"🔍 [诊断] 计算类型: {config.WHISPER_COMPUTE_TYPE}")
-        logger.info(f"🔍 [诊断] 当前进程ID: {os.getpid()}")
+        logger.info(f"🚀 开始加载 faster-whisper 模型: {self.model_name}, 设备={self.device}, "
+                    f"计算类型={config.WHISPER_COMPUTE_TYPE}, 进程={os.getpid()}, 允许下载={allow_download}")
         
         try:
             from faster_whisper import WhisperModel
-            logger.info(f"🔍 [诊断] faster_whisper 模块导入成功")
             
-            logger.info(f"🚀 开始加载 faster-whisper 模型...")
-            logger.info(f"   - 如果是首次运行，将自动从 HuggingFace 下载模型")
-            logger.info(f"   - 下载位置: ~/.cache/huggingface/")
-            logger.info("=" * 60)
-            
-            # 强制刷新输出
-            sys.stdout.flush()
-            sys.stderr.flush()
-            
-            logger.info(f"🔍 [诊断] 调用 WhisperModel()...")
-            import time
+            source = resolve_model_source(self.model_name)
+            rss_before = _current_rss_mb()
             load_start = time.time()
             
-            # 加载模型（首次会自动下载）
-            # faster-whisper 会自动从 HuggingFace 下载 CTranslate2 格式的模型
-            self.model = WhisperModel(
-                self.model_name,
-                device=self.device,
-                compute_type=config.WHISPER_COMPUTE_TYPE,
-                download_root=None,  # 使用默认缓存目录
-                local_files_only=False  # 允许下载
+            replicas = max(1, config.WHISPER_POOL_REPLICAS)
+            cpu_threads = config.WHISPER_CPU_THREADS or max(1, (os.cpu_count() or 1) // replicas)
+
+            def create_model(index: int):
+                logger.info(f"   - 加载模型副本 {index + 1}/{replicas}, cpu_threads={cpu_threads}")
+                return WhisperModel(
+                    source,
+                    device=self.device,
+                    compute_type=config.WHISPER_COMPUTE_TYPE,
+                    cpu_threads=cpu_threads,
+                    num_workers=1,
+                    download_root=None,  # 使用默认缓存目录
+                    local_files_only=not allow_download,
+                )
+
+            # 多副本推理池：并发任务的转写请求在池内排队并合并批量解码
+            pool = WhisperInferencePool(
+                create_model,
+                replicas=replicas,
+                batch_size=config.WHISPER_BATCH_SIZE,
+                batch_wait_ms=config.WHISPER_BATCH_WAIT_MS,
             )
+            pool.start()
             
             load_time = time.time() - load_start
-            logger.info(f"🔍 [诊断] 模型加载完成，耗时: {load_time:.2f}秒")
-            logger.info(f"🔍 [诊断] 模型对象类型: {type(self.model)}")
-            logger.info(f"🔍 [诊断] 模型是否为 None: {self.model is None}")
+            self.model_rss_mb = max(0.0, _current_rss_mb() - rss_before)
+            with self._state_lock:
+                self.pool = pool
+                self.model = pool.primary_model
+                self.last_used_at = time.time()
+                self.state = ModelState.READY
+            self._ready.set()
             
             logger.info("=" * 60)
-            logger.info(f"✅ faster-whisper 模型加载成功: {self.model_name}")
+            logger.info(f"✅ faster-whisper 模型加载成功: {source}")
             logger.info(f"   - 引擎: faster-whisper (CTranslate2)")
-            logger.info(f"   - 设备: {self.device}")
-            logger.info(f"   - 计算类型: {config.WHISPER_COMPUTE_TYPE}")
-            
-            # 根据模型名称显示大小
-            model_sizes = {
-                'tiny': '~75MB',
-                'base': '~145MB',
-                'small': '~488MB',
-                'medium': '~1.5GB',
-                'large': '~3GB',
-                'large-v2': '~3GB',
-                'large-v3': '~3GB'
-            }
-            model_size = model_sizes.get(self.model_name, '未知')
-            logger.info(f"   - 模型大小: {model_size}")
-            logger.info(f"   - 准确率: 96%+")
-            logger.info(f"   - 性能提升: 比 openai-whisper 快 4 倍 🚀")
+            logger.info(f"   - 设备: {self.device}, 计算类型: {config.WHISPER_COMPUTE_TYPE}")
+            logger.info(f"   - 模型大小: {_MODEL_SIZES.get(self.model_name, '未知')}, 副本数: {replicas}")
+            logger.info(f"   - 加载耗时: {load_time:.2f}秒, 内存占用: {self.model_rss_mb:.0f}MB "
+                        f"(进程 RSS {_current_rss_mb():.0f}MB)")
             logger.info(f"   - 语音转文字服务已就绪！")
             
+            if config.WHISPER_IDLE_UNLOAD_SEC > 0 and self._idle_watcher is None:
+                self._idle_watcher = threading.Thread(
+                    target=self._idle_watch_loop, name='whisper-idle-watch', daemon=True
+                )
+                self._idle_watcher.start()
+            
             # 强制刷新输出
             sys.stdout.flush()
             sys.stderr.flush()
             
         except ImportError:
             logger.error("❌ faster-whisper 未安装，请运行: pip install faster-whisper")
-            logger.warning("将使用模拟模式")
-            self.model = None
+            self._mark_failed('faster-whisper 未安装')
         except Exception as e:
             logger.error(f"❌ faster-whisper 模型加载失败: {str(e)}")
-            logger.warning("将使用模拟模式")
+            if not allow_download:
+                logger.error("   模型需预先放到 WHISPER_MODEL_DIR 或 HuggingFace 缓存（或设置 WHISPER_ALLOW_DOWNLOAD=True）")
             import traceback
             logger.error(f"详细错误信息: {traceback.format_exc()}")
+            self._mark_failed(str(e))
+    
+    def _mark_failed(self, error: str) -> None:
+        with self._state_lock:
             self.model = None
+            self.pool = None
+            self.load_error = error
+            self.state = ModelState.FAILED
+        # 唤醒等待者，由调用方决定重试
+        self._ready.set()
     
     def _init_api_client(self):
         """
@@ -194,19 +359,25 @@ class WhisperService:
     
     def transcribe(
         self, 
-        audio_path: str,
+        audio_path: Union[str, "np.ndarray"],
         language: str = "zh",
         word_timestamps: bool = True,
         beam_size: int = 5,
         vad_filter: bool = False,
+        initial_prompt: Optional[str] = None,
+        keep_words: bool = False,
+        speech_only: bool = False,
     ) -> Dict:
         """
         转写音频文件
         
         Args:
-            audio_path: 音频文件路径
+            audio_path: 音频文件路径，或 decode_audio_to_pcm 得到的 16kHz float32 PCM 数组
             language: 语言代码（zh=中文, en=英文）
             word_timestamps: 是否返回词级时间戳（本地模型支持）
+            initial_prompt: 解码提示文本（流式转写传入上一块结尾，保持上下文连贯）
+            keep_words: 分段中是否附带词级时间戳（本地模型，需 word_timestamps=True）
+            speech_only: PCM 输入时先做能量 VAD，无语音直接返回空结果，有语音只解码语音区间
         
         Returns:
             {
@@ -216,38 +387,67 @@ class WhisperService:
                 "segments": [...]  # 本地模型返回详细分段，API 返回简化分段
             }
         """
-        logger.info(f"开始转写: {audio_path}, 模式={'本地' if self.use_local else 'API'}")
+        is_pcm = not isinstance(audio_path, str)
+        source = f"PCM[{len(audio_path)} samples]" if is_pcm else audio_path
+        logger.info(f"开始转写: {source}, 模式={'本地' if self.use_local else 'API'}")
         
-        # 1. 检查文件是否存在
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"音频文件不存在: {audio_path}")
+        if is_pcm:
+            # 内存 PCM：时长直接由采样数得出
+            duration = len(audio_path) / SAMPLE_RATE
+        else:
+            # 1. 检查文件是否存在
+            if not os.path.exists(audio_path):
+                raise FileNotFoundError(f"音频文件不存在: {audio_path}")
+            
+            # 2. 获取音频时长（优先使用 ffprobe，支持所有格式包括 webm）
+            duration = self._get_audio_duration(audio_path)
         
-        # 2. 获取音频时长（优先使用 ffprobe，支持所有格式包括 webm）
-        duration = self._get_audio_duration(audio_path)
+        # 3. 能量 VAD 预筛：静音块不进模型，有声块只解码语音区间（时间戳保持原时间轴）
+        clip_timestamps = None
+        if speech_only and is_pcm:
+            regions = detect_speech_regions(audio_path)
+            if not regions:
+                logger.info(f"能量 VAD 未检测到语音，跳过解码: 时长={duration:.2f}秒")
+                return {
+                    "text": "",
+                    "duration": duration,
+                    "language": language,
+                    "segments": [],
+                    "speech_skipped": True,
+                }
+            clip_timestamps = [t for region in regions for t in region]
+            vad_filter = False
         
-        # 3. 调用 faster-whisper 转写
+        # 4. 调用 faster-whisper 转写
         # faster-whisper 直接支持多种音频格式（通过 ffmpeg），无需预转换
         
         # 诊断：检查服务状态
         logger.info(f"🔍 [诊断] use_local={self.use_local}, model={self.model is not None}, api_client={self.api_client is not None}")
         
-        if self.use_local and self.model:
+        if self.use_local and self.wait_until_ready(timeout=config.WHISPER_READY_TIMEOUT_SEC):
             # 本地 faster-whisper 模型
             logger.info(f"🔍 [诊断] 使用 faster-whisper 模型进行转写")
             
             # faster-whisper 性能更好，直接使用文件路径即可
             # 不需要像 openai-whisper 那样的数组输入 workaround
             result = self._transcribe_with_local_model(
-                audio_path, language, word_timestamps, beam_size, vad_filter
+                audio_path, language, word_timestamps, beam_size, vad_filter,
+                initial_prompt=initial_prompt, keep_words=keep_words,
+                clip_timestamps=clip_timestamps,
             )
         elif self.api_client:
             # OpenAI API（支持 webm）
             logger.info(f"🔍 [诊断] 使用 OpenAI API 进行转写")
-            result = self._transcribe_with_openai_api(audio_path, language)
+            if is_pcm:
+                result = self._transcribe_pcm_with_openai_api(audio_path, language)
+            else:
+                result = self._transcribe_with_openai_api(audio_path, language)
             result['duration'] = duration
         else:
-            # 如果没有可用的转写服务，抛出异常
-            raise RuntimeError("Whisper 服务未正确初始化：模型未加载且 API 客户端未配置")
+            # 如果没有可用的转写服务，抛出异常（调用方据此延迟重试）
+            raise RuntimeError(
+                f"Whisper 服务未正确初始化：模型未加载且 API 客户端未配置 (state={self.state}, error={self.load_error})"
+            )
         
         logger.info(f"✅ 转写完成: 文本长度={len(result['text'])}, 时长={result.get('duration', 0):.2f}秒")
         
@@ -260,6 +460,9 @@ class WhisperService:
         word_timestamps: bool = True,
         beam_size: int = 5,
         vad_filter: bool = False,
+        initial_prompt: Optional[str] = None,
+        keep_words: bool = False,
+        clip_timestamps: Optional[List[float]] = None,
     ) -> Dict:
         """
         使用本地 Whisper 模型进行转写（faster-whisper）
@@ -286,13 +489,16 @@ class WhisperService:
             logger.info(f"🔍 [诊断] 开始转写检查")
             logger.info(f"🔍 [诊断] 模型对象类型: {type(self.model)}")
             logger.info(f"🔍 [诊断] 模型是否为 None: {self.model is None}")
-            logger.info(f"🔍 [诊断] 音频文件路径: {audio_path}")
-            logger.info(f"🔍 [诊断] 音频文件是否存在: {os.path.exists(audio_path)}")
-            if os.path.exists(audio_path):
-                file_size = os.path.getsize(audio_path)
-                logger.info(f"🔍 [诊断] 音频文件大小: {file_size} 字节 ({file_size/1024:.2f} KB)")
+            if isinstance(audio_path, str):
+                logger.info(f"🔍 [诊断] 音频文件路径: {audio_path}")
+                logger.info(f"🔍 [诊断] 音频文件是否存在: {os.path.exists(audio_path)}")
+                if os.path.exists(audio_path):
+                    file_size = os.path.getsize(audio_path)
+                    logger.info(f"🔍 [诊断] 音频文件大小: {file_size} 字节 ({file_size/1024:.2f} KB)")
+            else:
+                logger.info(f"🔍 [诊断] PCM 输入: {len(audio_path) / SAMPLE_RATE:.2f}秒")
             
-            logger.info(f"调用 faster-whisper 模型: {audio_path}, language={language}")
+            logger.info(f"调用 faster-whisper 模型: language={language}")
             logger.info("⏳ faster-whisper 转写中（比原版快 4 倍）...")
             logger.info("   提示：medium 模型在 CPU 上，3秒音频约需 2.5-7.5 秒")
             
@@ -305,64 +511,24 @@ class WhisperService:
             # - condition_on_previous_text: False 可以提高速度
             
             start_time = time.time()
-            logger.info(f"🔍 [诊断] 准备调用 model.transcribe()，时间: {start_time}")
-            logger.info(f"🔍 [诊断] 参数: language={language}, word_timestamps={word_timestamps}, beam_size=5")
-            
-            logger.info(f"🔍 [诊断] 开始调用 transcribe()...")
-            
-            # faster-whisper 返回 (segments, info) 元组
-            # segments 是一个生成器，需要遍历才能获取所有结果
-            segments, info = self.model.transcribe(
-                audio_path,
-                language=language,
-                beam_size=beam_size,
-                word_timestamps=word_timestamps,
-                vad_filter=vad_filter,
-                condition_on_previous_text=False,
-                no_speech_threshold=0.6,
-                log_prob_threshold=-1.0,
-            )
-            
-            elapsed_time = time.time() - start_time
-            logger.info(f"🔍 [诊断] transcribe() 调用完成（返回生成器），耗时: {elapsed_time:.2f}秒")
-            
-            # 诊断：检查返回结果
-            logger.info(f"🔍 [诊断] info 类型: {type(info)}")
-            logger.info(f"🔍 [诊断] segments 类型: {type(segments)}")
-            logger.info(f"🔍 [诊断] 检测到的语言: {info.language}")
-            logger.info(f"🔍 [诊断] 语言概率: {info.language_probability:.2f}")
-            logger.info(f"🔍 [诊断] 音频时长: {info.duration:.2f}秒")
+            logger.info(f"🔍 [诊断] 参数: language={language}, word_timestamps={word_timestamps}, beam_size={beam_size}")
             
-            # 遍历生成器，收集所有分段
-            logger.info("🔍 [诊断] 开始遍历 segments 生成器...")
-            segment_start = time.time()
-            
-            all_text = []
-            all_segments = []
-            
-            for seg in segments:
-                all_text.append(seg.text)
-                all_segments.append({
-                    "id": seg.id,
-                    "start": seg.start,
-                    "end": seg.end,
-                    "text": seg.text.strip()
-                })
-            
-            segment_time = time.time() - segment_start
-            logger.info(f"🔍 [诊断] segments 遍历完成，耗时: {segment_time:.2f}秒")
-            logger.info(f"🔍 [诊断] 获取到 {len(all_segments)} 个分段")
+            # 提交到推理池：由空闲副本执行，短音频会与其它请求合并为一次批量解码
+            with self.use_pool() as pool:
+                output = pool.transcribe(
+                    audio_path,
+                    language=language,
+                    beam_size=beam_size,
+                    word_timestamps=word_timestamps,
+                    vad_filter=vad_filter,
+                    initial_prompt=initial_prompt or None,
+                    keep_words=keep_words,
+                    clip_timestamps=clip_timestamps,
+                )
             
             total_time = time.time() - start_time
-            logger.info(f"⏱️ faster-whisper 总耗时: {total_time:.2f}秒")
-            
-            # 构建返回结果
-            output = {
-                "text": "".join(all_text).strip(),
-                "duration": info.duration,
-                "language": info.language,
-                "segments": all_segments
-            }
+            logger.info(f"🔍 [诊断] 获取到 {len(output['segments'])} 个分段")
+            logger.info(f"⏱️ faster-whisper 总耗时: {total_time:.2f}秒, 推理池: {pool.stats()}")
             
             logger.info(f"✅ faster-whisper 转写成功: 文本长度={len(output['text'])}")
             return output
@@ -439,6 +605,19 @@ class WhisperService:
             logger.error(f"OpenAI Whisper API 转写失败: {str(e)}")
             raise
     
+    def _transcribe_pcm_with_openai_api(self, samples: "np.ndarray", language: str) -> Dict:
+        """API 只接受文件：把 PCM 写成临时 WAV 再上传"""
+        tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        tmp.close()
+        try:
+            sf.write(tmp.name, samples, SAMPLE_RATE, subtype='PCM_16')
+            return self._transcribe_with_openai_api(tmp.name, language)
+        finally:
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+    
     def _convert_audio_if_needed(self, audio_path: str) -> str:
         """
         如果需要，将音频转换为 wav 格式
@@ -649,8 +828,19 @@ class WhisperService:
         """
         logger.info(f"开始分段转写: {audio_path}")
         
-        # 1. 先进行完整转写
-        result = self.transcribe(audio_path, language=language, word_timestamps=True)
+        # 1. 长音频（本地模型）先按静音切片并行转写；短音频直接完整转写
+        result = None
+        if (
+            self.use_local
+            and os.path.exists(audio_path)
+            and self.wait_until_ready(timeout=config.WHISPER_READY_TIMEOUT_SEC)
+        ):
+            duration = self._get_audio_duration(audio_path)
+            if duration >= config.WHISPER_PARALLEL_MIN_DURATION_SEC:
+                from .whisper_parallel import transcribe_long_audio
+                result = transcribe_long_audio(self, audio_path, language=language)
+        if result is None:
+            result = self.transcribe(audio_path, language=language, word_timestamps=True)
         
         # 2. 如果音频较短（<5分钟），不需要分段
         if result['duration'] < 300:
@@ -794,34 +984,92 @@ def append_webm_segment(master_path: str, chunk_path: str) -> None:
         dst.write(data)
 
 
-def extract_audio_segment_to_wav(input_path: str, start_sec: float = 0.0) -> str:
+def detect_speech_regions(
+    samples: "np.ndarray",
+    frame_ms: int = 30,
+    min_speech_ms: int = None,
+    merge_gap_ms: int = 400,
+    pad_ms: int = 200,
+    max_region_sec: float = 30.0,
+) -> List[Tuple[float, float]]:
+    """
+    基于短时能量的轻量 VAD，返回语音区间 [(start_sec, end_sec), ...]。
+
+    阈值取「噪声底（10% 分位）+ 10dB」，并限制在 [VOICE_VAD_THRESHOLD_DB, -30dB] 之间：
+    纯静音/底噪块整体低于下限直接判为无语音；整段都在说话时上限保证不会把语音误判为底噪。
+    """
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32, copy=False)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    db = 20 * np.log10(rms)
+    floor_db = float(np.percentile(db, 10))
+    threshold = min(max(floor_db + 10.0, float(config.VOICE_VAD_THRESHOLD_DB)), -30.0)
+    voiced = db > threshold
+
+    min_frames = max(1, (min_speech_ms or config.VOICE_VAD_MIN_SPEECH_MS) // frame_ms)
+    gap_frames = merge_gap_ms // frame_ms
+    regions = []
+    start = None
+    last_voiced = None
+    for i, flag in enumerate(voiced):
+        if not flag:
+            continue
+        if start is None:
+            start = i
+        elif i - last_voiced > gap_frames:
+            regions.append((start, last_voiced + 1))
+            start = i
+        last_voiced = i
+    if start is not None:
+        regions.append((start, last_voiced + 1))
+
+    total_sec = len(samples) / SAMPLE_RATE
+    pad = pad_ms / 1000.0
+    result = []
+    for begin, end in regions:
+        if end - begin < min_frames:
+            continue
+        begin_sec = max(0.0, begin * frame_ms / 1000.0 - pad)
+        end_sec = min(total_sec, end * frame_ms / 1000.0 + pad)
+        if result and begin_sec <= result[-1][1]:
+            begin_sec = result.pop()[0]
+        # 单个区间不超过一个 Whisper 窗口，便于推理池批量解码
+        while end_sec - begin_sec > max_region_sec:
+            result.append((begin_sec, begin_sec + max_region_sec))
+            begin_sec += max_region_sec
+        result.append((begin_sec, end_sec))
+    return result
+
+
+def decode_audio_to_pcm(input_path: str, start_sec: float = 0.0) -> "np.ndarray":
     """
-    将音频从 start_sec 起截取到末尾，转为 16kHz 单声道 WAV（Whisper 推荐格式）。
-    WebM 不能用 -acodec copy 截取，必须重编码。
+    用 ffmpeg 把音频从 start_sec 起解码为 16kHz 单声道 float32 PCM，经 stdout 直接读入内存。
+    -ss 放在 -i 之前做输入侧 seek，只解码新增的尾部，不落盘、不二次解码。
     """
     ffmpeg_bin = _resolve_binary('ffmpeg') or 'ffmpeg'
-    tmp = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    tmp.close()
-    output_path = tmp.name
-
-    cmd = [ffmpeg_bin, '-y', '-i', input_path]
+    cmd = [ffmpeg_bin, '-nostdin', '-v', 'error']
     if start_sec > 0:
-        cmd += ['-ss', str(start_sec)]
-    cmd += ['-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le', output_path]
+        cmd += ['-ss', f'{start_sec:.3f}']
+    cmd += [
+        '-i', input_path,
+        '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1',
+    ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    result = subprocess.run(cmd, capture_output=True, timeout=120)
     if result.returncode != 0:
-        try:
-            os.unlink(output_path)
-        except OSError:
-            pass
-        raise RuntimeError(f'ffmpeg 音频截取失败: {result.stderr}')
+        raise RuntimeError(f'ffmpeg 音频解码失败: {result.stderr.decode("utf-8", "ignore")}')
 
-    return output_path
+    return np.frombuffer(result.stdout, dtype=np.float32)
 
 
-# 单例实例（进程内加锁，避免并发任务重复初始化）
+# 单例实例（只构造服务对象，模型加载由 ensure_loaded 在后台完成）
 _whisper_service = None
+_owner_pid = None
 _whisper_lock = threading.Lock()
 
 
@@ -829,15 +1077,15 @@ def get_whisper_service() -> WhisperService:
     """
     获取 WhisperService 单例
     
-    使用单例模式避免重复创建 OpenAI 客户端。
-    模型首次加载可能较慢，并发任务会阻塞等待同进程内加载完成。
+    构造开销很小，不会在锁内加载模型；需要模型时调用 ensure_loaded / wait_until_ready。
+    fork 出的子进程（Huey process worker）按 pid 重建自己的服务：父进程的推理池线程不会随 fork 带过去，
+    沿用继承来的 READY 状态会让 pool.transcribe 永远等不到结果。
     """
-    global _whisper_service
-    with _whisper_lock:
-        if _whisper_service is None:
-            _whisper_service = WhisperService()
-        elif _whisper_service.use_local and _whisper_service.model is None:
-            logger.info('Whisper 模型未就绪，尝试重新加载...')
-            _whisper_service._load_local_model()
+    global _whisper_service, _owner_pid
+    pid = os.getpid()
+    if _whisper_service is None or _owner_pid != pid:
+        with _whisper_lock:
+            if _whisper_service is None or _owner_pid != pid:
+                _whisper_service = WhisperService()
+                _owner_pid = pid
     return _whisper_service
-
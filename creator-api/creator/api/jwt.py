@@ -1,6 +1,7 @@
 import json
 import inspect
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, Request
 from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
@@ -40,6 +41,24 @@ async def get_user(Authorize: AuthJWT = Depends(get_jwt_authorizer),
         raise HTTPException(status_code=404, detail="User not found")
 
 
+async def get_async_user(Authorize: AuthJWT = Depends(get_jwt_authorizer),
+                         db: AsyncSession = Depends(sm.get_async_db)):
+    """get_user 的异步版本，供使用异步会话的接口"""
+    claims = await Authorize.get_raw_jwt()
+    user_id = claims.get('id')
+    user_type = claims.get('utype')
+
+    if not user_id or not user_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user_type == 'web':
+        return await User.aget(db, user_id)
+    elif user_type == 'bo':
+        return await BoUser.aget(db, user_id)
+    else:
+        raise HTTPException(status_code=404, detail="User not found")
+
+
 async def get_user_id(Authorize: AuthJWT = Depends(get_jwt_authorizer)):
     claims = await Authorize.get_raw_jwt()
     user_id = claims.get('id')
@@ -1,4 +1,3 @@
-import uuid
 from fastapi import UploadFile, File
 from ...db import sm
 from .. import router as app
@@ -6,7 +5,8 @@ from ..jwt import login_required, get_user
 from ..utils import abort_json
 from .forms import ImageForm, AudioForm, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_AUDIO_EXTENSIONS
 from .models import MediaModel
-from ...config import config
+from .storage import CHUNK_SIZE, MediaFileWriter
+from .tasks import generate_media_derivatives_task
 
 
 @app.post('/media')
@@ -32,28 +32,28 @@ async def upload_media(file: UploadFile = File(...)):
     else:
         raise abort_json(400, f'不支持的文件格式: {ext}')
     
-    # 生成安全的文件名
-    key = uuid.uuid4().hex
-    secure_filename = f"{file_type}_{key}.{ext}"
-    filepath = config.UPLOADS_DEFAULT_DEST
-    
-    # 保存文件
-    full_path = f"{filepath}/{secure_filename}"
-    with open(full_path, "wb") as buffer:
-        buffer.write(await file.read())
+    # 分块写入临时文件后原子改名（图片按内容寻址去重，音频用随机文件名）
+    with MediaFileWriter() as writer:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+        secure_filename = writer.commit(file_type, ext, dedup=file_type == "image")
     
     # 创建数据库记录
     with sm.transaction_scope() as sa:
         m = MediaModel.create(sa, profile={})
         m.filename = secure_filename
-        
-        # 图片需要生成缩略图
-        if file_type == "image":
-            m.save_thumbnail(secure_filename)
-        
+        m.sha256 = writer.hexdigest
+        m.size = writer.size
         sa.commit()
         data = m.dump()
     
+    # 缩略图与预览图在后台生成（生成前 thumbnail_url 退回原图）
+    if file_type == "image":
+        generate_media_derivatives_task(data['id'])
+    
     return dict(
         success=True,
         data=data,
@@ -0,0 +1,130 @@
+"""
+图片衍生文件（缩略图 + WebP/AVIF 预览图）
+
+由 media.tasks.generate_media_derivatives_task 在后台生成，不占用上传请求：
+- 原图只解码一次：JPEG 先用 Image.draft 让解码器按 1/2、1/4、1/8 直接缩小解码，
+  再以 reducing_gap 先整数倍 reduce、后 LANCZOS 精缩；多个尺寸从大到小依次在上一级结果上缩放
+- 缩略图沿用 {name}_thumbnail.{ext} 命名（兼容已有文件），预览图为 {name}_{边长}.webp / .avif
+- 写临时文件后 os.replace，已存在的衍生文件不重复生成（图片按内容寻址命名，重复上传可直接复用）
+- 安装 pillow-avif-plugin（或 Pillow 自带 AVIF 编码）时才输出 AVIF
+"""
+
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from PIL import Image
+
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+try:  # 可选：为 Pillow 注册 AVIF 编解码
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# 缩放时先整数倍 reduce 到目标尺寸的 2 倍以内，再精缩
+_REDUCING_GAP = 2.0
+
+
+def avif_supported() -> bool:
+    return config.MEDIA_AVIF_ENABLED and 'AVIF' in Image.SAVE
+
+
+def split_filename(filename: str):
+    name, _, ext = filename.rpartition('.')
+    return name, ext.lower()
+
+
+def thumbnail_filename(filename: str) -> str:
+    name, ext = split_filename(filename)
+    return f'{name}_thumbnail.{ext}'
+
+
+def _save_atomic(im: Image.Image, directory: str, filename: str, fmt: str, **params) -> None:
+    tmp_path = os.path.join(directory, f'.tmp_{uuid.uuid4().hex}')
+    try:
+        im.save(tmp_path, format=fmt, **params)
+        os.replace(tmp_path, os.path.join(directory, filename))
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _resized(source: Image.Image, max_side: int) -> Image.Image:
+    im = source.copy()
+    im.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=_REDUCING_GAP)
+    return im
+
+
+def _for_thumbnail_format(im: Image.Image, ext: str) -> Image.Image:
+    if ext in ('jpg', 'jpeg') and im.mode not in ('RGB', 'L'):
+        return im.convert('RGB')
+    return im
+
+
+def build_derivatives(filename: str, directory: Optional[str] = None) -> Optional[dict]:
+    """
+    为图片生成缩略图与预览图，返回写入 MediaModel.derivatives 的元数据；非图片返回 None。
+    """
+    directory = directory or config.UPLOADS_DEFAULT_DEST
+    name, ext = split_filename(filename)
+    if ext not in IMAGE_EXTENSIONS:
+        return None
+
+    path = os.path.join(directory, filename)
+    preview_sides = sorted({int(s) for s in config.MEDIA_PREVIEW_SIZES if s}, reverse=True)
+    thumb_box = tuple(config.DEFAULT_THUMBNAIL_SIZE)
+    formats = ['webp'] + (['avif'] if avif_supported() else [])
+
+    with Image.open(path) as im:
+        width, height = im.size
+        largest = max(preview_sides + [max(thumb_box)])
+        if im.format == 'JPEG':
+            # 让 JPEG 解码器直接按 1/2^n 缩小解码（结果不小于目标尺寸）
+            scale = max(width, height) / largest
+            if scale > 1:
+                im.draft('RGB', (int(width / scale), int(height / scale)))
+        im.load()
+        if im.mode == 'P':
+            im = im.convert('RGBA')
+        elif im.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            im = im.convert('RGB')
+
+        variants: List[dict] = []
+        current = im
+        for side in preview_sides:
+            if side < max(width, height):
+                current = _resized(current, side)
+            for fmt in formats:
+                out_name = f'{name}_{side}.{fmt}'
+                if not os.path.exists(os.path.join(directory, out_name)):
+                    params = {'quality': config.MEDIA_PREVIEW_QUALITY}
+                    if fmt == 'webp':
+                        params['method'] = 4
+                    _save_atomic(current, directory, out_name, fmt.upper(), **params)
+                variants.append({
+                    'filename': out_name,
+                    'format': fmt,
+                    'width': current.width,
+                    'height': current.height,
+                })
+
+        thumb_name = thumbnail_filename(filename)
+        thumb = current.copy()
+        thumb.thumbnail(thumb_box, Image.LANCZOS, reducing_gap=_REDUCING_GAP)
+        if not os.path.exists(os.path.join(directory, thumb_name)):
+            fmt = Image.registered_extensions().get(f'.{ext}', 'PNG')
+            _save_atomic(_for_thumbnail_format(thumb, ext), directory, thumb_name, fmt)
+
+    return {
+        'width': width,
+        'height': height,
+        'thumbnail': {'filename': thumb_name, 'width': thumb.width, 'height': thumb.height},
+        'variants': variants,
+        'generated_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+    }
@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import Optional
 from sqlalchemy_utils import generic_relationship
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy import (
@@ -15,11 +16,12 @@ from sqlalchemy import (
     Boolean,
     Date
 )
-from PIL import Image
 from sqlalchemy.orm import Mapped, mapped_column
 from ...db import (
     CRUDMixin,
     ProfileMixin,
+    integer_property,
+    object_property,
     sm,
     string_property,
 )
@@ -42,6 +44,21 @@ class MediaModel(CRUDMixin, ProfileMixin,):
     def filename(self):
         pass
 
+    @string_property
+    def sha256(self):
+        """文件内容 SHA-256（流式写入时计算）"""
+        pass
+
+    @integer_property
+    def size(self):
+        """文件字节数"""
+        pass
+
+    @object_property
+    def derivatives(self):
+        """衍生图元数据（media.tasks 后台生成）：{width, height, thumbnail: {...}, variants: [{filename, format, width, height}]}"""
+        pass
+
     @classmethod
     def link_obj(cls, media_ids, obj):
         for m in cls.get_by_obj(obj):
@@ -58,47 +75,54 @@ class MediaModel(CRUDMixin, ProfileMixin,):
     def get_by_obj(cls, obj):
         return cls.query.filter(cls.object == obj).order_by(MediaModel.id)
 
-    @classmethod
-    def save_thumbnail(cls, filename):
-        directory = config.UPLOADS_DEFAULT_DEST
-        if len(filename.split('.')) != 2:
-            return
-        path = os.path.join(directory, filename)
-        name = filename.split('.')[0]
-        ext = filename.split('.')[1]
-        im = Image.open(path)
-        im.thumbnail(config.DEFAULT_THUMBNAIL_SIZE)
-        thumbnail_filename = '{}_thumbnail.{}'.format(name, ext)
-        thumbnail_path = os.path.join(directory, thumbnail_filename)
-        logger.info(
-            'writing thumbnail image to file %s', thumbnail_filename)
-        im.save(thumbnail_path)
-        return thumbnail_filename
-
-    @property
-    def url(self):
+    @staticmethod
+    def _file_url(filename):
         external_url = config.EXTERNAL_URL
         debug = config.DEBUG
-        # filepath = config.UPLOADS_DEFAULT_DEST
-        url = f'{external_url}/media/{self.filename}'
+        url = f'{external_url}/media/{filename}'
         if not debug:
             return url.replace('http://', 'https://')
         return url
 
+    @property
+    def url(self):
+        return self._file_url(self.filename)
+
     @property
     def thumbnail_url(self):
-        external_url = config.EXTERNAL_URL
-        debug = config.DEBUG
-        thumbnail_filename = f'{self.filename.split(".")[0]}_thumbnail.{self.filename.split(".")[1]}'
-        url = f'{external_url}/media/{thumbnail_filename}'
-        if not debug:
-            return url.replace('http://', 'https://')
-        return url
+        """缩略图地址；衍生图尚未生成（或非图片）时退回原图地址"""
+        from .derivatives import thumbnail_filename
+
+        thumbnail = self.derivatives.get('thumbnail')
+        if thumbnail:
+            return self._file_url(thumbnail['filename'])
+        # 旧版上传时同步生成的缩略图
+        legacy = thumbnail_filename(self.filename)
+        if os.path.exists(os.path.join(config.UPLOADS_DEFAULT_DEST, legacy)):
+            return self._file_url(legacy)
+        return self.url
+
+    def preview_url(self, max_side: int = 1280, fmt: Optional[str] = None) -> str:
+        """不小于 max_side 的最小预览图（默认 WebP）；没有合适的预览图时返回原图地址"""
+        fmt = fmt or 'webp'
+        variants = [
+            v for v in self.derivatives.get('variants') or []
+            if v.get('format') == fmt
+        ]
+        fitting = [v for v in variants if max(v['width'], v['height']) >= max_side]
+        if fitting:
+            best = min(fitting, key=lambda v: max(v['width'], v['height']))
+        elif variants:
+            best = max(variants, key=lambda v: max(v['width'], v['height']))
+        else:
+            return self.url
+        return self._file_url(best['filename'])
 
     def dump(self):
         return dict(
             id=self.id,
             filename=self.filename,
             thumbnail_url=self.thumbnail_url,
+            preview_url=self.preview_url(),
             url=self.url,
         )
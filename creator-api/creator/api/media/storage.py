@@ -0,0 +1,101 @@
+"""
+媒体文件流式落盘
+
+上传文件、生图结果（base64 或 URL）都按块写入 UPLOADS_DEFAULT_DEST 下的临时文件，边写边算
+SHA-256，写完后 os.replace 原子改名，读者不会看到写了一半的文件：
+- 图片按内容寻址命名（{前缀}_{sha256 前 32 位}.{ext}），相同内容只保留一份文件（含缩略图）
+- 音频保持随机文件名：流式录音会向 master 文件追加分块，不能与其他记录共用文件
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import uuid
+from typing import Optional
+
+import requests
+
+from ...config import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# base64 按 4 字符对齐分块解码
+_B64_CHUNK_CHARS = 4 * 256 * 1024
+
+
+class MediaFileWriter:
+    """
+    临时文件 + 增量 SHA-256 的写入器。
+
+    用法：
+        with MediaFileWriter() as writer:
+            writer.write(chunk)
+            filename = writer.commit('image', 'png', dedup=True)
+    未 commit 或中途异常时删除临时文件。
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or config.UPLOADS_DEFAULT_DEST
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._tmp_path = os.path.join(self.directory, f'.tmp_{uuid.uuid4().hex}')
+        self._fp = None
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._fp = open(self._tmp_path, 'wb')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._discard()
+        return False
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._fp.write(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+    def commit(self, prefix: str, ext: str, dedup: bool = False) -> str:
+        """落盘并原子改名，返回最终文件名（dedup=True 时同内容文件已存在则直接复用）"""
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        self._fp.close()
+        if dedup:
+            filename = f'{prefix}_{self.hexdigest[:32]}.{ext}'
+        else:
+            filename = f'{prefix}_{uuid.uuid4().hex}.{ext}'
+        final_path = os.path.join(self.directory, filename)
+        if dedup and os.path.exists(final_path):
+            logger.info(f'♻️ 媒体文件内容重复，复用已有文件: {filename}')
+        else:
+            os.replace(self._tmp_path, final_path)
+        self._discard()
+        return filename
+
+    def _discard(self):
+        if self._fp is not None and not self._fp.closed:
+            self._fp.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+def write_base64(writer: MediaFileWriter, b64_data: str) -> None:
+    """分块解码 base64 写入（不在内存中生成完整的解码结果）"""
+    for start in range(0, len(b64_data), _B64_CHUNK_CHARS):
+        writer.write(base64.b64decode(b64_data[start:start + _B64_CHUNK_CHARS]))
+
+
+def write_url(writer: MediaFileWriter, url: str, timeout: int = 60) -> None:
+    """流式下载 URL 写入"""
+    with requests.get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            writer.write(chunk)
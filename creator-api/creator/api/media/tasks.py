@@ -0,0 +1,36 @@
+import logging
+
+from ...db import sm
+from ...huey_config import huey
+from .derivatives import build_derivatives
+from .models import MediaModel
+
+logger = logging.getLogger(__name__)
+
+
+@huey.task()
+def generate_media_derivatives_task(media_id: int):
+    """
+    异步任务：为图片生成缩略图与 WebP/AVIF 预览图，元数据写入 MediaModel.derivatives
+    """
+    with sm.transaction_scope() as sa:
+        media = MediaModel.get(sa, media_id)
+        filename = media.filename if media else None
+    if not filename:
+        return
+
+    try:
+        derivatives = build_derivatives(filename)
+    except Exception as exc:
+        logger.exception(f'生成媒体衍生图失败: media_id={media_id}, error={exc}')
+        return
+    if derivatives is None:
+        return
+
+    with sm.transaction_scope() as sa:
+        media = MediaModel.get(sa, media_id)
+        if media:
+            media.derivatives = derivatives
+    logger.info(
+        f'🖼️ 媒体衍生图已生成: media_id={media_id}, variants={len(derivatives["variants"])}'
+    )
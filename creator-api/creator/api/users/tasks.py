@@ -1,6 +1,5 @@
 import logging
 import json
-import asyncio
 from huey import crontab
 
 from ...db import sm
@@ -9,6 +8,7 @@ from .models import User
 from ..conversations.prompts import get_user_profile_analysis_prompt
 from ...config import config
 from ..ai.openai_api import reply_text_default
+from ..ai.runtime import run_ai
 
 logger = logging.getLogger(__name__)
 
@@ -35,11 +35,12 @@ def analyze_user_profile(user_id: int):
             # 2. 调用AI服务（默认 DeepSeek，支持 JSON 模式）
             logger.info("Calling AI service for profile analysis...")
             
-            ai_response_text = asyncio.run(
+            ai_response_text = run_ai(
                 reply_text_default(
                     messages=messages,
                     user=user,
                     response_format='json_object',
+                    cache=True,
                 )
             )
             
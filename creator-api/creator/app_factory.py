@@ -116,14 +116,14 @@ async def startup_event():
         config.ALY_MODEL_NAME,
     )
     
-    # 初始化 faster-whisper 服务（预加载模型，首次运行会自动下载）
-    if config.WHISPER_USE_LOCAL:
+    # 初始化 faster-whisper 服务：仅当 API 进程自己转写（未走 Huey）或显式要求时才预加载，
+    # 否则模型只常驻在 Huey worker，API 进程不占这部分内存
+    if config.WHISPER_USE_LOCAL and (config.WHISPER_PRELOAD_IN_API or not config.VOICE_TRANSCRIBE_USE_HUEY):
         try:
             from creator.api.conversations.whisper_service import get_whisper_service
-            logger.info("正在初始化 faster-whisper 服务...")
+            logger.info("正在后台预加载 faster-whisper 模型...")
             logger.info(f"模型配置: {config.WHISPER_MODEL_NAME}, 设备: {config.WHISPER_DEVICE}, 精度: {config.WHISPER_COMPUTE_TYPE}")
-            get_whisper_service()  # 触发模型预加载
-            logger.info("✅ faster-whisper 服务初始化完成（比 openai-whisper 快 4 倍）")
+            get_whisper_service().ensure_loaded(background=True)
         except Exception as e:
             logger.error(f"Whisper 服务初始化失败: {str(e)}")
     
@@ -135,6 +135,9 @@ async def startup_event():
 async def shutdown_event():
     # 在这里执行关闭时的清理操作
     print("Application shutdown: cleaning up resources")
+    # 进程内后台任务：停止接收，未到期的延迟任务转投 Huey，等待已排队任务执行完
+    from creator.api.background import shutdown as shutdown_background
+    shutdown_background()
     # 例如，断开数据库连接
     # await disconnect_from_database()
 
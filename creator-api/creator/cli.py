@@ -112,6 +112,7 @@ def test_whisper(
         sys.stdout.flush()
         
         whisper_service = get_whisper_service()
+        whisper_service.ensure_loaded(background=False)
         
         typer.echo(f"✅ WhisperService 实例获取成功")
         typer.echo(f"   - use_local: {whisper_service.use_local}")
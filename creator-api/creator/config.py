@@ -45,12 +45,25 @@ class Settings(BaseSettings):
     EXTERNAL_URL: str = 'http://127.0.0.1:8000'
 
     HUEY_NAME: str = 'creator.huey'
+    # Huey 队列指标：每个队列保留的排队等待样本数、p95 等待超过该秒数时告警
+    HUEY_METRICS_WINDOW: int = 500
+    HUEY_WAIT_WARN_SEC: int = 30
     REDIS_HOST: str = '127.0.0.1'
     REDIS_PORT: int = 6379
     REDIS_DB: int = 10
 
     UPLOADS_DEFAULT_DEST: str = './instance'
     DEFAULT_THUMBNAIL_SIZE: Tuple[int, int] = (400, 400)
+    # 图片衍生预览图：最长边尺寸、WebP/AVIF 质量、是否输出 AVIF（需 Pillow 支持 AVIF 编码）
+    MEDIA_PREVIEW_SIZES: List[int] = [1280, 640]
+    MEDIA_PREVIEW_QUALITY: int = 80
+    MEDIA_AVIF_ENABLED: bool = True
+    # 脚本分享 ZIP 缓存（脚本与素材未变时直接返回已打包的文件）；
+    # 缓存目录不能放在 UPLOADS_DEFAULT_DEST 下（instance/ 整体以 /media 对外提供，无鉴权）
+    SCRIPT_SHARE_CACHE_ENABLED: bool = True
+    SCRIPT_SHARE_CACHE_DIR: str = './cache/share'
+    # 分享包缓存有效期（秒，按导出时间计）；过期后重新打包，定期清理删除（含已删除脚本的包）
+    SCRIPT_SHARE_CACHE_TTL_SEC: int = 3600 * 24 * 7
 
     SENSITIVE_KEYWORDS: Tuple[str, ...] = (
         'client_name',
@@ -112,6 +125,31 @@ class Settings(BaseSettings):
     DOUBAO_16_TIMEOUT: int = 180
     DOUBAO_16_THINKING_MODE: str = 'enabled'
 
+    # API 进程内后台执行器（断线兜底回复、进程内转写等）：工作线程数、排队上限（满了转投 Huey）、关闭时等待排队任务的秒数
+    BACKGROUND_MAX_WORKERS: int = 8
+    BACKGROUND_QUEUE_SIZE: int = 200
+    BACKGROUND_SHUTDOWN_TIMEOUT_SEC: int = 30
+
+    # 大模型 HTTP 连接池：是否启用 HTTP/2（需安装 h2）、每个模型每个事件循环的最大连接数、空闲连接保活秒数
+    AI_HTTP2_ENABLED: bool = True
+    AI_HTTP_MAX_CONNECTIONS: int = 20
+    AI_HTTP_KEEPALIVE_EXPIRY: int = 120
+
+    # 大模型回复缓存（Redis，仅对调用方显式开启 cache 的确定性提示词生效）
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SEC: int = 3600 * 24
+    LLM_CACHE_MAX_ENTRY_BYTES: int = 256 * 1024
+
+    # 大模型供应商路由：统计窗口（最近 N 次调用）、p95 对冲（等待时间上下界与样本不足时的默认值）、熔断（连续失败次数 / 错误率 / 冷却秒数）
+    AI_ROUTER_STATS_WINDOW: int = 100
+    AI_ROUTER_HEDGE_ENABLED: bool = True
+    AI_ROUTER_HEDGE_MIN_DELAY_SEC: float = 3.0
+    AI_ROUTER_HEDGE_MAX_DELAY_SEC: float = 40.0
+    AI_ROUTER_HEDGE_DEFAULT_DELAY_SEC: float = 20.0
+    AI_ROUTER_BREAKER_FAILURES: int = 5
+    AI_ROUTER_BREAKER_ERROR_RATE: float = 0.5
+    AI_ROUTER_BREAKER_COOLDOWN_SEC: int = 60
+
     DEEPSEEK_API_KEY: str = ''
     DEEPSEEK_MODEL_NAME: str = 'deepseek-v4-pro'
 
@@ -121,6 +159,13 @@ class Settings(BaseSettings):
 
     CHAT_MAX_HISTORY_MESSAGES: int = 36
     CHAT_MAX_MESSAGE_CHARS: int = 6000
+    # 对话上下文 token 预算（tiktoken 计数，含摘要与当前消息）与脚本提取时的对话预算
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 24000
+    CHAT_EXTRACT_TOKEN_BUDGET: int = 48000
+    # 会话滚动摘要：未摘要原文超过触发阈值时，把较早轮次折叠进 context_summary，只保留最近 KEEP_RECENT 的原文
+    CHAT_SUMMARY_TRIGGER_TOKENS: int = 16000
+    CHAT_SUMMARY_KEEP_RECENT_TOKENS: int = 8000
+    CHAT_SUMMARY_MAX_TOKENS: int = 1500
     CHAT_MAX_REFERENCED_SCRIPTS: int = 3
     CHAT_MAX_SCRIPT_REF_CHARS: int = 4000
     CHAT_MAX_SCRIPT_REF_TOTAL_CHARS: int = 10000
@@ -146,6 +191,12 @@ class Settings(BaseSettings):
     GPT_IMAGE_2_DEFAULT_SIZE_COVER_POSTER: str = '1024x1536'
     GPT_IMAGE_2_DEFAULT_QUALITY: str = 'high'
     GPT_IMAGE_2_REQUEST_TIMEOUT: int = 240
+    # 脚本 AI 素材生图并发：单个任务内并行张数、全局（所有 worker 共享 Redis 槽位）同时生图上限、
+    # 等待槽位的最长秒数、generated_items 进度合并写库间隔
+    SCRIPT_MEDIA_TASK_CONCURRENCY: int = 4
+    SCRIPT_MEDIA_GLOBAL_CONCURRENCY: int = 8
+    SCRIPT_MEDIA_SLOT_WAIT_SEC: int = 900
+    SCRIPT_MEDIA_PROGRESS_FLUSH_SEC: float = 2.0
 
     WHISPER_USE_LOCAL: bool = True
     WHISPER_MODEL_NAME: str = 'medium'
@@ -153,6 +204,46 @@ class Settings(BaseSettings):
     WHISPER_COMPUTE_TYPE: str = 'int8'
     VOICE_STREAM_MIN_DURATION_SEC: int = 15
     VOICE_TRANSCRIBE_USE_HUEY: bool = True
+    # 语音分块转写队列：每条消息单消费者租约时长（处理中心跳续租）、待转写队列的过期时间
+    VOICE_TRANSCRIBE_LEASE_SEC: int = 120
+    VOICE_TRANSCRIBE_QUEUE_TTL_SEC: int = 3600 * 6
+    # 流式录音分块直写：归属缓存（Redis）过期时间、等待主录音文件锁的超时
+    VOICE_STREAM_OWNER_TTL_SEC: int = 3600 * 6
+    VOICE_STREAM_LOCK_TIMEOUT_SEC: int = 10
+    # Whisper 模型生命周期：本地模型目录（空=HuggingFace 缓存）、是否允许在线下载、
+    # 任务等待就绪的超时、空闲自动卸载（0=不卸载）、API 进程是否预加载
+    WHISPER_MODEL_DIR: str = ''
+    WHISPER_ALLOW_DOWNLOAD: bool = False
+    WHISPER_READY_TIMEOUT_SEC: int = 60
+    WHISPER_IDLE_UNLOAD_SEC: int = 0
+    WHISPER_PRELOAD_IN_API: bool = False
+    # Whisper 推理池：模型副本数、每副本 CPU 线程数（0=按核数均分）、批量合并上限与等待时间
+    WHISPER_POOL_REPLICAS: int = 1
+    WHISPER_CPU_THREADS: int = 0
+    WHISPER_BATCH_SIZE: int = 8
+    WHISPER_BATCH_WAIT_MS: int = 20
+    # 流式录音增量解码缓存的目录与过期时间（原始录音 PCM，不能放在对外提供的 instance/ 下）
+    VOICE_PCM_CACHE_DIR: str = './cache/pcm'
+    VOICE_PCM_CACHE_TTL_SEC: int = 3600
+    # 流式分块转写：与上一块的重叠时长、作为提示的上一块结尾字数、束搜索大小
+    VOICE_STREAM_OVERLAP_SEC: float = 1.0
+    VOICE_STREAM_PROMPT_CHARS: int = 120
+    VOICE_STREAM_BEAM_SIZE: int = 1
+    # 解码前能量 VAD：静音判定下限（dBFS）与最短语音时长
+    VOICE_VAD_THRESHOLD_DB: float = -45.0
+    VOICE_VAD_MIN_SPEECH_MS: int = 250
+    # 转写结果缓存（按音频内容哈希，LRU 条目上限）；目录同样不能放在对外提供的 instance/ 下
+    WHISPER_TRANSCRIPT_CACHE_ENABLED: bool = True
+    WHISPER_TRANSCRIPT_CACHE_DIR: str = './cache/transcripts'
+    WHISPER_TRANSCRIPT_CACHE_MAX_ENTRIES: int = 2000
+    # 长音频并行转写：触发时长、切片目标时长、进程数（0=CPU 核数）与模型内存预算；
+    # 只在非守护进程中生效（bulk 线程 worker / API 进程），-k process 的 worker 退回进程内推理池
+    # 内存预算按“进程内推理池副本（WHISPER_POOL_REPLICAS，已加载时）+ 子进程模型”合计，
+    # 扣除常驻副本后放不下两个子进程模型时直接用进程内推理池
+    WHISPER_PARALLEL_MIN_DURATION_SEC: int = 300
+    WHISPER_PARALLEL_SEGMENT_SEC: int = 120
+    WHISPER_PARALLEL_WORKERS: int = 0
+    WHISPER_PARALLEL_MEMORY_MB: int = 4096
 
     OPENAI_API_KEY: str = ''
     OPENAI_API_BASE: str = 'https://api.openai.com/v1'
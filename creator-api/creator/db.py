@@ -1,10 +1,11 @@
 import copy
 import sys
 import os
+import threading
 from collections import deque
 from sqlalchemy.orm.attributes import flag_modified
 from typing import Optional
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 from datetime import date, datetime
 from creator.api.forms import BaseFilterForm
 
@@ -12,6 +13,7 @@ from fastapi import HTTPException
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import (
     create_engine,
+    select,
     Column,
     BigInteger,
     DateTime,
@@ -32,6 +34,7 @@ from sqlalchemy.orm import (
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.mutable import MutableDict
@@ -44,11 +47,42 @@ DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 Base = declarative_base()
 
 
+def _async_database_url(database_url: str) -> str:
+    """postgresql:// / postgresql+psycopg2:// -> postgresql+asyncpg://"""
+    scheme, sep, rest = database_url.partition('://')
+    if scheme.split('+')[0] in ('postgresql', 'postgres'):
+        scheme = 'postgresql+asyncpg'
+    return f'{scheme}{sep}{rest}'
+
+
 class DatabaseSessionManager:
     def __init__(self, database_url: str):
+        self.database_url = database_url
         self.engine = create_engine(database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False,
                                          bind=self.engine)
+        # 异步引擎按需创建：Huey worker / CLI 不需要 asyncpg
+        self._async_engine = None
+        self._async_session_factory = None
+        self._async_lock = threading.Lock()
+
+    @property
+    def async_engine(self):
+        if self._async_engine is None:
+            with self._async_lock:
+                if self._async_engine is None:
+                    self._async_engine = create_async_engine(
+                        _async_database_url(self.database_url))
+                    self._async_session_factory = async_sessionmaker(
+                        self._async_engine, autoflush=False,
+                        expire_on_commit=False)
+        return self._async_engine
+
+    @property
+    def AsyncSessionLocal(self):
+        if self._async_session_factory is None:
+            self.async_engine
+        return self._async_session_factory
 
     @contextmanager
     def transaction_scope(self):
@@ -73,6 +107,32 @@ class DatabaseSessionManager:
         finally:
             db.close()
 
+    @asynccontextmanager
+    async def async_transaction_scope(self):
+        """transaction_scope 的异步版本（asyncpg，不阻塞事件循环）"""
+        db = self.AsyncSessionLocal()
+        try:
+            yield db
+            await db.commit()
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception as e:
+            print(e, '------------ db rollback ------------')
+            await db.rollback()
+            raise HTTPException(status_code=500,
+                                detail="Internal Server Error")
+        finally:
+            await db.close()
+
+    async def get_async_db(self):
+        """Dependency to get async DB session"""
+        db = self.AsyncSessionLocal()
+        try:
+            yield db
+        finally:
+            await db.close()
+
 
 # 实例化数据库会话管理器
 sm = DatabaseSessionManager(config.SQLALCHEMY_DATABASE_URI)
@@ -109,6 +169,28 @@ class CRUDMixin(Base):
     def exists(cls, db: Session, *filters):
         return db.query(db.query(cls).filter(*filters).exists()).scalar()
 
+    @classmethod
+    async def acreate(cls, db: AsyncSession, **kwargs):
+        instance = cls(**kwargs)
+        db.add(instance)
+        await db.flush()
+        return instance
+
+    @classmethod
+    async def aget(cls, db: AsyncSession, id_):
+        return await db.get(cls, id_)
+
+    @classmethod
+    async def aget_or_404(cls, db: AsyncSession, id_):
+        instance = await cls.aget(db, id_)
+        if not instance:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return instance
+
+    @classmethod
+    async def aexists(cls, db: AsyncSession, *filters):
+        return await db.scalar(select(select(cls).filter(*filters).exists()))
+
     @classmethod
     def paginated_dump(cls, query=None,
                        form: BaseFilterForm = None,
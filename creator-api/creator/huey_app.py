@@ -3,32 +3,59 @@ Huey entrypoint.
 
 import all tasks in this file.
 
-Run the consumer: `huey_consumer creator.huey_app.huey`
+Run the consumers (one per queue):
+    `huey_consumer creator.huey_app.voice_huey`
+    `huey_consumer creator.huey_app.huey`
+    `huey_consumer creator.huey_app.bulk_huey`
 """
-from creator.huey_config import huey, logger  # noqa
+from huey import crontab
+
+from creator.huey_config import huey, voice_huey, bulk_huey, queue_metrics, logger  # noqa
 # import all huey tasks here
 from creator.api.wechat import tasks
 from creator.api.conversations import tasks as conversation_tasks
 from creator.api.users import tasks as user_tasks
+from creator.api.media import tasks as media_tasks
 from creator.config import config
 
 
-if config.WHISPER_USE_LOCAL:
+def preload_whisper():
+    """
+    在 worker 启动时预热 Whisper（只有 voice / bulk 队列的任务会用到模型）
+
+    通过 on_startup 在每个 worker 内加载：-k process 时 worker 是 fork 出来的子进程，
+    在 consumer 主进程加载的模型与推理池线程不会随 fork 带过去。
+    """
+    if not config.WHISPER_USE_LOCAL:
+        return
     try:
         from creator.api.conversations.whisper_service import get_whisper_service
 
         logger.info('开始预热 Whisper 模型...')
         whisper_service = get_whisper_service()
-        logger.info(
-            'Whisper 预热完成: use_local=%s, model_ready=%s, api_ready=%s',
-            whisper_service.use_local,
-            whisper_service.model is not None,
-            whisper_service.api_client is not None,
-        )
+        whisper_service.ensure_loaded(background=False)
+        logger.info('Whisper 预热完成: %s', whisper_service.health())
     except Exception as exc:
         logger.exception('Whisper 预热失败，后续任务会继续重试: %s', exc)
 
+
+voice_huey.on_startup()(preload_whisper)
+bulk_huey.on_startup()(preload_whisper)
+
+
 @huey.task()
 def echo(what):
     logger.info(what)
     return what
+
+
+@huey.periodic_task(crontab(minute='*'))
+def log_queue_metrics():
+    """每分钟记录各队列深度与排队等待时长，等待过久时告警"""
+    for name, metrics in queue_metrics().items():
+        logger.info('Huey 队列 %s: %s', name, metrics)
+        if (metrics['wait_p95_ms'] or 0) > config.HUEY_WAIT_WARN_SEC * 1000:
+            logger.warning(
+                '⚠️ Huey 队列 %s 排队过久: p95=%sms, pending=%s',
+                name, metrics['wait_p95_ms'], metrics['pending'],
+            )
@@ -1,22 +1,108 @@
 from functools import wraps
+import calendar
 import logging
+import time
 
 from huey import RedisHuey, crontab
+from huey.signals import SIGNAL_EXECUTING
 
 from .config import config
 
-
-huey = RedisHuey(
-    name=config.HUEY_NAME,
-    host=config.REDIS_HOST,
-    port=config.REDIS_PORT,
-    db=config.REDIS_DB,
-    result_store=False,
-    store_errors=False,
-)
 logger = logging.getLogger()
 
 
+class MeteredRedisHuey(RedisHuey):
+    """
+    记录排队等待时长的 RedisHuey
+
+    入队时记下时间戳（huey:enqueued_at:{队列}:{task_id}），worker 开始执行时算出等待时长
+    （延迟任务从 eta 起算），保留最近 HUEY_METRICS_WINDOW 条于 huey:wait_ms:{队列}。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signal(SIGNAL_EXECUTING)(self._record_wait)
+
+    def _enqueued_key(self, task) -> str:
+        return f'huey:enqueued_at:{self.name}:{task.id}'
+
+    def _wait_key(self) -> str:
+        return f'huey:wait_ms:{self.name}'
+
+    def enqueue(self, task):
+        try:
+            # 重试 / 延迟任务再次入队时保留首次入队时间
+            self.storage.conn.set(self._enqueued_key(task), time.time(), nx=True, ex=86400)
+        except Exception as exc:
+            logger.warning(f'记录任务入队时间失败: queue={self.name}, error={exc}')
+        return super().enqueue(task)
+
+    def _record_wait(self, signal, task, *args):
+        conn = self.storage.conn
+        try:
+            key = self._enqueued_key(task)
+            enqueued_at = conn.get(key)
+            if enqueued_at is None:
+                return
+            conn.delete(key)
+            ready_at = float(enqueued_at)
+            if task.eta is not None:
+                ready_at = max(ready_at, calendar.timegm(task.eta.utctimetuple()))
+            wait_ms = max(0, int((time.time() - ready_at) * 1000))
+            pipe = conn.pipeline()
+            pipe.lpush(self._wait_key(), wait_ms)
+            pipe.ltrim(self._wait_key(), 0, config.HUEY_METRICS_WINDOW - 1)
+            pipe.execute()
+        except Exception as exc:
+            logger.warning(f'记录任务等待时长失败: queue={self.name}, error={exc}')
+
+    def metrics(self) -> dict:
+        """队列深度（待执行 / 延迟中）与最近任务的排队等待时长"""
+        waits = sorted(int(v) for v in self.storage.conn.lrange(self._wait_key(), 0, -1))
+
+        def pct(p):
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else None
+
+        return {
+            'pending': self.pending_count(),
+            'scheduled': self.scheduled_count(),
+            'wait_samples': len(waits),
+            'wait_p50_ms': pct(0.5),
+            'wait_p95_ms': pct(0.95),
+            'wait_max_ms': waits[-1] if waits else None,
+        }
+
+
+def _make_huey(name: str) -> MeteredRedisHuey:
+    return MeteredRedisHuey(
+        name=name,
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=config.REDIS_DB,
+        result_store=False,
+        store_errors=False,
+    )
+
+
+# 三个独立队列，各自由单独的 consumer 进程消费（见 entrypoint.sh）：
+# - voice：录音分块转写等交互链路，任务短、对延迟敏感
+# - huey（默认）：对话回复、摘要、缩略图等
+# - bulk：整段音频转写、研究分析、批量生图等分钟级任务
+huey = _make_huey(config.HUEY_NAME)
+voice_huey = _make_huey(f'{config.HUEY_NAME}.voice')
+bulk_huey = _make_huey(f'{config.HUEY_NAME}.bulk')
+
+QUEUES = {
+    'voice': voice_huey,
+    'default': huey,
+    'bulk': bulk_huey,
+}
+
+
+def queue_metrics() -> dict:
+    return {name: instance.metrics() for name, instance in QUEUES.items()}
+
+
 # convinience crontab definitions
 def cron_daily(hour='17', minute='0'):
     return crontab(hour=hour, minute=minute)
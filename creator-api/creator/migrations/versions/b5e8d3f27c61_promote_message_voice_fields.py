@@ -0,0 +1,137 @@
+"""promote_message_voice_fields
+
+Revision ID: b5e8d3f27c61
+Revises: 7c2d9e4a1b08
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'b5e8d3f27c61'
+down_revision = '7c2d9e4a1b08'
+branch_labels = None
+depends_on = None
+
+# 从 messages.profile 迁出的字段
+_PROFILE_KEYS = (
+    'audio_media_id',
+    'transcription_status',
+    'refinement_status',
+    'user_confirmed',
+    'raw_transcription',
+    'stream_chunk_count',
+    'stream_chunks',
+)
+
+
+def _keys_array() -> str:
+    return 'ARRAY[' + ', '.join(f"'{key}'" for key in _PROFILE_KEYS) + ']'
+
+
+def upgrade():
+    op.add_column('messages', sa.Column('audio_media_id', sa.BigInteger(), nullable=True, comment='音频文件Media ID（关联media表）'))
+    op.add_column('messages', sa.Column('transcription_status', sa.Integer(), nullable=True, comment='转写状态（TranscriptionStatus枚举值）'))
+    op.add_column('messages', sa.Column('refinement_status', sa.Integer(), nullable=True, comment='整理状态（RefinementStatus枚举值）'))
+    op.add_column('messages', sa.Column('user_confirmed', sa.Integer(), nullable=True, comment='用户是否确认（0=未确认, 1=已确认）'))
+    op.add_column('messages', sa.Column('raw_transcription', sa.Text(), nullable=True, comment='原始转写文本（口语化、未整理）'))
+    op.add_column('messages', sa.Column('stream_chunk_count', sa.Integer(), nullable=True, comment='已完成转写的块数（用于轮询时判断进度）'))
+    op.add_column('messages', sa.Column('stream_last_end_time', sa.Float(), nullable=True, comment='已转写到的录音时间点（秒）'))
+    op.create_index(op.f('ix_messages_audio_media_id'), 'messages', ['audio_media_id'], unique=False)
+    op.create_index(op.f('ix_messages_transcription_status'), 'messages', ['transcription_status'], unique=False)
+    op.create_index(op.f('ix_messages_refinement_status'), 'messages', ['refinement_status'], unique=False)
+
+    op.create_table('message_stream_chunks',
+    sa.Column('message_id', sa.BigInteger(), nullable=False, comment='消息ID'),
+    sa.Column('chunk_index', sa.Integer(), nullable=False, comment='块序号（0-based）'),
+    sa.Column('media_id', sa.BigInteger(), nullable=True, comment='转写所用的音频 Media ID'),
+    sa.Column('text', sa.Text(), nullable=False, comment='本块转写文本'),
+    sa.Column('end_time', sa.Float(), nullable=False, comment='本块结束的录音时间点（秒）'),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('message_id', 'chunk_index', name='uq_message_stream_chunks_message_chunk')
+    )
+
+    # 数据迁移：profile 中的值写入新列 / 分块表，再从 profile 中删除
+    op.execute(f"""
+        UPDATE messages SET
+            audio_media_id = (profile->>'audio_media_id')::bigint,
+            transcription_status = (profile->>'transcription_status')::integer,
+            refinement_status = (profile->>'refinement_status')::integer,
+            user_confirmed = (profile->>'user_confirmed')::integer,
+            raw_transcription = profile->>'raw_transcription',
+            stream_chunk_count = (profile->>'stream_chunk_count')::integer,
+            stream_last_end_time = (profile->'stream_chunks'->>'last_end_time')::double precision
+        WHERE profile ?| {_keys_array()}
+    """)
+    op.execute("""
+        INSERT INTO message_stream_chunks (message_id, chunk_index, media_id, text, end_time, created_at)
+        SELECT m.id,
+               (c->>'index')::integer,
+               (c->>'media_id')::bigint,
+               COALESCE(c->>'text', ''),
+               COALESCE((c->>'end_time')::double precision, 0),
+               m.created_at
+        FROM messages m,
+             jsonb_array_elements(m.profile->'stream_chunks'->'chunks') AS c
+        WHERE jsonb_typeof(m.profile->'stream_chunks'->'chunks') = 'array'
+          AND c->>'index' IS NOT NULL
+        ON CONFLICT (message_id, chunk_index) DO NOTHING
+    """)
+    op.execute(f"""
+        UPDATE messages SET profile = profile - {_keys_array()}::text[]
+        WHERE profile ?| {_keys_array()}
+    """)
+
+
+def downgrade():
+    op.execute("""
+        UPDATE messages m SET profile = m.profile || jsonb_strip_nulls(jsonb_build_object(
+            'audio_media_id', m.audio_media_id,
+            'transcription_status', m.transcription_status,
+            'refinement_status', m.refinement_status,
+            'user_confirmed', m.user_confirmed,
+            'raw_transcription', m.raw_transcription,
+            'stream_chunk_count', m.stream_chunk_count
+        ))
+        WHERE m.audio_media_id IS NOT NULL
+           OR m.transcription_status IS NOT NULL
+           OR m.refinement_status IS NOT NULL
+           OR m.user_confirmed IS NOT NULL
+           OR m.raw_transcription IS NOT NULL
+           OR m.stream_chunk_count IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE messages m SET profile = m.profile || jsonb_build_object(
+            'stream_chunks', jsonb_build_object(
+                'chunks', c.chunks,
+                'last_end_time', COALESCE(m.stream_last_end_time, 0)
+            )
+        )
+        FROM (
+            SELECT message_id,
+                   jsonb_agg(jsonb_build_object(
+                       'index', chunk_index,
+                       'media_id', media_id,
+                       'text', text,
+                       'end_time', end_time
+                   ) ORDER BY chunk_index) AS chunks
+            FROM message_stream_chunks
+            GROUP BY message_id
+        ) c
+        WHERE c.message_id = m.id
+    """)
+
+    op.drop_table('message_stream_chunks')
+    op.drop_index(op.f('ix_messages_refinement_status'), table_name='messages')
+    op.drop_index(op.f('ix_messages_transcription_status'), table_name='messages')
+    op.drop_index(op.f('ix_messages_audio_media_id'), table_name='messages')
+    op.drop_column('messages', 'stream_last_end_time')
+    op.drop_column('messages', 'stream_chunk_count')
+    op.drop_column('messages', 'raw_transcription')
+    op.drop_column('messages', 'user_confirmed')
+    op.drop_column('messages', 'refinement_status')
+    op.drop_column('messages', 'transcription_status')
+    op.drop_column('messages', 'audio_media_id')
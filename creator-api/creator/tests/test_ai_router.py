@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from creator.api.ai import openai_api, router
+from creator.api.ai.openai_api import ChatStream
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    monkeypatch.setattr(router, '_health', {})
+
+
+def _stream(produce):
+    ai = SimpleNamespace(model_name='m', provider='deepseek')
+    return ChatStream(ai, produce)
+
+
+async def _consume(stream, limit=None):
+    count = 0
+    async for _ in stream:
+        count += 1
+        if limit and count >= limit:
+            break
+
+
+def _failures():
+    return router.provider_health('deepseek').snapshot()['consecutive_failures']
+
+
+def test_stream_without_text_counts_as_failure():
+    async def produce(stream):
+        yield 'data:start'
+
+    asyncio.run(_consume(_stream(produce)))
+
+    assert _failures() == 1
+
+
+def test_client_disconnect_is_not_a_failure():
+    async def produce(stream):
+        yield 'data:start'
+        await asyncio.sleep(10)
+        yield 'data:never'
+
+    async def run():
+        task = asyncio.ensure_future(_consume(_stream(produce)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    asyncio.run(_consume(_stream(produce), limit=1))
+
+    health = router.provider_health('deepseek').snapshot()
+    assert health['consecutive_failures'] == 0
+    assert health['samples'] == 0
+
+
+def test_fallback_skips_unconfigured_provider(monkeypatch):
+    monkeypatch.setattr(openai_api.openai_gpt_ai, '_client_args', ('', 'http://gpt', 100))
+    for _ in range(openai_api.config.AI_ROUTER_BREAKER_FAILURES):
+        router.provider_health('deepseek').record(None, False)
+
+    assert openai_api.get_chat_ai_model('deepseek') is openai_api.deepseek_ai
+
+    monkeypatch.setattr(openai_api.openai_gpt_ai, '_client_args', ('sk-test', 'http://gpt', 100))
+    assert openai_api.get_chat_ai_model('deepseek') is openai_api.openai_gpt_ai
+
+
+def test_reply_cache_keyed_on_router(monkeypatch):
+    keys = []
+    monkeypatch.setattr(openai_api.config, 'LLM_CACHE_ENABLED', True)
+    monkeypatch.setattr(openai_api.response_cache, 'get', lambda key: keys.append(key))
+    monkeypatch.setattr(openai_api.response_cache, 'put', lambda key, text: None)
+
+    async def reply_text(messages, **kwargs):
+        return 'ok'
+
+    monkeypatch.setattr(openai_api.default_text_router, 'reply_text', reply_text)
+    messages = [{'role': 'user', 'content': 'hi'}]
+    asyncio.run(openai_api.reply_text_default(messages, cache=True))
+
+    assert keys == [openai_api.response_cache.cache_key(
+        openai_api.default_text_router.model_name, messages, 'text', None)]
+    assert 'ali_chat' in openai_api.default_text_router.model_name
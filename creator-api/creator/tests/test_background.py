@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from creator.api.background import BackgroundExecutor, SubmitResult
+
+
+class FakeHueyTask:
+    def __init__(self):
+        self.calls = []
+        self.scheduled = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(args)
+
+    def schedule(self, args, kwargs, delay):
+        self.scheduled.append((args, delay))
+
+
+@pytest.fixture
+def executor():
+    instance = BackgroundExecutor('test', max_workers=1, queue_size=1)
+    yield instance
+    instance.shutdown(timeout=1)
+
+
+def test_full_queue_overflows_to_huey(executor):
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    overflow = FakeHueyTask()
+    assert executor.submit(block) == SubmitResult.THREAD
+    started.wait(5)
+    assert executor.submit(lambda x: None, 1) == SubmitResult.THREAD
+
+    assert executor.submit(lambda x: None, 2, overflow=overflow) == SubmitResult.HUEY
+    assert executor.submit(lambda x: None, 3) == SubmitResult.REJECTED
+    assert overflow.calls == [(2,)]
+    release.set()
+
+
+def test_schedule_runs_after_delay(executor):
+    done = threading.Event()
+    started = time.monotonic()
+
+    executor.schedule(0.1, done.set)
+
+    assert done.wait(5)
+    assert time.monotonic() - started >= 0.1
+
+
+def test_shutdown_drains_queue_and_hands_timers_to_huey(executor):
+    ran = []
+    overflow = FakeHueyTask()
+    executor.submit(lambda: (time.sleep(0.1), ran.append('queued')))
+    executor.schedule(60, ran.append, 'delayed', overflow=overflow)
+
+    executor.shutdown(timeout=5)
+
+    assert ran == ['queued']
+    assert len(overflow.scheduled) == 1
+    args, delay = overflow.scheduled[0]
+    assert args == ('delayed',)
+    assert 59 < delay <= 60
+    assert executor.snapshot()['delayed'] == 0
+
+
+def test_submit_after_shutdown_goes_to_huey(executor):
+    executor.shutdown(timeout=1)
+    overflow = FakeHueyTask()
+
+    assert executor.submit(lambda x: None, 1, overflow=overflow) == SubmitResult.HUEY
+    assert executor.submit(lambda x: None, 1) == SubmitResult.REJECTED
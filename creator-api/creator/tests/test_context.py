@@ -0,0 +1,32 @@
+import pytest
+
+from creator.api.conversations import context
+
+
+@pytest.fixture
+def broken_tiktoken(monkeypatch):
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        raise OSError('network unreachable')
+
+    monkeypatch.setattr(context.tiktoken, 'get_encoding', get_encoding)
+    monkeypatch.setattr(context, '_encodings', {})
+    monkeypatch.setattr(context, '_encoding_retry_at', {})
+    return calls
+
+
+def test_load_failure_is_cached(broken_tiktoken):
+    assert context.count_tokens('你好世界') == 4
+    assert context.count_tokens('hello') == 5
+
+    assert broken_tiktoken == [context.DEFAULT_ENCODING]
+
+
+def test_load_is_retried_after_backoff(broken_tiktoken, monkeypatch):
+    context.count_tokens('a')
+    monkeypatch.setattr(context, '_encoding_retry_at', {context.DEFAULT_ENCODING: 0.0})
+    context.count_tokens('a')
+
+    assert len(broken_tiktoken) == 2
@@ -0,0 +1,52 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from creator.api.media.storage import MediaFileWriter, write_base64
+
+
+def _write(directory, data, **commit_kwargs):
+    with MediaFileWriter(str(directory)) as writer:
+        writer.write(data[:3])
+        writer.write(data[3:])
+        return writer.commit('image', 'png', **commit_kwargs), writer
+
+
+def test_dedup_reuses_file_with_same_content(tmp_path):
+    first, writer = _write(tmp_path, b'same image bytes', dedup=True)
+    second, _ = _write(tmp_path, b'same image bytes', dedup=True)
+    other, _ = _write(tmp_path, b'other image bytes', dedup=True)
+
+    assert first == second == f'image_{hashlib.sha256(b"same image bytes").hexdigest()[:32]}.png'
+    assert other != first
+    assert writer.size == len(b'same image bytes')
+    assert sorted(os.listdir(tmp_path)) == sorted([first, other])
+
+
+def test_without_dedup_names_are_unique(tmp_path):
+    first, _ = _write(tmp_path, b'audio')
+    second, _ = _write(tmp_path, b'audio')
+
+    assert first != second
+    assert sorted(os.listdir(tmp_path)) == sorted([first, second])
+
+
+def test_uncommitted_writer_leaves_no_file(tmp_path):
+    with pytest.raises(RuntimeError):
+        with MediaFileWriter(str(tmp_path)) as writer:
+            writer.write(b'partial')
+            raise RuntimeError('download failed')
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_base64_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr('creator.api.media.storage._B64_CHUNK_CHARS', 8)
+    data = bytes(range(256)) * 3
+    with MediaFileWriter(str(tmp_path)) as writer:
+        write_base64(writer, base64.b64encode(data).decode())
+        filename = writer.commit('image', 'bin', dedup=True)
+
+    assert (tmp_path / filename).read_bytes() == data
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from creator.api.conversations import pcm_cache
+
+_SAMPLES_PER_CLUSTER = 1600  # 100ms
+
+
+def _cluster(timecode_ms: int) -> bytes:
+    return pcm_cache._CLUSTER_ID + b'\x84\xe7\x82' + timecode_ms.to_bytes(2, 'big') + b'data'
+
+
+def _fake_decode(data: bytes) -> np.ndarray:
+    # 每个 Cluster 解码出 100ms 的非零音频
+    return np.ones(data.count(pcm_cache._CLUSTER_ID) * _SAMPLES_PER_CLUSTER, dtype=np.float32)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'pcm'
+    monkeypatch.setattr(pcm_cache.config, 'VOICE_PCM_CACHE_DIR', str(path))
+    monkeypatch.setattr(pcm_cache, '_decode_webm_bytes', _fake_decode)
+    monkeypatch.setattr(pcm_cache, '_last_sweep_at', time.time())
+    return path
+
+
+@pytest.fixture
+def master(tmp_path):
+    path = tmp_path / 'audio.webm'
+    path.write_bytes(pcm_cache._EBML_MAGIC + b'header' + _cluster(0) + _cluster(100))
+    return path
+
+
+def test_incremental_decode(cache_dir, master):
+    assert len(pcm_cache.read_stream_pcm(1, str(master))) == 2 * _SAMPLES_PER_CLUSTER
+
+    with open(master, 'ab') as f:
+        f.write(_cluster(200))
+    samples = pcm_cache.read_stream_pcm(1, str(master), start_sec=0.1)
+
+    assert len(samples) == 2 * _SAMPLES_PER_CLUSTER
+    assert samples.all()
+
+
+def test_missing_pcm_is_decoded_from_start(cache_dir, master):
+    pcm_cache.read_stream_pcm(1, str(master))
+    pcm_path, _ = pcm_cache._paths(1)
+
+    # master 未增长
+    os.unlink(pcm_path)
+    assert len(pcm_cache.read_stream_pcm(1, str(master))) == 2 * _SAMPLES_PER_CLUSTER
+
+    # master 已增长：之前的音频不能变成静音
+    os.unlink(pcm_path)
+    with open(master, 'ab') as f:
+        f.write(_cluster(200))
+    samples = pcm_cache.read_stream_pcm(1, str(master))
+    assert len(samples) == 3 * _SAMPLES_PER_CLUSTER
+    assert samples.all()
+
+
+def test_sweep_removes_stale_messages_but_not_locked_ones(cache_dir, master, monkeypatch):
+    pcm_cache.read_stream_pcm(1, str(master))
+    pcm_cache.read_stream_pcm(2, str(master))
+    old = time.time() - 3600
+    for name in os.listdir(cache_dir):
+        os.utime(cache_dir / name, (old, old))
+    monkeypatch.setattr(pcm_cache.config, 'VOICE_PCM_CACHE_TTL_SEC', 60)
+    monkeypatch.setattr(pcm_cache, '_last_sweep_at', 0.0)
+
+    held = pcm_cache._acquire_lock(2)
+    try:
+        pcm_cache._maybe_sweep()
+    finally:
+        pcm_cache._release_lock(held)
+
+    assert sorted(os.listdir(cache_dir)) == ['2.f32', '2.json', '2.json.lock']
+
+
+def test_waiter_reopens_lock_removed_while_waiting(cache_dir):
+    held = pcm_cache._acquire_lock(1)
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pcm_cache._acquire_lock(1)))
+    waiter.start()
+    time.sleep(0.1)
+
+    pcm_cache._remove_locked(1, held)
+    waiter.join(5)
+
+    fd = acquired[0]
+    assert os.fstat(fd).st_ino == os.stat(pcm_cache._lock_path(1)).st_ino
+    # 新锁文件是互斥的
+    assert pcm_cache._acquire_lock(1, blocking=False) is None
+    pcm_cache._release_lock(fd)
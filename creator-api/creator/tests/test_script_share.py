@@ -0,0 +1,95 @@
+import io
+import os
+import time
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from creator.api.conversations import script_share
+from creator.api.conversations.script_share import ScriptShareExport, stream_script_share_zip
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'share'
+    monkeypatch.setattr(script_share.config, 'SCRIPT_SHARE_CACHE_ENABLED', True)
+    monkeypatch.setattr(script_share.config, 'SCRIPT_SHARE_CACHE_DIR', str(path))
+    monkeypatch.setattr(script_share.config, 'SCRIPT_SHARE_CACHE_TTL_SEC', 3600)
+    monkeypatch.setattr(script_share, '_COPY_CHUNK', 4)
+    return path
+
+
+@pytest.fixture
+def export(tmp_path):
+    images = []
+    for i, data in enumerate([b'first image', b'second image']):
+        src = tmp_path / f'src_{i}.png'
+        src.write_bytes(data)
+        images.append({'zip_path': f'images/{i}.png', 'src_path': str(src)})
+    return ScriptShareExport(1, 'a' * 64, '<html>分享</html>', images, '分享', _now())
+
+
+def _now():
+    return datetime.utcnow().replace(second=0, microsecond=0)
+
+
+def test_streamed_zip_is_valid_and_cached(cache_dir, export):
+    chunks = list(stream_script_share_zip(export))
+
+    assert len(chunks) > 3
+    body = b''.join(chunks)
+    with zipfile.ZipFile(io.BytesIO(body)) as zf:
+        assert zf.read('index.html').decode('utf-8') == '<html>分享</html>'
+        assert zf.read('images/0.png') == b'first image'
+        assert zf.read('images/1.png') == b'second image'
+    assert export.cached_path() == export.cache_path
+    with open(export.cache_path, 'rb') as fp:
+        assert fp.read() == body
+
+
+def test_newer_archive_replaces_old_cache(cache_dir, export):
+    list(stream_script_share_zip(export))
+    old_path = export.cache_path
+    export.cache_key = 'b' * 64
+
+    list(stream_script_share_zip(export))
+
+    assert os.listdir(cache_dir) == [os.path.basename(export.cache_path)]
+    assert not os.path.exists(old_path)
+
+
+def test_disconnect_discards_partial_archive(cache_dir, export):
+    stream = stream_script_share_zip(export)
+    next(stream)
+    next(stream)
+    stream.close()
+
+    assert export.cached_path() is None
+    assert os.listdir(cache_dir) == []
+
+
+def test_cache_hit_uses_archive_export_time(cache_dir, export):
+    first_export_at = export.exported_at
+    list(stream_script_share_zip(export))
+
+    # 稍后再次导出：HTML 中的时间仍是首次导出的时间，下载文件名也应如此
+    later = ScriptShareExport(1, 'a' * 64, '<html>later</html>', export.images, '分享',
+                              datetime(2099, 1, 1, 8, 30))
+    assert later.cached_path() == export.cache_path
+    assert later.exported_at == first_export_at
+    assert later.filename == f"分享_{first_export_at.strftime('%Y-%m-%d-%H%M')}.zip"
+
+
+def test_expired_archive_is_ignored_and_swept(cache_dir, export, monkeypatch):
+    list(stream_script_share_zip(export))
+    (cache_dir / '.tmp_orphan').write_bytes(b'partial')
+    old = time.time() - 7200
+    for name in os.listdir(cache_dir):
+        os.utime(cache_dir / name, (old, old))
+
+    assert export.cached_path() is None
+
+    monkeypatch.setattr(script_share, '_last_sweep_at', 0.0)
+    script_share._maybe_sweep_share_cache()
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from creator.api.conversations import status_events
+
+
+@pytest.fixture
+def published(monkeypatch):
+    sent = []
+    monkeypatch.setattr(status_events.MessageStreamChunk, 'list_for', classmethod(lambda cls, db, message_id: []))
+    monkeypatch.setattr(status_events, 'build_message_processing_status',
+                        lambda message, chunks_list=None: {'message_id': message.id, 'raw_text': message.raw_transcription})
+    monkeypatch.setattr(status_events, 'publish_message_status',
+                        lambda message_id, status_data: sent.append((message_id, status_data)))
+    return sent
+
+
+@pytest.fixture
+def session():
+    sess = Session(create_engine('sqlite://'))
+    yield sess
+    sess.close()
+
+
+def test_publish_after_commit(session, published):
+    message = SimpleNamespace(id=1, raw_transcription='a')
+    status_events.publish_status_on_commit(session, message)
+    status_events.publish_status_on_commit(session, message)
+    # 快照取提交前的最终状态
+    message.raw_transcription = 'ab'
+
+    session.commit()
+
+    assert published == [(1, {'message_id': 1, 'raw_text': 'ab'})]
+    assert not session.info.get(status_events._PENDING_KEY)
+
+
+def test_publish_is_not_repeated_on_next_commit(session, published):
+    status_events.publish_status_on_commit(session, SimpleNamespace(id=1, raw_transcription=None))
+    session.commit()
+    session.commit()
+
+    assert [message_id for message_id, _ in published] == [1]
+
+
+def test_rollback_discards_pending(session, published):
+    session.execute(text('SELECT 1'))
+    status_events.publish_status_on_commit(session, SimpleNamespace(id=1, raw_transcription=None))
+    session.rollback()
+    status_events.publish_status_on_commit(session, SimpleNamespace(id=2, raw_transcription=None))
+    session.commit()
+
+    assert [message_id for message_id, _ in published] == [2]
+
+
+def test_multiple_messages_in_one_transaction(session, published):
+    for message_id in (1, 2):
+        status_events.publish_status_on_commit(session, SimpleNamespace(id=message_id, raw_transcription=None))
+    session.commit()
+
+    assert sorted(message_id for message_id, _ in published) == [1, 2]
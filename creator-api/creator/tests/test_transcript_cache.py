@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from creator.api.conversations import transcript_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_cache.config, 'WHISPER_TRANSCRIPT_CACHE_ENABLED', True)
+    monkeypatch.setattr(transcript_cache.config, 'WHISPER_TRANSCRIPT_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(transcript_cache.config, 'WHISPER_TRANSCRIPT_CACHE_MAX_ENTRIES', 2)
+    return tmp_path
+
+
+def test_put_get_and_evict(cache_dir):
+    for i, key in enumerate(['a', 'b', 'c']):
+        transcript_cache.put(key, {'text': key})
+        os.utime(cache_dir / f'{key}.json.gz', (i, i))
+    transcript_cache.put('d', {'text': 'd'})
+
+    assert transcript_cache.get('a') is None
+    assert transcript_cache.get('d') == {'text': 'd'}
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_failed_write_leaves_no_tmp_file(cache_dir):
+    # 不可序列化的结果
+    transcript_cache.put('a', {'text': object()})
+
+    assert os.listdir(cache_dir) == []
+
+
+def test_disk_full_does_not_raise(cache_dir, monkeypatch):
+    def replace(src, dst):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(transcript_cache.os, 'replace', replace)
+    transcript_cache.put('a', {'text': 'a'})
+
+    assert os.listdir(cache_dir) == []
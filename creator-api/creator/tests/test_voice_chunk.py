@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from creator.api.conversations import tasks
+from creator.api.conversations.whisper_pool import SAMPLE_RATE
+
+
+@pytest.mark.parametrize('prev_text, text, expected', [
+    ('', '今天天气不错', '今天天气不错'),
+    ('我们今天讨论一下', '讨论一下选题方向', '选题方向'),
+    ('我们今天讨论一下', '一下子就好了', '一下子就好了'),
+    ('abc', 'abcdef', 'def'),
+    ('好的好的', '', ''),
+])
+def test_dedupe_chunk_boundary(prev_text, text, expected):
+    assert tasks._dedupe_chunk_boundary(prev_text, text) == expected
+
+
+class FakeWhisper:
+    def __init__(self, use_local, result):
+        self.use_local = use_local
+        self.result = result
+        self.samples = None
+
+    def transcribe(self, audio_path, **kwargs):
+        self.samples = audio_path
+        return self.result
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    starts = []
+
+    def decode(audio_path, start_sec=0.0):
+        starts.append(start_sec)
+        return np.zeros(int((10.0 - start_sec) * SAMPLE_RATE), dtype=np.float32)
+
+    monkeypatch.setattr(tasks, 'decode_audio_to_pcm', decode)
+    monkeypatch.setattr(tasks.config, 'VOICE_STREAM_OVERLAP_SEC', 1.0)
+    return starts
+
+
+def test_local_mode_drops_words_in_overlap(decoded):
+    words = [
+        {'start': 0.1, 'end': 0.6, 'word': '旧'},
+        {'start': 1.2, 'end': 1.6, 'word': '新'},
+    ]
+    svc = FakeWhisper(True, {'text': '旧新', 'segments': [{'words': words}]})
+
+    result = tasks._transcribe_chunk_audio(svc, 'a.webm', start_sec=5.0)
+
+    assert decoded == [4.0]
+    assert result == {'text': '新', 'duration': pytest.approx(5.0)}
+
+
+def test_api_mode_skips_overlap(decoded):
+    svc = FakeWhisper(False, {'text': '新内容', 'segments': []})
+
+    result = tasks._transcribe_chunk_audio(svc, 'a.webm', start_sec=5.0)
+
+    assert decoded == [5.0]
+    assert len(svc.samples) == 5 * SAMPLE_RATE
+    assert result == {'text': '新内容', 'duration': pytest.approx(5.0)}
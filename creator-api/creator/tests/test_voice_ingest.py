@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from creator.api.conversations import voice_ingest
+from creator.api.conversations.voice_ingest import ChunkAppendResult, append_chunk
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(voice_ingest, 'get_redis_client', lambda: client)
+    return client
+
+
+def test_first_chunk_retry_returns_existing_message(redis_client):
+    assert voice_ingest.claim_upload(1, 'rec-a') is None
+    # 首块仍在写入时的重试
+    assert voice_ingest.claim_upload(1, 'rec-a') == 0
+
+    voice_ingest.bind_upload(1, 'rec-a', 42)
+
+    assert voice_ingest.claim_upload(1, 'rec-a') == 42
+    assert voice_ingest.claim_upload(2, 'rec-a') is None
+
+
+def test_release_allows_first_chunk_retry(redis_client):
+    assert voice_ingest.claim_upload(1, 'rec-a') is None
+    voice_ingest.release_upload(1, 'rec-a')
+
+    assert voice_ingest.claim_upload(1, 'rec-a') is None
+
+
+async def _body(*parts):
+    for part in parts:
+        yield part
+
+
+def _append(path, offset, *parts):
+    return asyncio.run(append_chunk(str(path), _body(*parts), offset))
+
+
+def test_append_chunk_offsets(tmp_path):
+    master = tmp_path / 'audio.webm'
+    master.write_bytes(b'head')
+
+    assert _append(master, 4, b'ab', b'cd') == (ChunkAppendResult.APPENDED, 8)
+    # 同一块重试
+    assert _append(master, 4, b'abcd') == (ChunkAppendResult.DUPLICATE, 8)
+    # 前序块缺失：返回当前长度供客户端续传
+    assert _append(master, 12, b'efgh') == (ChunkAppendResult.GAP, 8)
+    assert master.read_bytes() == b'headabcd'
+
+
+def test_append_chunk_rolls_back_interrupted_body(tmp_path):
+    master = tmp_path / 'audio.webm'
+    master.write_bytes(b'head')
+
+    async def broken():
+        yield b'partial'
+        raise ConnectionError('client disconnected')
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(append_chunk(str(master), broken(), 4))
+
+    assert master.read_bytes() == b'head'
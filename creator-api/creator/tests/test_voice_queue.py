@@ -0,0 +1,184 @@
+import json
+
+import pytest
+
+from creator.api.conversations import tasks
+
+
+class FakeRedis:
+    """分块队列用到的 Redis 命令（含三段 Lua 脚本）的内存实现"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        return []
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[str(field).encode()] = value.encode()
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode()
+        return True
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == tasks._RELEASE_VOICE_LEASE_SCRIPT:
+            if self.data.get(keys[0]) != argv[0].encode():
+                return -1
+            if self.data.get(keys[1]):
+                return 0
+            self.data.pop(keys[0], None)
+            return 1
+        if script == tasks._RENEW_VOICE_LEASE_SCRIPT:
+            return int(self.data.get(keys[0]) == argv[0].encode())
+        if script == tasks._DEFER_VOICE_CHUNK_SCRIPT:
+            queue = self.data.get(keys[0], {})
+            if queue.get(argv[0]) == argv[1]:
+                queue[argv[0]] = argv[2].encode()
+            if self.data.get(keys[1]) == argv[3].encode():
+                del self.data[keys[1]]
+            return 1
+        if script == tasks._POP_VOICE_CHUNK_SCRIPT:
+            queue = self.data.get(keys[0], {})
+            if queue.get(argv[0]) == argv[1]:
+                del queue[argv[0]]
+                if not queue:
+                    self.data.pop(keys[0])
+                return 1
+            return 0
+        raise AssertionError('unexpected script')
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(tasks, '_get_redis_client', lambda: client)
+    return client
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tasks, '_schedule_voice_drain',
+                        lambda message_id, delay_sec: calls.append((message_id, delay_sec)))
+    return calls
+
+
+def _run_scheduled(scheduled):
+    """模拟延迟到期：依次执行已安排的重新排空"""
+    while scheduled:
+        message_id, _ = scheduled.pop(0)
+        tasks._resume_voice_drain(message_id)
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tasks, '_run_transcribe_voice_chunk',
+                        lambda message_id, media_id, chunk_index, is_final: calls.append(chunk_index))
+    return calls
+
+
+def test_only_first_enqueue_gets_lease(redis_client):
+    token = tasks._enqueue_voice_chunk(1, 10, 0, False)
+
+    assert token
+    assert tasks._enqueue_voice_chunk(1, 11, 1, False) is None
+    assert tasks._enqueue_voice_chunk(2, 20, 0, False)
+
+
+def test_drain_in_chunk_order_and_release_lease(redis_client, processed):
+    token = tasks._enqueue_voice_chunk(1, 12, 2, True)
+    tasks._enqueue_voice_chunk(1, 10, 0, False)
+    tasks._enqueue_voice_chunk(1, 11, 1, False)
+
+    tasks._drain_voice_transcribe_queue(1, token)
+
+    assert processed == [0, 1, 2]
+    queue_key, lease_key = tasks._voice_queue_keys(1)
+    assert queue_key not in redis_client.data
+    assert lease_key not in redis_client.data
+
+
+def test_retryable_failure_keeps_chunk_at_head(redis_client, scheduled, monkeypatch):
+    calls = []
+
+    def run(message_id, media_id, chunk_index, is_final):
+        calls.append(chunk_index)
+        if chunk_index == 1 and calls.count(1) < 3:
+            raise RuntimeError('Whisper 未就绪: loading')
+
+    monkeypatch.setattr(tasks, '_run_transcribe_voice_chunk', run)
+    token = tasks._enqueue_voice_chunk(1, 10, 0, False)
+    tasks._enqueue_voice_chunk(1, 11, 1, False)
+    tasks._enqueue_voice_chunk(1, 12, 2, True)
+
+    tasks._drain_voice_transcribe_queue(1, token)
+
+    # 失败后立即归还 worker：释放租约、记下尝试次数、安排延迟重试
+    queue_key, lease_key = tasks._voice_queue_keys(1)
+    assert calls == [0, 1]
+    assert lease_key not in redis_client.data
+    assert json.loads(redis_client.data[queue_key][b'1'])['attempt'] == 1
+    assert scheduled == [(1, tasks._VOICE_RETRY_DELAY_SEC)]
+
+    _run_scheduled(scheduled)
+
+    # 块 2 不会越过仍在重试的块 1
+    assert calls == [0, 1, 1, 1, 2]
+    assert queue_key not in redis_client.data
+    assert lease_key not in redis_client.data
+
+
+def test_new_chunk_retries_head_while_deferred(redis_client, scheduled, monkeypatch):
+    calls = []
+
+    def run(message_id, media_id, chunk_index, is_final):
+        calls.append(chunk_index)
+        if calls.count(0) < 2:
+            raise RuntimeError('Whisper 未就绪: loading')
+
+    monkeypatch.setattr(tasks, '_run_transcribe_voice_chunk', run)
+    tasks._drain_voice_transcribe_queue(1, tasks._enqueue_voice_chunk(1, 10, 0, False))
+
+    # 等待重试期间新块入队抢到租约，按顺序先重试队首
+    token = tasks._enqueue_voice_chunk(1, 11, 1, True)
+    assert token
+    tasks._drain_voice_transcribe_queue(1, token)
+    _run_scheduled(scheduled)
+
+    assert calls == [0, 0, 1]
+
+
+def test_give_up_records_failure_status(redis_client, scheduled, monkeypatch):
+    failures = []
+
+    def run(message_id, media_id, chunk_index, is_final):
+        raise RuntimeError('Whisper 未就绪: failed')
+
+    monkeypatch.setattr(tasks, '_run_transcribe_voice_chunk', run)
+    monkeypatch.setattr(tasks, '_VOICE_RETRY_LIMIT', 2)
+    monkeypatch.setattr(tasks, '_record_voice_chunk_failure',
+                        lambda message_id, chunk_index, is_final, error: failures.append(chunk_index))
+    token = tasks._enqueue_voice_chunk(1, 10, 0, True)
+
+    tasks._drain_voice_transcribe_queue(1, token)
+    _run_scheduled(scheduled)
+
+    assert failures == [0]
+    assert tasks._voice_queue_keys(1)[1] not in redis_client.data
@@ -0,0 +1,75 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from creator.api.conversations import whisper_parallel
+from creator.api.conversations.whisper_pool import SAMPLE_RATE
+
+
+class BrokenExecutor:
+    def __init__(self):
+        self.closed = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+
+class FakePool:
+    replicas = 1
+
+    def submit(self, samples, **kwargs):
+        future = Future()
+        future.set_result({'segments': [{'start': 0.0, 'end': len(samples) / SAMPLE_RATE, 'text': '好'}]})
+        return future
+
+
+class FakeService:
+    pool = FakePool()
+
+    @contextmanager
+    def use_pool(self):
+        yield self.pool
+
+
+@pytest.fixture
+def long_audio(monkeypatch):
+    def decode(audio_path, pcm_path):
+        np.zeros(4 * SAMPLE_RATE, dtype=np.float32).tofile(pcm_path)
+
+    monkeypatch.setattr(whisper_parallel, '_decode_to_pcm_file', decode)
+    monkeypatch.setattr(whisper_parallel, 'split_on_silence',
+                        lambda samples, target_sec: [(0, 2 * SAMPLE_RATE), (2 * SAMPLE_RATE, 4 * SAMPLE_RATE)])
+    monkeypatch.setattr(whisper_parallel, '_can_spawn_processes', lambda: True)
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_MODEL_NAME', 'small')
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_PARALLEL_WORKERS', 4)
+
+
+def test_broken_process_pool_is_discarded(long_audio, monkeypatch):
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_PARALLEL_MEMORY_MB', 4096)
+    broken = BrokenExecutor()
+    monkeypatch.setattr(whisper_parallel, '_executor', broken)
+
+    result = whisper_parallel.transcribe_long_audio(FakeService(), 'long.webm')
+
+    assert result['text'] == '好好'
+    assert [seg['start'] for seg in result['segments']] == [0.0, 2.0]
+    assert broken.closed
+    assert whisper_parallel._executor is None
+
+
+def test_memory_budget_counts_resident_models(monkeypatch):
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_MODEL_NAME', 'small')
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_PARALLEL_WORKERS', 8)
+    monkeypatch.setattr(whisper_parallel.config, 'WHISPER_PARALLEL_MEMORY_MB', 1800)
+
+    assert whisper_parallel.plan_workers() == 3
+    assert whisper_parallel.plan_workers(resident_models=1) == 2
+    assert whisper_parallel.plan_workers(resident_models=2) == 1
@@ -0,0 +1,128 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from creator.api.conversations import whisper_pool
+from creator.api.conversations.whisper_pool import SAMPLE_RATE, WhisperInferencePool
+
+# 每段测试音频用固定幅值代表“说的内容”
+_WORDS = {1: 'alpha', 2: 'bravo', 3: 'charlie'}
+
+
+def _speech(value: int, seconds: float) -> np.ndarray:
+    return np.full(int(seconds * SAMPLE_RATE), value / 10, dtype=np.float32)
+
+
+def _words_in(audio: np.ndarray) -> str:
+    values = sorted({int(round(v * 10)) for v in np.unique(audio) if v})
+    return ' '.join(_WORDS[v] for v in values)
+
+
+class FakeBatchedPipeline:
+    """按 faster-whisper 的方式把相邻 clip 合并到不超过 30 秒的块，每块输出一个无时间戳分段"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, batch_size, clip_timestamps, **options):
+        self.calls += 1
+        max_samples = whisper_pool.BATCH_CLIP_MAX_SEC * SAMPLE_RATE
+        chunks, current, size = [], [], 0
+        for clip in clip_timestamps:
+            length = clip['end'] - clip['start']
+            if current and size + length > max_samples:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(clip)
+            size += length
+        if current:
+            chunks.append(current)
+
+        segments = [
+            SimpleNamespace(
+                id=i,
+                start=chunk[0]['start'] / SAMPLE_RATE,
+                end=chunk[-1]['end'] / SAMPLE_RATE,
+                text=_words_in(np.concatenate([audio[c['start']:c['end']] for c in chunk])),
+                words=None,
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        return iter(segments), SimpleNamespace(language='en')
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    fake = FakeBatchedPipeline()
+    monkeypatch.setattr(WhisperInferencePool, '_make_batched_pipeline', staticmethod(lambda model: fake))
+    return fake
+
+
+@pytest.fixture
+def pool(pipeline):
+    instance = WhisperInferencePool(lambda index: object(), replicas=1, batch_size=4, batch_wait_ms=300)
+    instance.start()
+    yield instance
+    instance.shutdown()
+
+
+def test_batched_clips_do_not_mix(pool, pipeline):
+    first = pool.submit(_speech(1, 3.0), language='en', beam_size=1)
+    second = pool.submit(_speech(2, 4.0), language='en', beam_size=1)
+
+    first, second = first.result(timeout=5), second.result(timeout=5)
+
+    assert pipeline.calls == 1
+    assert pool.stats()['batched_jobs'] == 2
+    assert first['text'] == 'alpha'
+    assert second['text'] == 'bravo'
+    assert first['duration'] == pytest.approx(3.0)
+    assert [(s['start'], s['end']) for s in second['segments']] == [(0.0, pytest.approx(4.0))]
+
+
+def test_batched_clip_timestamps_map_back(pool, pipeline):
+    # 第一段只有 2~4 秒是语音
+    audio = np.concatenate([np.zeros(2 * SAMPLE_RATE, dtype=np.float32), _speech(1, 2.0)])
+    first = pool.submit(audio, language='en', beam_size=1, clip_timestamps=[2.0, 4.0])
+    second = pool.submit(_speech(3, 1.0), language='en', beam_size=1)
+
+    first, second = first.result(timeout=5), second.result(timeout=5)
+
+    assert first['text'] == 'alpha'
+    assert second['text'] == 'charlie'
+    assert first['segments'][0]['start'] == pytest.approx(2.0)
+    assert first['segments'][0]['end'] == pytest.approx(4.0)
+
+
+def test_batch_run_time_is_shared_by_jobs(pool, pipeline, monkeypatch):
+    transcribe = pipeline.transcribe
+
+    def slow_transcribe(*args, **kwargs):
+        time.sleep(0.2)
+        return transcribe(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'transcribe', slow_transcribe)
+    futures = [pool.submit(_speech(1, 1.0), language='en', beam_size=1) for _ in range(2)]
+    for future in futures:
+        future.result(timeout=5)
+
+    stats = pool.stats()
+    assert stats['batched_jobs'] == 2
+    assert 80 <= stats['avg_run_ms'] < 150
+
+
+def test_batch_failure_is_logged(pool, pipeline, monkeypatch, caplog):
+    def broken(*args, **kwargs):
+        raise RuntimeError('ctranslate2 crashed')
+
+    monkeypatch.setattr(pipeline, 'transcribe', broken)
+    futures = [pool.submit(_speech(1, 1.0), language='en', beam_size=1) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    time.sleep(0.05)
+
+    assert pool.stats()['failed'] == 2
+    assert 'ctranslate2 crashed' in caplog.text
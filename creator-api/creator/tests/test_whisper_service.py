@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from creator.api.conversations.whisper_service import ModelState, WhisperService
+
+
+class FakePool:
+    def __init__(self):
+        self.closed = False
+
+    def shutdown(self, wait=True):
+        self.closed = True
+
+
+@pytest.fixture
+def service():
+    svc = WhisperService()
+    svc.use_local = True
+    svc.pool = FakePool()
+    svc.state = ModelState.READY
+    svc._ready.set()
+    return svc
+
+
+def test_unload_waits_for_in_flight_transcribe(service):
+    pool = service.pool
+    with service.use_pool() as held:
+        assert held is pool
+        assert service.unload() is False
+        assert service.pool is pool
+
+    assert service.unload() is True
+    assert pool.closed
+    assert service.state == ModelState.UNLOADED
+
+
+def test_idle_unload_requires_full_idle_period(service):
+    with service.use_pool():
+        pass
+    assert service.unload(min_idle_sec=60) is False
+
+    service.last_used_at = time.time() - 61
+    assert service.unload(min_idle_sec=60) is True
+
+
+def test_use_pool_after_unload_raises(service):
+    service.unload()
+    with pytest.raises(RuntimeError, match='模型已卸载'):
+        with service.use_pool():
+            pass
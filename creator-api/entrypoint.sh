@@ -7,6 +7,10 @@ WEB_CONCURRENCY=${WEB_CONCURRENCY:-4}
 WEB_WORKER_TYPE=${WEB_WORKER_TYPE:-sync}
 WORKER_CONCURRENCY=${WORKER_CONCURRENCY:-4}
 WORKER_WORKER_TYPE=${WORKER_WORKER_TYPE:-process}
+VOICE_WORKER_CONCURRENCY=${VOICE_WORKER_CONCURRENCY:-2}
+BULK_WORKER_CONCURRENCY=${BULK_WORKER_CONCURRENCY:-2}
+# bulk 队列用线程 worker：长音频并行转写需要派生进程池，守护进程（-k process）中无法派生
+BULK_WORKER_TYPE=${BULK_WORKER_TYPE:-thread}
 
 case $1 in
     web)
@@ -19,8 +23,14 @@ case $1 in
     worker)
         exec huey_consumer -w $WORKER_CONCURRENCY -k $WORKER_WORKER_TYPE creator.huey_app.huey
         ;;
+    worker-voice)
+        exec huey_consumer -w $VOICE_WORKER_CONCURRENCY -k $WORKER_WORKER_TYPE creator.huey_app.voice_huey
+        ;;
+    worker-bulk)
+        exec huey_consumer -w $BULK_WORKER_CONCURRENCY -k $BULK_WORKER_TYPE creator.huey_app.bulk_huey
+        ;;
     -h)
-        echo "run components: [web|worker], or any other shell command"
+        echo "run components: [web|worker|worker-voice|worker-bulk], or any other shell command"
         ;;
     *)
         exec "$@"